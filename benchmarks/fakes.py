@@ -0,0 +1,353 @@
+"""In-process stand-ins for the external systems the services talk to."""
+import asyncio
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+
+class FakeKumaApi:
+    """Uptime Kuma socket.io API backed by in-memory dicts; counts every call by method."""
+
+    def __init__(self, state=None):
+        self.state = state if state is not None else FakeKumaState()
+        self.calls = self.state.calls
+
+    def _count(self, method):
+        self.calls[method] += 1
+
+    def login(self, username, password):
+        self._count("login")
+        return {"token": "fake"}
+
+    def disconnect(self):
+        self._count("disconnect")
+
+    def get_monitors(self):
+        self._count("get_monitors")
+        return [dict(monitor) for monitor in self.state.monitors.values()]
+
+    def get_monitor(self, monitor_id):
+        self._count("get_monitor")
+        return dict(self.state.monitors[monitor_id])
+
+    def add_monitor(self, **kwargs):
+        self._count("add_monitor")
+        monitor_id = self.state.next_id()
+        monitor = {"id": monitor_id, "active": True, "parent": None, **kwargs}
+        monitor["type"] = getattr(monitor["type"], "value", monitor["type"])
+        self.state.monitors[monitor_id] = monitor
+        return {"msg": "Added Successfully.", "monitorID": monitor_id}
+
+    def edit_monitor(self, monitor_id, **kwargs):
+        self._count("edit_monitor")
+        self.state.monitors[monitor_id].update(kwargs)
+        return {"msg": "Saved.", "monitorID": monitor_id}
+
+    def pause_monitor(self, monitor_id):
+        self._count("pause_monitor")
+        self.state.monitors[monitor_id]["active"] = False
+        return {"msg": "Paused Successfully."}
+
+    def get_notifications(self):
+        self._count("get_notifications")
+        return [dict(n) for n in self.state.notifications.values()]
+
+    def add_notification(self, **kwargs):
+        self._count("add_notification")
+        notification_id = self.state.next_id()
+        self.state.notifications[notification_id] = {"id": notification_id, **kwargs}
+        return {"msg": "Saved", "id": notification_id}
+
+
+class FakeKumaState:
+    """Server-side state shared by every FakeKumaApi connection, like a running Kuma instance."""
+
+    def __init__(self):
+        self.monitors = {}
+        self.notifications = {}
+        self.calls = Counter()
+        self._ids = 0
+
+    def next_id(self):
+        self._ids += 1
+        return self._ids
+
+    def connect(self, *args, **kwargs):
+        self.calls["connect"] += 1
+        return FakeKumaApi(self)
+
+
+class FakeSheetsService:
+    """Mimics ``build("sheets", "v4").spreadsheets()`` for get(...) and values().get(...).execute()."""
+
+    _RANGE = re.compile(r"^(?P<sheet>[^!]+)!A(?P<start>\d*):ZZ(?P<end>\d*)$")
+
+    def __init__(self, sheets, latency=0.0):
+        self.sheets = sheets
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    # build(...) -> service, service.spreadsheets() -> sheet, sheet.values() -> values
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return self
+
+    def get(self, spreadsheetId, range=None, ranges=None, fields=None):
+        if ranges is not None:
+            # spreadsheets().get: the grid has at least Sheets' default 1000 rows
+            row_count = max(len(self.sheets[ranges]), 1000)
+            properties = {"title": ranges, "gridProperties": {"rowCount": row_count}}
+            return SimpleNamespace(execute=lambda: self._execute_get({"sheets": [{"properties": properties}]}))
+        match = self._RANGE.match(range)
+        rows = self.sheets[match["sheet"]]
+        start = int(match["start"] or 1)
+        end = int(match["end"]) if match["end"] else len(rows)
+        return SimpleNamespace(execute=lambda: self._execute(rows[start - 1:end]))
+
+    def _execute(self, rows):
+        return self._execute_get({"values": rows})
+
+    def _execute_get(self, response):
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return response
+
+
+class StubBittensorConnection:
+    """Metagraph stand-in: every hotkey in ``hotkeys`` is registered on every netuid."""
+
+    def __init__(self, hotkey_hashes, netuids=(6,), sync_latency=0.0):
+        self.netuids = list(netuids)
+        self.hotkey_hashes = set(hotkey_hashes)
+        self.sync_latency = sync_latency
+        self.syncs = 0
+
+    def safe_sync(self):
+        self.syncs += 1
+        if self.sync_latency:
+            time.sleep(self.sync_latency)
+        return True
+
+    def get_active_hotkeys(self, netuid):
+        return self.hotkey_hashes
+
+    def get_active_axons(self, netuid):
+        return set()
+
+
+# The columns of Uptime Kuma's monitor/heartbeat tables read by kuma_updater/kuma_db.py
+KUMA_DB_SCHEMA = """
+CREATE TABLE monitor (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, name VARCHAR(150), active BOOLEAN DEFAULT 1,
+    interval INTEGER DEFAULT 20, url TEXT, type VARCHAR(20), maxretries INTEGER DEFAULT 0,
+    retry_interval INTEGER DEFAULT 0, description TEXT, parent INTEGER REFERENCES monitor(id),
+    timeout DOUBLE DEFAULT 0, accepted_statuscodes_json TEXT DEFAULT '["200-299"]'
+);
+CREATE TABLE heartbeat (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, important BOOLEAN DEFAULT 0, monitor_id INTEGER NOT NULL,
+    status SMALLINT NOT NULL, msg TEXT, time DATETIME NOT NULL, ping INTEGER, duration INTEGER DEFAULT 0
+);
+CREATE INDEX monitor_time_index ON heartbeat (monitor_id, time);
+"""
+
+
+def write_kuma_db(path, fleet, heartbeats_per_monitor=100):
+    """A Kuma database (WAL mode, like Kuma's) with the fleet's monitors in two groups."""
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(KUMA_DB_SCHEMA)
+    conn.execute("INSERT INTO monitor (id, name, type) VALUES (1, 'Active Miners', 'group'), (2, 'Inactive Miners', 'group')")
+    conn.executemany(
+        "INSERT INTO monitor (name, url, type, interval, retry_interval, maxretries, description, parent) "
+        "VALUES (?, ?, 'http', 60, 60, 3, ?, ?)",
+        [(m.name, m.url, f"Provider: {m.provider}\nBranch: {m.branch}", 1 if m.active else 2) for m in fleet.miners],
+    )
+    conn.executemany(
+        "INSERT INTO heartbeat (monitor_id, status, msg, time, ping) VALUES (?, ?, '', ?, 42)",
+        [(i + 3, int(m.active), f"2024-01-01 00:{beat // 60:02d}:{beat % 60:02d}")
+         for beat in range(heartbeats_per_monitor) for i, m in enumerate(fleet.miners)],
+    )
+    conn.commit()
+    conn.close()
+
+
+class FakeBittensor:
+    """Stand-in for the lazily imported ``bittensor`` module and ``AsyncMetagraph``.
+
+    ``import_latency`` and ``connect_latency`` model the slow import and websocket
+    handshake; every metagraph lists ``hotkeys``.
+    """
+
+    def __init__(self, hotkeys, import_latency=0.0, connect_latency=0.0):
+        self.hotkeys = list(hotkeys)
+        self.import_latency = import_latency
+        self.connect_latency = connect_latency
+        self.connects = 0
+
+    def load(self):
+        """Replacement for ``update_status._import_bittensor``."""
+        time.sleep(self.import_latency)
+        fake = self
+
+        class AsyncSubtensor:
+            async def initialize(self):
+                fake.connects += 1
+                await asyncio.sleep(fake.connect_latency)
+
+            async def close(self):
+                pass
+
+        class AsyncMetagraph:
+            def __init__(self, netuid, lite=True, sync=False, subtensor=None):
+                self.netuid = netuid
+                self.hotkeys = []
+                self.addresses = []
+
+            async def sync(self, subtensor=None):
+                self.hotkeys = fake.hotkeys
+
+        return SimpleNamespace(AsyncSubtensor=AsyncSubtensor), AsyncMetagraph
+
+
+class FakeSSH:
+    """Replacement for ``asyncssh.connect`` that records when each pm2 restart ran.
+
+    ``pm2 jlist`` lists every miner restarted on the host as online.
+    """
+
+    def __init__(self, connect_latency=0.0, command_latency=0.0, exit_status=0):
+        self.connect_latency = connect_latency
+        self.command_latency = command_latency
+        self.exit_status = exit_status
+        self.connections = 0
+        self.commands = []
+        self.command_times = {}
+        self.restarted = {}
+
+    async def connect(self, host, **kwargs):
+        self.connections += 1
+        await asyncio.sleep(self.connect_latency)
+        return _FakeConnection(self, host)
+
+
+class _FakeConnection:
+    def __init__(self, ssh, host):
+        self.ssh = ssh
+        self.host = host
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def close(self):
+        pass
+
+    async def wait_closed(self):
+        pass
+
+    async def run(self, command, **kwargs):
+        return await self.create_process(command)
+
+    async def create_process(self, command, **kwargs):
+        await asyncio.sleep(self.ssh.command_latency)
+        self.ssh.commands.append((self.host, command))
+        args = command.split()
+        stdout = ""
+        if "restart" in args:
+            self.ssh.command_times[args[-1]] = time.perf_counter()
+            self.ssh.restarted.setdefault(self.host, set()).add(args[-1])
+        elif "jlist" in args:
+            stdout = json.dumps([
+                {"name": name, "pid": 1000 + i, "pm2_env": {"status": "online", "restart_time": 1}}
+                for i, name in enumerate(sorted(self.ssh.restarted.get(self.host, ())))
+            ]) + "\n"
+        return _FakeProcess(self.ssh.exit_status, stdout)
+
+
+class _FakeProcess:
+    def __init__(self, exit_status, stdout):
+        self.exit_status = exit_status
+        self.stdout = _FakeReader(stdout)
+        self.stderr = _FakeReader("")
+
+    async def wait(self):
+        return SimpleNamespace(exit_status=self.exit_status)
+
+
+class _FakeReader:
+    def __init__(self, text):
+        self.lines = text.splitlines(keepends=True)
+
+    async def readline(self):
+        return self.lines.pop(0) if self.lines else ""
+
+
+class FakeWebhookSink:
+    """
+    Local HTTP server answering like Discord (204) / Slack (200) webhooks.
+
+    ``path_latency`` adds a delay to the paths starting with a given prefix, and
+    ``rate_limits`` makes the first N posts to a prefix answer 429 with Retry-After.
+    """
+
+    def __init__(self, latency=0.0, path_latency=None, rate_limits=None, retry_after=0.05):
+        sink = self
+        self.latency = latency
+        self.path_latency = path_latency or {}
+        self.rate_limits = dict(rate_limits or {})
+        self.retry_after = retry_after
+        self.received = 0
+        self.rate_limited = 0
+        self._lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                latency = sink.latency + sum(
+                    delay for prefix, delay in sink.path_latency.items() if self.path.startswith(prefix)
+                )
+                if latency:
+                    time.sleep(latency)
+                with sink._lock:
+                    sink.received += 1
+                    limited = next((p for p, n in sink.rate_limits.items() if self.path.startswith(p) and n > 0), None)
+                    if limited is not None:
+                        sink.rate_limits[limited] -= 1
+                        sink.rate_limited += 1
+                if limited is not None:
+                    self.send_response(429)
+                    self.send_header("Retry-After", str(sink.retry_after))
+                else:
+                    self.send_response(204 if self.path.startswith("/discord") else 200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
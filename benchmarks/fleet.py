@@ -0,0 +1,134 @@
+"""Synthetic fleets: spreadsheet rows, host_vars files and hotkey maps for N miners."""
+import csv
+import hashlib
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List
+
+import yaml
+
+MINERS_HEADER = [
+    "Hostname", "Provider", "IP", "Port", "Hotkey", "Branch", "Config Id", "Use",
+    "OpenAI API key", "Anthropic API key", "Google API key", "Azure API key", "Perplexity API key",
+]
+CONFIGS_HEADER = ["Config Id", "MODEL", "TIMEOUT", "WORKERS"]
+PROVIDERS = ["AWS", "GCP", "Hetzner", "OVH"]
+BRANCHES = ["main", "develop", "release"]
+
+
+@dataclass
+class FleetMiner:
+    monitor_id: int
+    name: str
+    hostname: str
+    ip: str
+    port: int
+    provider: str
+    branch: str
+    active: bool
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.ip}:{self.port}"
+
+    @property
+    def hotkey(self) -> str:
+        return f"hotkey-{self.name}"
+
+    @property
+    def hotkey_hash(self) -> str:
+        return hashlib.sha256(self.hotkey.encode()).hexdigest()
+
+
+@dataclass
+class Fleet:
+    miners: List[FleetMiner] = field(default_factory=list)
+
+    @classmethod
+    def generate(cls, size: int, miners_per_host: int = 4, inactive_every: int = 10) -> "Fleet":
+        miners = []
+        for i in range(size):
+            host = i // miners_per_host
+            miners.append(FleetMiner(
+                monitor_id=i + 1,
+                name=f"m{i:05d}",
+                hostname=f"host{host:04d}",
+                ip=f"10.{host // 65536 % 256}.{host // 256 % 256}.{host % 256}",
+                port=8000 + i % miners_per_host,
+                provider=PROVIDERS[host % len(PROVIDERS)],
+                branch=BRANCHES[i % len(BRANCHES)],
+                active=i % inactive_every != 0,
+            ))
+        return cls(miners)
+
+    def __len__(self) -> int:
+        return len(self.miners)
+
+    @property
+    def registered_hotkeys(self) -> list:
+        """Hotkeys present in the metagraph: every miner except every 7th one."""
+        return [m.hotkey for i, m in enumerate(self.miners) if i % 7]
+
+    @property
+    def registered_hotkey_hashes(self) -> set:
+        return {m.hotkey_hash for i, m in enumerate(self.miners) if i % 7}
+
+    def sheets(self) -> dict:
+        miners = [MINERS_HEADER] + [
+            [m.hostname, m.provider, m.ip, str(m.port), m.name, m.branch, str(i % 3 + 1),
+             "TRUE" if m.active else "FALSE", f"sk-openai-{m.name}", f"sk-ant-{m.name}", "", "", ""]
+            for i, m in enumerate(self.miners)
+        ]
+        configs = [CONFIGS_HEADER] + [[str(c), f"model-{c}", "30", "4"] for c in (1, 2, 3)]
+        return {"Miners": miners, "Configs": configs}
+
+    def host_trees(self) -> tuple:
+        """Active and all hosts shaped like config_fetcher's process_miners output (secrets included).
+
+        Like there, an active miner is the same dict in both trees.
+        """
+        active_hosts, all_hosts = {}, {}
+        for m in self.miners:
+            host = {"ansible_host": m.ip, "provider": m.provider}
+            miner = {
+                "name": m.name,
+                "port": str(m.port),
+                "branch": m.branch,
+                "config": {"MODEL": "model-1", "TIMEOUT": "30", "WORKERS": "4", "ID": "1"},
+                "secrets": {key: "c2VjcmV0" * 8 for key in
+                            ("openai_key", "anthropic_key", "google_key", "azure_key", "perplexity_key")},
+            }
+            all_hosts.setdefault(m.hostname, {**host, "miners": []})["miners"].append(miner)
+            if m.active:
+                active_hosts.setdefault(m.hostname, {**host, "miners": []})["miners"].append(miner)
+        return active_hosts, all_hosts
+
+    def host_vars(self) -> dict:
+        """Active hosts shaped like config_fetcher's host_vars data (secrets included)."""
+        return self.host_trees()[0]
+
+    def write_host_vars(self, directory: Path) -> None:
+        """Write host_vars files shaped like config_fetcher's output (secrets included)."""
+        directory.mkdir(parents=True, exist_ok=True)
+        for stale in directory.glob("*.yml"):
+            stale.unlink()
+        for hostname, data in self.host_vars().items():
+            with open(directory / f"{hostname}.yml", "w") as f:
+                yaml.safe_dump(data, f, default_flow_style=False, sort_keys=False)
+
+    def write_hotkeys_csv(self, path: Path) -> None:
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["hotkey_name", "hkey_hash"])
+            for m in self.miners:
+                writer.writerow([m.name, m.hotkey_hash])
+
+    def kuma_webhook(self, miner: FleetMiner, status: int = 0) -> dict:
+        """Payload Uptime Kuma posts to the miner-restarter webhook notification."""
+        return {
+            "heartbeat": {"monitorID": miner.monitor_id, "status": status,
+                          "msg": "connect ECONNREFUSED", "time": "2026-01-01 00:00:00", "ping": None},
+            "monitor": {"id": miner.monitor_id, "name": miner.name, "url": miner.url,
+                        "pathName": f"Active Miners / {miner.name}", "type": "http"},
+            "msg": f"[{miner.name}] [{'🔴 Down' if status == 0 else '✅ Up'}] connect ECONNREFUSED",
+        }
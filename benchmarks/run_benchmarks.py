@@ -0,0 +1,648 @@
+"""End-to-end benchmarks of the fleet services against local fakes.
+
+    python benchmarks/run_benchmarks.py --sizes 100,1000,10000
+    python benchmarks/run_benchmarks.py --save-baseline     # record benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py                     # compare against it, exit 1 on regression
+
+Each scenario runs with a synthetic fleet of N miners and reports wall time, calls
+to the faked external API, peak Python heap (tracemalloc) and, for the restarter,
+webhook-to-restart latency.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from base64 import b64encode
+from contextlib import contextmanager, redirect_stdout
+from pathlib import Path
+from unittest.mock import patch
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+for service_dir in ("kuma_updater", "config_fetcher", "common", "miner_restarter"):
+    sys.path.insert(0, str(REPO_ROOT / service_dir))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fakes import (  # noqa: E402
+    FakeBittensor,
+    FakeKumaState,
+    FakeSheetsService,
+    FakeSSH,
+    FakeWebhookSink,
+    StubBittensorConnection,
+    write_kuma_db,
+)
+from fleet import Fleet  # noqa: E402
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+# Relative increase over the baseline that counts as a regression, per metric
+TOLERANCES = {
+    "seconds": 0.25,
+    "api_calls": 0.0,
+    "peak_mb": 0.25,
+    "restart_p95_seconds": 0.25,
+    "first_cycle_seconds": 0.25,
+    "response_p95_seconds": 0.25,
+}
+# Same, for metrics where lower is worse
+THROUGHPUT_TOLERANCES = {
+    "webhooks_per_second": 0.25,
+}
+
+SCENARIOS = {}
+
+
+def scenario(name):
+    def register(func):
+        SCENARIOS[name] = func
+        return func
+    return register
+
+
+class Skipped(Exception):
+    pass
+
+
+@contextmanager
+def measured(result):
+    """Record wall time and peak traced memory of the block into ``result``."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        result["seconds"] = round(time.perf_counter() - start, 4)
+        result["peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+        tracemalloc.stop()
+
+
+@contextmanager
+def chdir(path):
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+@scenario("fetch_and_save")
+def bench_fetch_and_save(fleet, workdir):
+    import sync_config
+
+    sheets = FakeSheetsService(fleet.sheets())
+    env = {"SPREADSHEET_ID": "bench", "ENCRYPTION_MASTER_KEY": b64encode(b"bench-master-key").decode()}
+    result = {}
+    with patch.dict(os.environ, env), \
+            patch.object(sync_config.service_account.Credentials, "from_service_account_file"), \
+            patch.object(sync_config, "build", return_value=sheets), \
+            chdir(workdir), measured(result):
+        sync_config.fetch_and_save()
+    result["api_calls"] = sheets.calls
+    result["files"] = len(list((workdir / "all_host_vars").glob("*.yml")))
+    return result
+
+
+@scenario("host_files_write")
+def bench_host_files_write(fleet, workdir):
+    """host_vars and all_host_vars written tree by tree (as before) and in one pass sharing miner renders."""
+    import yaml
+    import sync_config
+
+    active_hosts, all_hosts = fleet.host_trees()
+    reader = object.__new__(sync_config.ConfigReader)
+    result = {}
+    with measured(result):
+        cpu = time.process_time()
+        for dir_name, hosts in (("two_pass/host_vars", active_hosts), ("two_pass/all_host_vars", all_hosts)):
+            directory = workdir / dir_name
+            directory.mkdir(parents=True, exist_ok=True)
+            for hostname, host_data in hosts.items():
+                with open(directory / f"{hostname}.yml", "w") as f:
+                    yaml.dump(host_data, f, default_flow_style=False, sort_keys=False,
+                              Dumper=sync_config.NoAliasDumper)
+        result["two_pass_cpu_seconds"] = round(time.process_time() - cpu, 4)
+        cpu = time.process_time()
+        reader.save_host_trees({workdir / "host_vars": active_hosts, workdir / "all_host_vars": all_hosts})
+        result["single_pass_cpu_seconds"] = round(time.process_time() - cpu, 4)
+    for dir_name in ("host_vars", "all_host_vars"):
+        for path in (workdir / dir_name).glob("*.yml"):
+            assert path.read_bytes() == (workdir / "two_pass" / dir_name / path.name).read_bytes()
+    result["two_pass_renders"] = sum(len(h["miners"]) for tree in (active_hosts, all_hosts) for h in tree.values())
+    result["single_pass_renders"] = sum(len(h["miners"]) for h in all_hosts.values())
+    result["bytes"] = sum(p.stat().st_size for d in ("host_vars", "all_host_vars") for p in (workdir / d).glob("*.yml"))
+    result["api_calls"] = 0
+    return result
+
+
+# Writes are not paced (see load_shaping), the scenarios measure API cost; probe_load
+# covers the pacing
+KUMA_ENV = {"KUMA_PASS": "bench", "MONITOR_WRITE_SPREAD_SECONDS": "0"}
+
+# update_status binds its host_vars default to the cwd at import time, so every
+# fleet size reuses the same directory.
+KUMA_WORKDIR = Path(tempfile.mkdtemp(prefix="bench-kuma-"))
+
+
+@scenario("kuma_job")
+def bench_kuma_job(fleet, workdir):
+    fleet.write_host_vars(KUMA_WORKDIR / "host_vars")
+    fleet.write_hotkeys_csv(KUMA_WORKDIR / "hotkeys.csv")
+    with chdir(KUMA_WORKDIR):
+        try:
+            import update_status
+        except ImportError as e:
+            raise Skipped(f"kuma_updater dependencies missing: {e}")
+
+        state = FakeKumaState()
+        update_status.provisioning.invalidate("new fake Kuma")
+        bt_conn = StubBittensorConnection(fleet.registered_hotkey_hashes)
+        with patch.object(update_status, "UptimeKumaApi", state.connect), \
+                patch.dict(os.environ, KUMA_ENV):
+            # First cycle provisions every monitor, the second one is the steady state
+            cold = {}
+            with measured(cold):
+                update_status.job(bt_conn)
+            cold_calls = sum(state.calls.values())
+            state.calls.clear()
+
+            result = {}
+            with measured(result):
+                update_status.job(bt_conn)
+            steady_calls = sum(state.calls.values())
+            state.calls.clear()
+
+            # Retune one provider's probe interval through the templates file
+            templates = KUMA_WORKDIR / "monitor_templates.yml"
+            templates.write_text("providers:\n  Hetzner:\n    interval: 120\n    retryInterval: 120\n")
+            try:
+                retune = {}
+                with measured(retune):
+                    update_status.job(bt_conn)
+            finally:
+                templates.unlink()
+    result["api_calls"] = steady_calls
+    result["cold_seconds"] = cold["seconds"]
+    result["cold_api_calls"] = cold_calls
+    result["retune_seconds"] = retune["seconds"]
+    result["retune_edits"] = state.calls["edit_monitor"]
+    result["monitors"] = len(state.monitors)
+    return result
+
+
+# Import time and websocket handshake of the real bittensor, roughly
+BITTENSOR_IMPORT_LATENCY = 3.0
+SUBTENSOR_CONNECT_LATENCY = 2.0
+
+
+@scenario("updater_startup")
+def bench_updater_startup(fleet, workdir):
+    """
+    Time from process start to the first provisioned Kuma, with a slow bittensor
+    import and subtensor connect running in the background meanwhile.
+    """
+    fleet.write_host_vars(KUMA_WORKDIR / "host_vars")
+    fleet.write_hotkeys_csv(KUMA_WORKDIR / "hotkeys.csv")
+    pythonpath = os.pathsep.join(str(REPO_ROOT / d) for d in ("kuma_updater", "common"))
+    start = time.perf_counter()
+    imported = subprocess.run(
+        [sys.executable, "-c", "import update_status"],
+        cwd=KUMA_WORKDIR, env={**os.environ, "PYTHONPATH": pythonpath}, capture_output=True,
+    )
+    import_seconds = time.perf_counter() - start
+    if imported.returncode:
+        raise Skipped(f"kuma_updater dependencies missing: {imported.stderr.decode().strip().splitlines()[-1]}")
+
+    with chdir(KUMA_WORKDIR):
+        import update_status
+
+        state = FakeKumaState()
+        update_status.provisioning.invalidate("new fake Kuma")
+        bittensor = FakeBittensor(fleet.registered_hotkeys, import_latency=BITTENSOR_IMPORT_LATENCY,
+                                  connect_latency=SUBTENSOR_CONNECT_LATENCY)
+        result = {}
+        with patch.object(update_status, "UptimeKumaApi", state.connect), \
+                patch.object(update_status, "_import_bittensor", bittensor.load), \
+                patch.dict(os.environ, KUMA_ENV), measured(result):
+            start = time.perf_counter()
+            bt_conn = update_status.BittensorConnection([6])
+            bt_conn.start()
+            update_status.job(bt_conn)
+            result["first_cycle_seconds"] = round(time.perf_counter() - start, 4)
+            bt_conn.wait_connected()
+            result["connected_seconds"] = round(time.perf_counter() - start, 4)
+            # Group moves start with the first cycle after the connection is up
+            update_status.job(bt_conn)
+
+    result["import_seconds"] = round(import_seconds, 4)
+    result["monitors"] = len(state.monitors)
+    inactive_group = update_status.find_group_id(list(state.monitors.values()), "Inactive Miners")
+    result["inactive"] = sum(1 for m in state.monitors.values() if m.get("parent") == inactive_group)
+    result["api_calls"] = sum(state.calls.values())
+    return result
+
+
+@scenario("kuma_db_snapshot")
+def bench_kuma_db_snapshot(fleet, workdir):
+    """Monitor list (updater) and the recent heartbeats of every Down miner (restarter) read
+    from a Kuma database with 100 beats per monitor."""
+    try:
+        from kuma_db import KumaDbSnapshot
+        from app.heartbeats import KumaDbHeartbeats
+    except ImportError as e:
+        raise Skipped(f"kuma_updater or miner_restarter dependencies missing: {e}")
+
+    path = workdir / "kuma.db"
+    write_kuma_db(path, fleet)
+    snapshot = KumaDbSnapshot(str(path))
+    result = {}
+    with measured(result):
+        start = time.perf_counter()
+        monitors = snapshot.get_monitors()
+        result["monitors_seconds"] = round(time.perf_counter() - start, 4)
+        start = time.perf_counter()
+        # The restarter reads the last CHECK_COUNT (default 3) heartbeats of each Down miner
+        heartbeats = KumaDbHeartbeats(str(path))
+        down = [m.name for m in fleet.miners if not m.active]
+        recent = [heartbeats.recent(name, 3) for name in down]
+        result["heartbeats_seconds"] = round(time.perf_counter() - start, 4)
+    result["monitors"] = len(monitors)
+    result["down"] = sum(1 for beats in recent if beats and beats[0].status == 0)
+    result["api_calls"] = 0
+    return result
+
+
+@scenario("probe_load")
+def bench_probe_load(fleet, workdir):
+    """Kuma probes per second after creating the fleet in one burst, paced, and paced with a budget."""
+    try:
+        from load_shaping import LoadShaping, load_profile
+    except ImportError as e:
+        raise Skipped(f"kuma_updater dependencies missing: {e}")
+
+    names = [m.name for m in fleet.miners]
+    result = {}
+    with measured(result):
+        burst = load_profile([(60, 0) for _ in names])
+        paced = LoadShaping(spread_seconds=60)
+        spread = load_profile([(60, paced.offset(n, 60)) for n in names])
+        budget = LoadShaping(probes_per_second=10, spread_seconds=60)
+        budgeted = load_profile([
+            (interval, budget.offset(n, interval))
+            for n in names for interval in [budget.interval(n, 60, len(names))]
+        ])
+    result["burst_peak_per_second"] = burst["peak"]
+    result["paced_peak_per_second"] = spread["peak"]
+    result["paced_mean_per_second"] = spread["mean"]
+    result["budget_10_peak_per_second"] = budgeted["peak"]
+    result["budget_10_mean_per_second"] = budgeted["mean"]
+    result["api_calls"] = 0
+    return result
+
+
+@scenario("host_vars_load")
+def bench_host_vars_load(fleet, workdir):
+    """Miner records from the host_vars files in this process, across a pool of 4 processes, and from the fleet snapshot."""
+    try:
+        from fleet_snapshot import SNAPSHOT_FILE, snapshot_records, write_snapshot
+        from host_loader import load_miner_records, load_snapshot_records
+    except ImportError as e:
+        raise Skipped(f"kuma_updater dependencies missing: {e}")
+
+    hosts = fleet.host_vars()
+    fleet.write_host_vars(workdir / "host_vars")
+    snapshot = workdir / "host_vars" / SNAPSHOT_FILE
+    write_snapshot(snapshot_records(hosts), snapshot, hosts=len(hosts))
+    files = sorted((workdir / "host_vars").glob("*.yml"))
+    result = {}
+    with measured(result):
+        start = time.perf_counter()
+        records = list(load_miner_records(files, workers=1))
+        result["single_seconds"] = round(time.perf_counter() - start, 4)
+        start = time.perf_counter()
+        pooled = list(load_miner_records(files, workers=4, threshold=0))
+        result["pool_seconds"] = round(time.perf_counter() - start, 4)
+        start = time.perf_counter()
+        streamed = list(load_snapshot_records(snapshot, files))
+        result["snapshot_seconds"] = round(time.perf_counter() - start, 4)
+    assert sorted(pooled) == sorted(records) == sorted(streamed)
+    result["yaml_kb"] = sum(f.stat().st_size for f in files) // 1024
+    result["snapshot_kb"] = snapshot.stat().st_size // 1024
+    result["files"] = len(files)
+    result["miners"] = len(records)
+    result["cpus"] = os.cpu_count()
+    result["api_calls"] = 0
+    return result
+
+
+RESTARTER_ENV = {"CHECK_COUNT": "1", "CHECK_INTERVAL": "0", "TIMEOUT_THRESHOLD": "1", "PM2_VERIFY_DELAY": "0"}
+
+
+def reset_restarter(restarter, workdir):
+    from app.event_state import MonitorStateStore
+    from app.host_correlation import HostStateStore
+    from app.restart_ledger import RestartLedger
+
+    # Flap history, host outages or restart backoff from an earlier scenario would hold
+    # back this one's Downs
+    restarter.monitoring_task.ledger = RestartLedger(str(workdir / "restart_ledger.db"))
+    restarter.event_states.store = MonitorStateStore(str(workdir / "restart_ledger.db"))
+    hosts = restarter.monitoring_task.hosts
+    hosts.store = hosts.probe.store = HostStateStore(str(workdir / "restart_ledger.db"))
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+@scenario("webhook_restart")
+def bench_webhook_restart(fleet, workdir):
+    # Import before silencing stdout: app.main points its log handler at sys.stdout
+    with patch.dict(os.environ, RESTARTER_ENV):
+        from app import main as restarter  # noqa: F401
+
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        return asyncio.run(_bench_webhook_restart(fleet, workdir))
+
+
+async def _bench_webhook_restart(fleet, workdir):
+    import httpx
+    from app import main as restarter
+    from app import host_correlation, monitoring_task, remote_exec, webhook_handler
+
+    reset_restarter(restarter, workdir)
+
+    env = RESTARTER_ENV
+    ssh = FakeSSH(connect_latency=0.005, command_latency=0.05)
+
+    async def probe(self, url, timeout=60):
+        await asyncio.sleep(0.01)
+        return False
+
+    async def host_probe(self, hostname):
+        await asyncio.sleep(0.005)
+        return True
+
+    down = [m for m in fleet.miners if m.active]
+    sent_at = {}
+    result = {}
+    with FakeWebhookSink() as sink, patch.dict(os.environ, env), \
+            patch.object(remote_exec.asyncssh, "connect", ssh.connect), \
+            patch.object(monitoring_task.MonitoringTask, "check_endpoint", probe), \
+            patch.object(host_correlation.HostProbe, "probe", host_probe), \
+            patch.object(webhook_handler, "WEBHOOKS", [("slack", f"{sink.url}/slack")]):
+        transport = httpx.ASGITransport(app=restarter.app)
+        async with restarter.app.router.lifespan_context(restarter.app), \
+                httpx.AsyncClient(transport=transport, base_url="http://restarter") as client:
+            with measured(result):
+                async def post(miner):
+                    sent_at[miner.name] = time.perf_counter()
+                    response = await client.post("/webhook", json=fleet.kuma_webhook(miner))
+                    response.raise_for_status()
+
+                ingest_start = time.perf_counter()
+                await asyncio.gather(*(post(m) for m in down))
+                result["ingest_seconds"] = round(time.perf_counter() - ingest_start, 4)
+
+                deadline = time.perf_counter() + 600
+                while len(ssh.command_times) < len(down) and time.perf_counter() < deadline:
+                    await asyncio.sleep(0.05)
+                # Let the tasks send their post-restart notifications
+                tasks = list(restarter.monitoring_task.active_tasks.values())
+                await asyncio.wait(tasks, timeout=max(deadline - time.perf_counter(), 0)) if tasks else None
+
+    latencies = [ssh.command_times[name] - sent_at[name] for name in ssh.command_times]
+    result["restarts"] = len(latencies)
+    result["api_calls"] = ssh.connections + sink.received
+    result["notifications"] = sink.received
+    if latencies:
+        result["restart_p50_seconds"] = round(statistics.median(latencies), 4)
+        result["restart_p95_seconds"] = round(percentile(latencies, 0.95), 4)
+    return result
+
+
+STORM_ROUNDS = 3
+STORM_CONCURRENCY = 200
+
+
+@scenario("webhook_ingest")
+def bench_webhook_ingest(fleet, workdir):
+    with patch.dict(os.environ, RESTARTER_ENV):
+        from app import main as restarter  # noqa: F401
+
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        return asyncio.run(_bench_webhook_ingest(fleet, workdir))
+
+
+async def _bench_webhook_ingest(fleet, workdir):
+    """
+    Kuma alert storm: every miner flaps Down/Up STORM_ROUNDS times, posted with up to
+    STORM_CONCURRENCY requests in flight. Probes report healthy, so only ingestion
+    and event handling are measured, not restarts.
+    """
+    import httpx
+    from app import main as restarter
+    from app import monitoring_task
+
+    reset_restarter(restarter, workdir)
+    async def probe(self, url, timeout=60):
+        return True
+
+    payloads = [fleet.kuma_webhook(m, status) for _ in range(STORM_ROUNDS) for m in fleet.miners for status in (0, 1)]
+    response_times = []
+    semaphore = asyncio.Semaphore(STORM_CONCURRENCY)
+    result = {}
+    with patch.dict(os.environ, RESTARTER_ENV), \
+            patch.object(monitoring_task.MonitoringTask, "check_endpoint", probe):
+        transport = httpx.ASGITransport(app=restarter.app)
+        async with restarter.app.router.lifespan_context(restarter.app), \
+                httpx.AsyncClient(transport=transport, base_url="http://restarter") as client:
+            async def post(payload):
+                async with semaphore:
+                    start = time.perf_counter()
+                    response = await client.post("/webhook", json=payload)
+                    response_times.append(time.perf_counter() - start)
+                    response.raise_for_status()
+
+            with measured(result):
+                start = time.perf_counter()
+                await asyncio.gather(*(post(p) for p in payloads))
+                ingested = time.perf_counter()
+                await restarter.ingest_queue.join()
+                drained = time.perf_counter()
+
+    result["webhooks"] = len(payloads)
+    result["webhooks_per_second"] = round(len(payloads) / (ingested - start), 1)
+    result["drain_seconds"] = round(drained - ingested, 4)
+    result["response_p50_seconds"] = round(statistics.median(response_times), 5)
+    result["response_p95_seconds"] = round(percentile(response_times, 0.95), 5)
+    return result
+
+
+@scenario("host_outage")
+def bench_host_outage(fleet, workdir):
+    with patch.dict(os.environ, RESTARTER_ENV):
+        from app import main as restarter  # noqa: F401
+
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        return asyncio.run(_bench_host_outage(fleet, workdir))
+
+
+async def _bench_host_outage(fleet, workdir):
+    """Every host goes down at once: each active miner posts a Down, no host answers SSH."""
+    import httpx
+    from app import main as restarter
+    from app import host_correlation, monitoring_task, webhook_handler
+
+    reset_restarter(restarter, workdir)
+    counts = {"host_probes": 0, "endpoint_probes": 0}
+
+    async def probe(self, url, timeout=60):
+        counts["endpoint_probes"] += 1
+        return False
+
+    async def host_probe(self, hostname):
+        counts["host_probes"] += 1
+        await asyncio.sleep(0.005)
+        return False
+
+    down = [m for m in fleet.miners if m.active]
+    hosts = {m.ip for m in down}
+    result = {}
+    with FakeWebhookSink() as sink, patch.dict(os.environ, RESTARTER_ENV), \
+            patch.object(monitoring_task.MonitoringTask, "check_endpoint", probe), \
+            patch.object(host_correlation.HostProbe, "probe", host_probe), \
+            patch.object(webhook_handler, "WEBHOOKS", [("slack", f"{sink.url}/slack")]):
+        transport = httpx.ASGITransport(app=restarter.app)
+        async with restarter.app.router.lifespan_context(restarter.app), \
+                httpx.AsyncClient(transport=transport, base_url="http://restarter") as client:
+            with measured(result):
+                await asyncio.gather(*(client.post("/webhook", json=fleet.kuma_webhook(m)) for m in down))
+                await restarter.ingest_queue.join()
+                tracker = restarter.monitoring_task.hosts
+                deadline = time.perf_counter() + 120
+                # outages is read from the shared store, a fresh snapshot every time
+                while sum(len(o.miners) for o in tracker.outages.values()) < len(down) \
+                        and time.perf_counter() < deadline:
+                    await asyncio.sleep(0.05)
+
+    result["hosts"] = len(hosts)
+    result["miners"] = len(down)
+    result["host_probes"] = counts["host_probes"]
+    result["endpoint_probes"] = counts["endpoint_probes"]
+    result["api_calls"] = counts["host_probes"] + counts["endpoint_probes"] + sink.received
+    result["notifications"] = sink.received
+    return result
+
+
+@scenario("notification_fanout")
+def bench_notification_fanout(fleet, workdir):
+    with patch.dict(os.environ, RESTARTER_ENV):
+        from app import main as restarter  # noqa: F401
+
+    return asyncio.run(_bench_notification_fanout(fleet))
+
+
+async def _bench_notification_fanout(fleet):
+    """
+    One notification per 10 miners, sent concurrently to 8 destinations: six fast
+    ones, a Slack endpoint taking 0.5s and a Discord endpoint that rate limits its
+    first 5 posts.
+    """
+    from app import webhook_handler
+
+    sink_config = {"path_latency": {"/slack/slow": 0.5}, "rate_limits": {"/discord/limited": 5}}
+    with FakeWebhookSink(**sink_config) as sink:
+        webhooks = [("slack", f"{sink.url}/slack/{i}") for i in range(3)] + \
+                   [("discord", f"{sink.url}/discord/{i}") for i in range(3)] + \
+                   [("slack", f"{sink.url}/slack/slow"), ("discord", f"{sink.url}/discord/limited")]
+        messages = max(10, len(fleet) // 10)
+        result = {}
+        with measured(result):
+            deliveries = await asyncio.gather(*(
+                webhook_handler.notify_all(f"Miner {m.name} restarted", webhooks) for m in fleet.miners[:messages]
+            ))
+
+    per_message = [max(r.latency_seconds for r in results) for results in deliveries]
+    fast = [r.latency_seconds for results in deliveries for r in results if "slow" not in r.webhook_url]
+    result["messages"] = messages
+    result["api_calls"] = sink.received
+    result["delivered"] = sum(r.success for results in deliveries for r in results)
+    result["rate_limited"] = sink.rate_limited
+    result["message_p95_seconds"] = round(percentile(per_message, 0.95), 4)
+    result["fast_destination_p95_seconds"] = round(percentile(fast, 0.95), 4)
+    return result
+
+
+def find_regressions(results, baseline):
+    regressions = []
+    for key, metrics in results.items():
+        base = baseline.get(key)
+        if not base or "skipped" in metrics:
+            continue
+        for metric, tolerance in TOLERANCES.items():
+            if metric not in metrics or metric not in base:
+                continue
+            limit = base[metric] * (1 + tolerance)
+            if metrics[metric] > limit and metrics[metric] - base[metric] > 1e-3:
+                regressions.append(f"{key} {metric}: {metrics[metric]} > baseline {base[metric]} (+{tolerance:.0%})")
+        for metric, tolerance in THROUGHPUT_TOLERANCES.items():
+            if metric not in metrics or metric not in base:
+                continue
+            if metrics[metric] < base[metric] * (1 - tolerance):
+                regressions.append(f"{key} {metric}: {metrics[metric]} < baseline {base[metric]} (-{tolerance:.0%})")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100,1000,10000", help="comma separated fleet sizes")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma separated scenario names")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--output", type=Path, help="also write the results as JSON")
+    args = parser.parse_args(argv)
+
+    # The services log every miner at INFO, and the outage scenarios warn about every
+    # host; keep the benchmark output readable
+    logging.disable(logging.WARNING)
+
+    results = {}
+    for size in (int(s) for s in args.sizes.split(",")):
+        fleet = Fleet.generate(size)
+        for name in args.scenarios.split(","):
+            key = f"{name}[{size}]"
+            with tempfile.TemporaryDirectory(prefix="bench-") as workdir:
+                try:
+                    results[key] = SCENARIOS[name](fleet, Path(workdir))
+                except Skipped as e:
+                    results[key] = {"skipped": str(e)}
+            print(f"{key:32} {json.dumps(results[key])}", flush=True)
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(results, indent=2) + "\n")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print("No baseline to compare against (run with --save-baseline)")
+        return 0
+
+    regressions = find_regressions(results, json.loads(args.baseline.read_text()))
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+"""Non-overlapping periodic runner shared by the kuma_updater and config_fetcher services."""
+import logging
+import signal
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+logger = logging.getLogger("cycle-runner")
+
+# (clock, deadline) of the cycle running in this process, None between cycles. Module
+# level rather than thread-local, so threads a cycle starts see its deadline too.
+_running_deadline: Optional[tuple[Callable[[], float], float]] = None
+
+
+class CycleDeadlineExceeded(Exception):
+    """Raised by ``check_deadline`` once the running cycle is past its deadline."""
+
+
+def time_left() -> Optional[float]:
+    """Seconds until the running cycle's deadline (negative once past it), None outside a cycle."""
+    running = _running_deadline
+    if running is None:
+        return None
+    clock, deadline = running
+    return deadline - clock()
+
+
+def check_deadline(what: str = "cycle") -> None:
+    """Raise CycleDeadlineExceeded if the running cycle is past its deadline.
+
+    Cycle bodies call this between stages and in their long loops, so an overrunning
+    cycle gives up on the rest of its work instead of delaying the following ticks.
+    """
+    remaining = time_left()
+    if remaining is not None and remaining <= 0:
+        raise CycleDeadlineExceeded(f"Cycle deadline passed {-remaining:.1f}s ago, not starting {what}")
+
+
+@dataclass
+class CycleStats:
+    runs: int = 0
+    failures: int = 0
+    overruns: int = 0
+    skipped_ticks: int = 0
+    triggered_runs: int = 0
+    last_duration: Optional[float] = None
+    last_started_at: Optional[float] = None
+
+
+class CycleRunner:
+    """Runs ``func`` every ``interval`` seconds on a fixed tick grid.
+
+    Cycles never overlap: a cycle that runs past one or more ticks causes those
+    ticks to be skipped (coalesced into the next tick) instead of queueing up
+    back-to-back. Each cycle has ``deadline`` seconds: ``check_deadline()`` raises
+    CycleDeadlineExceeded in the cycle body once they have passed, and
+    ``time_left()`` lets it bound its own waits and timeouts. The runner cannot
+    interrupt a call that is already blocked, so calls into other services need
+    timeouts of their own; a watchdog logs cycles still running at the deadline.
+    ``trigger()`` requests an extra cycle as soon as the
+    current one (if any) finishes; several triggers coalesce into one run.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[], None],
+        interval: float,
+        deadline: Optional[float] = None,
+        on_overrun: Optional[Callable[[float], None]] = None,
+        on_skip: Optional[Callable[[int], None]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.deadline = deadline if deadline is not None else interval
+        self.on_overrun = on_overrun
+        self.on_skip = on_skip
+        self.clock = clock
+        self.stats = CycleStats()
+
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._triggered = False
+        self._lock = threading.Lock()
+
+    def trigger(self) -> None:
+        """Request an on-demand cycle. Safe to call from other threads and signal handlers."""
+        self._triggered = True
+        self._wake.set()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._wake.set()
+
+    def run_once(self) -> bool:
+        """Run a single cycle with its deadline. Returns False if the cycle raised."""
+        global _running_deadline
+        with self._lock:
+            start = self.clock()
+            _running_deadline = (self.clock, start + self.deadline)
+            self.stats.last_started_at = time.time()
+            watchdog = threading.Timer(self.deadline, self._deadline_exceeded, args=(start,))
+            watchdog.daemon = True
+            watchdog.start()
+            ok = True
+            try:
+                self.func()
+            except Exception:
+                ok = False
+                self.stats.failures += 1
+                logger.exception(f"[{self.name}] cycle failed")
+            finally:
+                watchdog.cancel()
+                _running_deadline = None
+                duration = self.clock() - start
+                self.stats.runs += 1
+                self.stats.last_duration = duration
+            logger.info(f"[{self.name}] cycle finished in {duration:.1f}s")
+            return ok
+
+    def run_forever(self, run_immediately: bool = True) -> None:
+        next_tick = self.clock() if run_immediately else self.clock() + self.interval
+
+        while not self._stopped.is_set():
+            timeout = max(0.0, next_tick - self.clock())
+            if timeout > 0:
+                self._wake.wait(timeout)
+            if self._stopped.is_set():
+                break
+
+            triggered = self._triggered
+            self._triggered = False
+            self._wake.clear()
+            if triggered:
+                self.stats.triggered_runs += 1
+                logger.info(f"[{self.name}] running on-demand cycle")
+
+            self.run_once()
+
+            now = self.clock()
+            if triggered and now < next_tick:
+                # An on-demand run does not shift the regular schedule.
+                continue
+            next_tick, skipped = self._next_tick_after(next_tick, now)
+            if skipped:
+                self.stats.skipped_ticks += skipped
+                logger.warning(f"[{self.name}] cycle ran past {skipped} tick(s); skipping to the next one")
+                if self.on_skip:
+                    self.on_skip(skipped)
+
+    def _next_tick_after(self, tick: float, now: float) -> tuple[float, int]:
+        """Return the first tick on the grid after ``now`` and how many ticks were missed."""
+        elapsed_ticks = int((now - tick) // self.interval) + 1
+        return tick + elapsed_ticks * self.interval, elapsed_ticks - 1
+
+    def _deadline_exceeded(self, start: float) -> None:
+        elapsed = self.clock() - start
+        self.stats.overruns += 1
+        logger.warning(
+            f"[{self.name}] cycle still running after {elapsed:.1f}s (deadline {self.deadline:.0f}s); "
+            f"it stops at its next deadline check, missed ticks will be skipped")
+        if self.on_overrun:
+            self.on_overrun(elapsed)
+
+
+def install_trigger_signal(runner: CycleRunner, signum: int = signal.SIGUSR1) -> None:
+    """Run an extra cycle whenever the process receives ``signum`` (SIGUSR1 by default)."""
+    signal.signal(signum, lambda *_: runner.trigger())
@@ -0,0 +1,126 @@
+"""Compact fleet snapshot that config_fetcher writes next to the host_vars files.
+
+``fleet.jsonl`` is JSON lines: a header, then one record per active miner with only
+the fields kuma_updater builds monitors from. Secrets and the miner configs (apart
+from their ``KUMA_*`` keys) are left out, so the updater streams one small file
+instead of parsing every host_vars YAML document::
+
+    {"format": "fleet-snapshot", "version": 1, "generated_at": "...", "hosts": 2, "miners": 3}
+    {"name": "6a01", "host": "s6_6a1", "ip": "192.168.1.101", "port": "8001", "provider": "AWS", ...}
+
+Readers reject other formats and versions and fall back to the YAML files.
+"""
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+
+SNAPSHOT_FILE = "fleet.jsonl"
+FORMAT = "fleet-snapshot"
+VERSION = 1
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def snapshot_record(hostname: str, host: dict, miner: dict) -> dict:
+    """Snapshot record of ``miner`` on ``host`` (host_vars fields of ``hostname``)."""
+    config = miner.get("config") or {}
+    return {
+        "name": miner.get("name"),
+        "host": hostname,
+        "ip": host.get("ansible_host"),
+        "port": miner.get("port"),
+        "provider": host.get("provider"),
+        "branch": miner.get("branch"),
+        "netuid": miner.get("netuid"),
+        "kuma": {key: value for key, value in config.items() if key.startswith("KUMA_")},
+    }
+
+
+def snapshot_records(hosts: dict):
+    """Snapshot records of the miners in ``hosts`` (host_vars data, by hostname)."""
+    for hostname, host in hosts.items():
+        for miner in host.get("miners") or []:
+            yield snapshot_record(hostname, host, miner)
+
+
+class SnapshotWriter:
+    """Writes a snapshot to ``path`` record by record, without holding the records.
+
+    They go to a side file first, as the header counts them; ``close`` puts the
+    header in front and replaces ``path`` atomically, ``discard`` drops them.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.records_path = self.path.with_name(self.path.name + ".records")
+        self.records = open(self.records_path, "w")
+        self.miners = 0
+
+    def add(self, record: dict) -> None:
+        self.records.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self.miners += 1
+
+    def close(self, hosts: int) -> int:
+        """Write the snapshot, ``hosts`` being the number of host files its records come from."""
+        self.records.close()
+        header = {
+            "format": FORMAT,
+            "version": VERSION,
+            "generated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "hosts": hosts,
+            "miners": self.miners,
+        }
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w") as f, open(self.records_path) as records:
+            f.write(json.dumps(header) + "\n")
+            shutil.copyfileobj(records, f)
+        os.replace(tmp_path, self.path)
+        os.remove(self.records_path)
+        return self.miners
+
+    def discard(self) -> None:
+        self.records.close()
+        os.remove(self.records_path)
+
+
+def write_snapshot(records, path, hosts: int) -> int:
+    """Write ``records`` to ``path`` atomically, ``hosts`` being the number of host files they come from."""
+    writer = SnapshotWriter(path)
+    try:
+        for record in records:
+            writer.add(record)
+    except BaseException:
+        writer.discard()
+        raise
+    return writer.close(hosts)
+
+
+def read_header(path) -> dict:
+    """Header of the snapshot at ``path``.
+
+    Raises SnapshotError if the file is not a snapshot of a supported version.
+    """
+    with open(path) as f:
+        line = f.readline()
+    try:
+        header = json.loads(line or "null")
+    except ValueError as e:
+        raise SnapshotError(f"Unreadable snapshot header in {path}: {e}")
+    if not isinstance(header, dict) or header.get("format") != FORMAT:
+        raise SnapshotError(f"{path} is not a fleet snapshot")
+    if header.get("version") != VERSION:
+        raise SnapshotError(f"Unsupported fleet snapshot version {header.get('version')} in {path}")
+    return header
+
+
+def iter_records(path):
+    """Stream the records of the snapshot at ``path``, one line at a time."""
+    with open(path) as f:
+        f.readline()
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
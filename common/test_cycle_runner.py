@@ -0,0 +1,101 @@
+import threading
+import time
+
+from cycle_runner import CycleDeadlineExceeded, CycleRunner, check_deadline, time_left
+
+
+def run_in_thread(runner, **kwargs):
+    thread = threading.Thread(target=runner.run_forever, kwargs=kwargs, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_slow_cycle_skips_missed_ticks_and_records_overrun():
+    durations = [0.25, 0.0]
+    overruns = []
+    skipped = []
+
+    def job():
+        time.sleep(durations.pop(0) if durations else 0)
+        if not durations:
+            runner.stop()
+
+    runner = CycleRunner("test", job, interval=0.1, deadline=0.1,
+                         on_overrun=overruns.append, on_skip=skipped.append)
+    run_in_thread(runner).join(timeout=2)
+
+    assert runner.stats.runs == 2
+    assert runner.stats.overruns == 1
+    assert len(overruns) == 1
+    assert runner.stats.skipped_ticks == 2
+    assert skipped == [2]
+
+
+def test_trigger_runs_cycle_without_waiting_for_interval():
+    ran = threading.Event()
+    runner = CycleRunner("test", ran.set, interval=60)
+    thread = run_in_thread(runner, run_immediately=False)
+
+    runner.trigger()
+    assert ran.wait(timeout=1)
+    runner.stop()
+    thread.join(timeout=1)
+
+    assert runner.stats.runs == 1
+    assert runner.stats.triggered_runs == 1
+
+
+def test_failing_cycle_does_not_stop_runner():
+    calls = []
+
+    def job():
+        calls.append(1)
+        if len(calls) == 2:
+            runner.stop()
+        raise RuntimeError("boom")
+
+    runner = CycleRunner("test", job, interval=0.01)
+    run_in_thread(runner).join(timeout=1)
+
+    assert runner.stats.runs == 2
+    assert runner.stats.failures == 2
+
+
+def test_cycle_stops_at_deadline_check():
+    progress = []
+
+    errors = []
+
+    def job():
+        try:
+            for step in range(100):
+                check_deadline(f"step {step}")
+                progress.append(step)
+                time.sleep(0.01)
+        except CycleDeadlineExceeded as e:
+            errors.append(str(e))
+            raise
+
+    runner = CycleRunner("test", job, interval=1, deadline=0.05)
+
+    assert runner.run_once() is False
+    assert errors[0].endswith(f"not starting step {len(progress)}")
+    assert 0 < len(progress) < 100
+    assert runner.stats.failures == 1
+    # Outside a cycle there is no deadline
+    assert time_left() is None
+    check_deadline()
+
+
+def test_time_left_is_shared_with_threads_of_the_cycle():
+    seen = []
+
+    def job():
+        thread = threading.Thread(target=lambda: seen.append(time_left()))
+        thread.start()
+        thread.join()
+
+    CycleRunner("test", job, interval=1, deadline=30).run_once()
+
+    assert 29 < seen[0] <= 30
+
@@ -0,0 +1,32 @@
+import json
+
+import pytest
+
+from fleet_snapshot import SnapshotError, iter_records, read_header, snapshot_records, write_snapshot
+
+
+def test_snapshot_round_trip_without_secrets(tmp_path):
+    hosts = {"s6_6a1": {"ansible_host": "192.168.1.101", "provider": "AWS", "miners": [
+        {"name": "6a01", "port": "8001", "branch": "main", "netuid": "6",
+         "config": {"ID": "1", "MODEL": "m", "KUMA_MAXRETRIES": "5"}, "secrets": {"openai_key": "encrypted"}},
+    ]}}
+    path = tmp_path / "fleet.jsonl"
+
+    assert write_snapshot(snapshot_records(hosts), path, hosts=1) == 1
+    header = read_header(path)
+    assert (header["version"], header["hosts"], header["miners"]) == (1, 1, 1)
+    assert list(iter_records(path)) == [{
+        "name": "6a01", "host": "s6_6a1", "ip": "192.168.1.101", "port": "8001", "provider": "AWS",
+        "branch": "main", "netuid": "6", "kuma": {"KUMA_MAXRETRIES": "5"},
+    }]
+    assert "encrypted" not in path.read_text()
+
+
+def test_unsupported_snapshots_are_rejected(tmp_path):
+    path = tmp_path / "fleet.jsonl"
+    path.write_text(json.dumps({"format": "fleet-snapshot", "version": 99}) + "\n")
+    with pytest.raises(SnapshotError):
+        read_header(path)
+    path.write_text("name: not a snapshot\n")
+    with pytest.raises(SnapshotError):
+        read_header(path)
@@ -1,8 +1,9 @@
 import logging
-from datetime import datetime
+import os
 
-from apscheduler.schedulers.blocking import BlockingScheduler
+from cycle_runner import CycleRunner, install_trigger_signal
 from sync_config import fetch_and_save
+from tenants import fetch_and_save_tenants, load_tenants_from_env
 
 logger = logging.getLogger("config-fetcher-scheduler")
 logging.basicConfig(
@@ -10,10 +11,22 @@ logging.basicConfig(
 )
 logger.setLevel(logging.INFO)
 
+def fetch() -> None:
+    # SPREADSHEETS switches to multi-tenant mode, otherwise the single SPREADSHEET_ID is used
+    tenants = load_tenants_from_env()
+    if tenants:
+        fetch_and_save_tenants(tenants)
+    else:
+        fetch_and_save()
+
+
 def start_scheduler() -> None:
-    scheduler = BlockingScheduler()
-    scheduler.add_job(fetch_and_save, "interval", minutes=15, next_run_time=datetime.now())
-    scheduler.start()
+    interval_mins = float(os.getenv("FETCH_INTERVAL_MIN", "15"))
+    deadline_mins = float(os.getenv("FETCH_DEADLINE_MIN", interval_mins))
+    runner = CycleRunner("config-fetcher", fetch, interval=interval_mins * 60, deadline=deadline_mins * 60)
+    # `docker kill -s USR1 <container>` forces an immediate fetch
+    install_trigger_signal(runner)
+    runner.run_forever()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,145 @@
+"""Declarative column specs for the config spreadsheet tabs.
+
+A ``SheetSchema`` lists the columns a tab is expected to have. It is compiled
+once against the header row into a ``CompiledSchema`` that reads rows by
+index into compact namedtuple records. To carry a new spreadsheet column into
+the host_vars files, add a ``Column`` to the schema below with the section it
+belongs to; ``sync_config.py`` picks it up without further changes.
+"""
+from collections import namedtuple
+from dataclasses import dataclass, field
+from typing import Any, Callable, List, Optional
+
+
+class SchemaError(ValueError):
+    pass
+
+
+def to_bool(value: str) -> bool:
+    return value.strip().upper() == "TRUE"
+
+
+@dataclass(frozen=True)
+class Column:
+    header: str
+    key: str
+    # Where the value ends up in the output: "host", "miner", "secrets" or None (used internally only)
+    section: Optional[str] = None
+    required: bool = True
+    # Rows with an empty value in this column are skipped
+    skip_if_empty: bool = False
+    # The key is left out of its section when the value is empty
+    omit_if_empty: bool = False
+    coerce: Callable[[str], Any] = str
+    default: str = ""
+
+
+@dataclass
+class ValidationReport:
+    sheet: str
+    missing_required: List[str] = field(default_factory=list)
+    missing_optional: List[str] = field(default_factory=list)
+    unknown_headers: List[str] = field(default_factory=list)
+    # Every repeated header; only the first column of each is read
+    duplicate_headers: List[str] = field(default_factory=list)
+    # Repeated headers of required columns, which one of the copies is meant is unclear
+    duplicate_required: List[str] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not self.missing_required and not self.duplicate_required
+
+    def raise_for_errors(self) -> None:
+        if self.ok:
+            return
+        problems = []
+        if self.missing_required:
+            problems.append(f"missing required columns {self.missing_required}")
+        if self.duplicate_required:
+            problems.append(f"duplicate required columns {self.duplicate_required}")
+        raise SchemaError(f"{self.sheet} sheet: " + "; ".join(problems))
+
+
+class SheetSchema:
+    def __init__(self, name: str, columns: List[Column], collect_extra: bool = False):
+        self.name = name
+        self.columns = columns
+        # Keep every column not listed in the schema, keyed by its header (Configs tab parameters)
+        self.collect_extra = collect_extra
+        self.record_type = namedtuple(f"{name}Row", [column.key for column in columns])
+
+    def compile(self, headers: List[str]) -> "CompiledSchema":
+        report = ValidationReport(sheet=self.name)
+        index = {}
+        for i, header in enumerate(headers):
+            if header in index:
+                report.duplicate_headers.append(header)
+                continue
+            index[header] = i
+
+        known = {column.header for column in self.columns}
+        required = {column.header for column in self.columns if column.required}
+        report.duplicate_required = [h for h in report.duplicate_headers if h in required]
+        report.unknown_headers = [h for h in index if h not in known]
+        for column in self.columns:
+            if column.header not in index:
+                target = report.missing_required if column.required else report.missing_optional
+                target.append(column.header)
+
+        report.raise_for_errors()
+        return CompiledSchema(self, index, report)
+
+
+class CompiledSchema:
+    def __init__(self, schema: SheetSchema, index: dict, report: ValidationReport):
+        self.schema = schema
+        self.report = report
+        self._getters = [(index.get(c.header), c.coerce, c.default, c.header) for c in schema.columns]
+        self._skip_if_empty = [i for i, c in enumerate(schema.columns) if c.skip_if_empty]
+        self._extra = [(h, index[h]) for h in report.unknown_headers] if schema.collect_extra else []
+        self._sections = {}
+        for i, column in enumerate(schema.columns):
+            if column.section:
+                self._sections.setdefault(column.section, []).append((column.key, i, column.omit_if_empty))
+
+    def parse(self, row: List[str]):
+        """Map a raw row onto the schema's record type, or return None if the row should be skipped."""
+        values = []
+        for i, coerce, default, header in self._getters:
+            raw = row[i] if i is not None and i < len(row) else default
+            try:
+                values.append(coerce(raw))
+            except (TypeError, ValueError) as e:
+                raise SchemaError(f"{self.schema.name} sheet, column '{header}': invalid value {raw!r} ({e})")
+        if any(not values[i] for i in self._skip_if_empty):
+            return None
+        return self.schema.record_type._make(values)
+
+    def section(self, record, name: str) -> dict:
+        return {key: record[i] for key, i, omit_if_empty in self._sections.get(name, ())
+                if not (omit_if_empty and record[i] in ("", None))}
+
+    def extras(self, row: List[str]) -> dict:
+        return {header: row[i] if i < len(row) else "" for header, i in self._extra}
+
+
+MINERS_SCHEMA = SheetSchema("Miners", [
+    Column("Hostname", "hostname", skip_if_empty=True),
+    Column("IP", "ansible_host", section="host"),
+    Column("Provider", "provider", section="host"),
+    Column("Hotkey", "name", section="miner", skip_if_empty=True),
+    Column("Port", "port", section="miner"),
+    Column("Branch", "branch", section="miner", skip_if_empty=True),
+    Column("Netuid", "netuid", section="miner", required=False, omit_if_empty=True),
+    Column("Config Id", "config_id", skip_if_empty=True),
+    Column("Use", "use", coerce=to_bool),
+    Column("OpenAI API key", "openai_key", section="secrets", required=False),
+    Column("Anthropic API key", "anthropic_key", section="secrets", required=False),
+    Column("Google API key", "google_key", section="secrets", required=False),
+    Column("Azure API key", "azure_key", section="secrets", required=False),
+    Column("Perplexity API key", "perplexity_key", section="secrets", required=False),
+])
+
+CONFIGS_SCHEMA = SheetSchema("Configs", [
+    Column("Config Id", "config_id", skip_if_empty=True),
+], collect_extra=True)
@@ -1,15 +1,28 @@
+import logging
 import os
+import shutil
 from pathlib import Path
-from typing import Any, List
+from typing import Any, Iterator, List
 
+import httplib2
 import yaml
+from cycle_runner import check_deadline
 from encryption_manager import EncryptionManager
+from fleet_snapshot import SNAPSHOT_FILE, SnapshotWriter, snapshot_record
 from google.oauth2 import service_account
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
+from sheet_schema import CONFIGS_SCHEMA, MINERS_SCHEMA, CompiledSchema, SheetSchema
+
+logger = logging.getLogger(__name__)
 
 # Configuration
 SCOPES = ["https://www.googleapis.com/auth/spreadsheets.readonly"]
 CREDENTIALS_PATH = "credentials.json"
+# Rows fetched per Sheets API call when streaming the Miners tab
+MINERS_PAGE_SIZE = int(os.getenv("MINERS_PAGE_SIZE", "1000"))
+# Seconds before a Sheets API request is given up, so a hung request fails its fetch
+SHEETS_TIMEOUT = float(os.getenv("SHEETS_TIMEOUT_SECONDS", "60"))
 
 
 class NoAliasDumper(yaml.SafeDumper):
@@ -17,16 +30,63 @@ class NoAliasDumper(yaml.SafeDumper):
         return True
 
 
+def dump_yaml(data) -> str:
+    return yaml.dump(data, default_flow_style=False, sort_keys=False, Dumper=NoAliasDumper)
+
+
+class HostTreeWriter:
+    """Builds a directory of host files miner by miner, as the Miners sheet streams in.
+
+    Each host file is started with the host's fields when its first miner arrives and
+    appended to afterwards, so only the hostnames are kept in memory and the rows of a
+    host need not be adjacent. Files are assembled under ``.partial/`` inside the
+    directory (the same filesystem, so they can be moved into place): ``commit``
+    replaces the previous files and removes those of hosts no longer listed,
+    ``discard`` leaves the previous files as they were.
+    """
+
+    def __init__(self, dir_path):
+        self.directory = Path(dir_path)
+        self.staging = self.directory / ".partial"
+        shutil.rmtree(self.staging, ignore_errors=True)
+        self.staging.mkdir(parents=True)
+        self.hosts = set()
+
+    def add(self, hostname: str, host_fields: dict, fragment: str) -> None:
+        """Append a miner, already rendered as a one-item YAML list, to ``hostname``'s file."""
+        path = self.staging / f"{hostname}.yml"
+        if hostname in self.hosts:
+            with open(path, "a") as f:
+                f.write(fragment)
+            return
+        self.hosts.add(hostname)
+        with open(path, "w") as f:
+            f.write("".join([dump_yaml(host_fields) if host_fields else "", "miners:\n", fragment]))
+
+    def commit(self) -> None:
+        for hostname in self.hosts:
+            os.replace(self.staging / f"{hostname}.yml", self.directory / f"{hostname}.yml")
+        self.staging.rmdir()
+        for file_path in self.directory.glob("*.yml"):
+            if file_path.stem not in self.hosts:
+                os.remove(file_path)
+
+    def discard(self) -> None:
+        shutil.rmtree(self.staging, ignore_errors=True)
+
+
 class ConfigReader:
-    def __init__(self):
-        self.spreadsheet_id = os.getenv("SPREADSHEET_ID")
+    def __init__(self, spreadsheet_id: str | None = None, encryption_manager: EncryptionManager | None = None):
+        self.spreadsheet_id = spreadsheet_id or os.getenv("SPREADSHEET_ID")
         if not self.spreadsheet_id:
             raise ValueError("SPREADSHEET_ID environment variable is not set")
 
         self.credentials = service_account.Credentials.from_service_account_file(CREDENTIALS_PATH, scopes=SCOPES)
-        self.service = build("sheets", "v4", credentials=self.credentials)
+        http = AuthorizedHttp(self.credentials, http=httplib2.Http(timeout=SHEETS_TIMEOUT))
+        self.service = build("sheets", "v4", http=http)
         self.sheet = self.service.spreadsheets()
-        self.encryption_manager = EncryptionManager()
+        # Key derivation is expensive, so readers for several spreadsheets can share one manager
+        self.encryption_manager = encryption_manager or EncryptionManager()
 
         self.configs_by_id = {}
 
@@ -34,89 +94,161 @@ class ConfigReader:
         result = self.sheet.values().get(spreadsheetId=self.spreadsheet_id, range=range_name).execute()
         return result.get("values", [])
 
+    def compile_schema(self, schema: SheetSchema, headers: List[str]) -> CompiledSchema:
+        compiled = schema.compile(headers)
+        report = compiled.report
+        if report.duplicate_headers:
+            logger.warning(f"{schema.name} sheet has duplicate columns {report.duplicate_headers}, "
+                           f"reading the first of each")
+        if report.missing_optional:
+            logger.warning(f"{schema.name} sheet is missing optional columns {report.missing_optional}")
+        if report.unknown_headers and not schema.collect_extra:
+            logger.info(f"{schema.name} sheet columns not in schema are ignored: {report.unknown_headers}")
+        return compiled
+
     def process_configs(self):
         data = self.read_sheet("Configs!A:ZZ")
-        headers = data[0]
+        schema = self.compile_schema(CONFIGS_SCHEMA, data[0])
 
         # Create a dict of configs indexed by Config Id
         for row in data[1:]:
-            # Pad row with empty strings if shorter than headers
-            row_data = row + [""] * (len(headers) - len(row))
-            config = dict(zip(headers, row_data))
-            config_id = config.pop("Config Id", None)
-            if config_id:
-                self.configs_by_id[config_id] = config
+            record = schema.parse(row)
+            if record:
+                self.configs_by_id[record.config_id] = schema.extras(row)
 
-    def process_miners(self) -> tuple[dict[str, dict[str, Any]], dict[str, dict[str, Any]]]:
-        data = self.read_sheet("Miners!A:ZZ")
-        headers = data[0]
-        active_hosts = {}
-        all_hosts = {}
+    def sheet_row_count(self, sheet_name: str) -> int:
+        """Rows in the grid of a sheet, blank ones included."""
+        result = self.sheet.get(spreadsheetId=self.spreadsheet_id, ranges=sheet_name,
+                                fields="sheets.properties.gridProperties.rowCount").execute()
+        return result["sheets"][0]["properties"]["gridProperties"]["rowCount"]
 
-        # First, group by hostname
-        for row in data[1:]:
-            # Pad row with empty strings if shorter than headers
-            row_data = row + [""] * (len(headers) - len(row))
-            row_dict = dict(zip(headers, row_data))
-            if not all([row_dict["Hotkey"], row_dict["Hostname"], row_dict["Branch"], row_dict["Config Id"]]):
-                continue
+    def iter_sheet_rows(self, sheet_name: str, page_size: int | None = None) -> Iterator[List[str]]:
+        """Yield the rows of a sheet one page at a time.
 
-            hostname = row_dict["Hostname"]
-            if hostname not in all_hosts:
-                all_hosts[hostname] = {"ansible_host": row_dict["IP"], "provider": row_dict["Provider"], "miners": []}
+        The API drops the trailing empty rows of every range it returns, so a short
+        page does not mean the data ended. Pages are read up to the sheet's row count.
+        """
+        page_size = page_size or MINERS_PAGE_SIZE
+        row_count = self.sheet_row_count(sheet_name)
+        for start in range(1, row_count + 1, page_size):
+            end = start + page_size - 1
+            check_deadline(f"reading {sheet_name} from row {start}")
+            yield from self.read_sheet(f"{sheet_name}!A{start}:ZZ{end}")
 
-            if row_dict["Use"] == "TRUE" and hostname not in active_hosts:
-                active_hosts[hostname] = {
-                    "ansible_host": row_dict["IP"],
-                    "provider": row_dict["Provider"],
-                    "miners": [],
-                }
+    def iter_miners(self) -> Iterator[tuple[str, dict[str, Any], dict[str, Any], bool]]:
+        """Yield ``(hostname, host fields, miner, active)`` for each miner row as the sheet streams in."""
+        rows = self.iter_sheet_rows("Miners")
+        headers = next(rows, None)
+        if headers is None:
+            return
+        schema = self.compile_schema(MINERS_SCHEMA, headers)
+
+        for row in rows:
+            record = schema.parse(row)
+            if record is None:
+                continue
 
             # Get config for this miner
-            config_id = row_dict["Config Id"]
+            config_id = record.config_id
             config = self.configs_by_id.get(config_id, {})
             if not config:
                 raise ValueError(
-                    f"Config id: '{config_id}' for miner '{row_dict['Hotkey']}' could not be found in Configs table"
+                    f"Config id: '{config_id}' for miner '{record.name}' could not be found in Configs table"
                 )
             config["ID"] = config_id
 
             # Create miner entry
             miner = {
-                "name": row_dict["Hotkey"],
-                "port": row_dict["Port"],
-                "branch": row_dict["Branch"],
+                **schema.section(record, "miner"),
                 "config": config,
                 "secrets": {
-                    "openai_key": self.encryption_manager.encrypt(row_dict.get("OpenAI API key", "")),
-                    "anthropic_key": self.encryption_manager.encrypt(row_dict.get("Anthropic API key", "")),
-                    "google_key": self.encryption_manager.encrypt(row_dict.get("Google API key", "")),
-                    "azure_key": self.encryption_manager.encrypt(row_dict.get("Azure API key", "")),
-                    "perplexity_key": self.encryption_manager.encrypt(row_dict.get("Perplexity API key", "")),
+                    key: self.encryption_manager.encrypt(value)
+                    for key, value in schema.section(record, "secrets").items()
                 },
             }
 
-            all_hosts[hostname]["miners"].append(miner)
+            yield record.hostname, schema.section(record, "host"), miner, record.use
+
+    def process_miners(self) -> tuple[dict[str, dict[str, Any]], dict[str, dict[str, Any]]]:
+        """The active and all hosts trees, in memory; ``stream_host_trees`` writes them without."""
+        active_hosts = {}
+        all_hosts = {}
 
-            if row_dict["Use"] == "TRUE":
-                active_hosts[hostname]["miners"].append(miner)
+        # Group by hostname
+        for hostname, host_fields, miner, active in self.iter_miners():
+            for hosts in (all_hosts, active_hosts) if active else (all_hosts,):
+                if hostname not in hosts:
+                    hosts[hostname] = {**host_fields, "miners": []}
+                hosts[hostname]["miners"].append(miner)
 
         return active_hosts, all_hosts
 
+    def stream_host_trees(self, active_dir, all_dir) -> tuple[int, int]:
+        """Write the active and all host files, and the fleet snapshot, as the Miners sheet streams in.
+
+        Each miner is rendered once, written to the files that list it and dropped, so
+        memory does not grow with the sheet. The previous files are only replaced once
+        the whole sheet was read. Returns the number of active and all hosts.
+        """
+        active = HostTreeWriter(active_dir)
+        every = HostTreeWriter(all_dir)
+        snapshot = SnapshotWriter(Path(active_dir) / SNAPSHOT_FILE)
+        try:
+            for hostname, host_fields, miner, is_active in self.iter_miners():
+                fragment = dump_yaml([miner])
+                every.add(hostname, host_fields, fragment)
+                if is_active:
+                    active.add(hostname, host_fields, fragment)
+                    snapshot.add(snapshot_record(hostname, host_fields, miner))
+        except BaseException:
+            for writer in (active, every, snapshot):
+                writer.discard()
+            raise
+        every.commit()
+        active.commit()
+        # After the host files, so the snapshot is not older than any of them
+        snapshot.close(hosts=len(active.hosts))
+        return len(active.hosts), len(every.hosts)
+
     def save_host_files(self, hosts: dict, dir_path: str) -> None:
-        directory = Path(dir_path)
-        directory.mkdir(exist_ok=True)
-
-        created_files = set()
-        for hostname, host_data in hosts.items():
-            config_path = directory / f"{hostname}.yml"
-            with open(config_path, "w") as f:
-                yaml.dump(host_data, f, default_flow_style=False, sort_keys=False, Dumper=NoAliasDumper)
-            created_files.add(config_path)
-
-        for file_path in directory.glob("*.yml"):
-            if file_path not in created_files:
-                os.remove(file_path)
+        self.save_host_trees({dir_path: hosts})
+
+    def save_host_trees(self, trees: dict) -> None:
+        """Write one YAML file per host for every ``{dir_path: hosts}`` tree, in a single pass.
+
+        process_miners puts the same miner dict in the active and the all hosts trees, so
+        each miner is rendered once and its fragment reused in every file that lists it.
+        The output is identical to dumping each host with NoAliasDumper.
+        """
+        fragments = {}
+
+        def render(miner):
+            key = id(miner)
+            if key not in fragments:
+                # A top-level sequence item renders exactly as under the host's "miners:" key
+                fragments[key] = dump_yaml([miner])
+            return fragments[key]
+
+        for dir_path, hosts in trees.items():
+            directory = Path(dir_path)
+            directory.mkdir(parents=True, exist_ok=True)
+
+            created_files = set()
+            for hostname, host_data in hosts.items():
+                config_path = directory / f"{hostname}.yml"
+                miners = host_data.get("miners")
+                if miners and list(host_data)[-1] == "miners":
+                    host_fields = {key: value for key, value in host_data.items() if key != "miners"}
+                    content = "".join([dump_yaml(host_fields) if host_fields else "", "miners:\n", *map(render, miners)])
+                else:
+                    content = dump_yaml(host_data)
+                with open(config_path, "w") as f:
+                    f.write(content)
+                created_files.add(config_path)
+
+            for file_path in directory.glob("*.yml"):
+                if file_path not in created_files:
+                    os.remove(file_path)
 
 
 def fetch_and_save():
@@ -125,12 +257,8 @@ def fetch_and_save():
     # First process configs so we have them ready
     reader.process_configs()
 
-    # Then process miners and create host_vars
-    active_hosts, all_hosts = reader.process_miners()
-
-    # Create files per host in specified directory
-    reader.save_host_files(active_hosts, "host_vars")
-    reader.save_host_files(all_hosts, "all_host_vars")
+    # Then stream the miners into the files per host
+    reader.stream_host_trees("host_vars", "all_host_vars")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,159 @@
+import logging
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import yaml
+from encryption_manager import EncryptionManager
+from fleet_snapshot import SNAPSHOT_FILE, SnapshotError, SnapshotWriter, iter_records, read_header
+from sync_config import ConfigReader
+
+logger = logging.getLogger(__name__)
+
+TENANTS_DIR = "tenants"
+MERGED_DIRS = ("host_vars", "all_host_vars")
+# Separates the tenant name from the hostname in the merged trees
+TENANT_SEPARATOR = "__"
+
+
+@dataclass
+class TenantResult:
+    tenant: str
+    spreadsheet_id: str
+    ok: bool
+    latency_seconds: float
+    active_hosts: int = 0
+    all_hosts: int = 0
+    error: Optional[str] = None
+
+
+def load_tenants_from_env() -> Dict[str, str]:
+    """
+    Parse SPREADSHEETS, e.g. "subnet6=1_b1Iw3...,subnet12=1x9Yq...", into {tenant: spreadsheet_id}.
+    """
+    tenants = {}
+    for entry in os.getenv("SPREADSHEETS", "").split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        tenant, sep, spreadsheet_id = entry.partition("=")
+        if not sep or not tenant.strip() or not spreadsheet_id.strip():
+            raise ValueError(f"Invalid SPREADSHEETS entry '{entry}', expected <tenant>=<spreadsheet id>")
+        tenants[tenant.strip()] = spreadsheet_id.strip()
+    return tenants
+
+
+def fetch_tenant(tenant: str, spreadsheet_id: str, output_root: Path,
+                 encryption_manager: EncryptionManager) -> TenantResult:
+    start = time.perf_counter()
+    try:
+        reader = ConfigReader(spreadsheet_id, encryption_manager=encryption_manager)
+        reader.process_configs()
+        tenant_dir = output_root / TENANTS_DIR / tenant
+        active_hosts, all_hosts = reader.stream_host_trees(tenant_dir / "host_vars", tenant_dir / "all_host_vars")
+    except Exception as e:
+        latency = time.perf_counter() - start
+        logger.error(f"Tenant {tenant}: fetch failed after {latency:.2f}s, keeping previous files: {e}")
+        return TenantResult(tenant, spreadsheet_id, ok=False, latency_seconds=latency, error=str(e))
+
+    latency = time.perf_counter() - start
+    logger.info(f"Tenant {tenant}: {all_hosts} hosts ({active_hosts} active) in {latency:.2f}s")
+    return TenantResult(tenant, spreadsheet_id, ok=True, latency_seconds=latency,
+                        active_hosts=active_hosts, all_hosts=all_hosts)
+
+
+def merge_tenant_trees(tenants: List[str], output_root: Path) -> None:
+    """
+    Rebuild the flat host_vars/all_host_vars trees read by the other services from every
+    tenant's namespaced tree. Tenants whose fetch failed contribute their last good files.
+    """
+    for dir_name in MERGED_DIRS:
+        merged_dir = output_root / dir_name
+        merged_dir.mkdir(parents=True, exist_ok=True)
+        created_files = set()
+        for tenant in tenants:
+            for source in sorted((output_root / TENANTS_DIR / tenant / dir_name).glob("*.yml")):
+                target = merged_dir / f"{tenant}{TENANT_SEPARATOR}{source.name}"
+                shutil.copyfile(source, target)
+                created_files.add(target)
+
+        for file_path in merged_dir.glob("*.yml"):
+            if file_path not in created_files:
+                os.remove(file_path)
+
+    merge_tenant_snapshots(tenants, output_root)
+
+
+def merge_tenant_snapshots(tenants: List[str], output_root: Path) -> None:
+    """
+    Rebuild host_vars/fleet.jsonl from the tenants' snapshots, with hostnames prefixed
+    like the merged host files. Without a snapshot for every tenant there is none, and
+    kuma_updater reads the host files.
+    """
+    target = output_root / "host_vars" / SNAPSHOT_FILE
+    sources = {tenant: output_root / TENANTS_DIR / tenant / "host_vars" / SNAPSHOT_FILE for tenant in tenants}
+    hosts = 0
+    for tenant, source in sources.items():
+        try:
+            hosts += read_header(source)["hosts"]
+        except (OSError, SnapshotError) as e:
+            logger.warning(f"Tenant {tenant}: no usable fleet snapshot, not writing the merged one: {e}")
+            target.unlink(missing_ok=True)
+            return
+
+    # Each tenant's records go straight to the merged snapshot, one at a time
+    writer = SnapshotWriter(target)
+    try:
+        for tenant, source in sources.items():
+            for record in iter_records(source):
+                writer.add({**record, "host": f"{tenant}{TENANT_SEPARATOR}{record['host']}"})
+    except BaseException:
+        writer.discard()
+        raise
+    writer.close(hosts)
+
+
+def write_index(results: List[TenantResult], output_root: Path) -> None:
+    index_path = output_root / TENANTS_DIR / "index.yml"
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    index = {
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "tenants": [asdict(result) for result in results],
+    }
+    with open(index_path, "w") as f:
+        yaml.safe_dump(index, f, default_flow_style=False, sort_keys=False)
+
+
+def fetch_and_save_tenants(tenants: Dict[str, str], output_root: str = ".",
+                           max_workers: Optional[int] = None) -> List[TenantResult]:
+    """
+    Fetch several spreadsheets concurrently, one thread per tenant, so a slow sheet
+    only delays its own tenant. Each tenant is written to tenants/<tenant>/, then the
+    merged host_vars/all_host_vars trees and tenants/index.yml are refreshed.
+    """
+    root = Path(output_root)
+    encryption_manager = EncryptionManager()
+    max_workers = max_workers or int(os.getenv("TENANT_FETCH_WORKERS", "8"))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(tenants)) or 1,
+                            thread_name_prefix="tenant-fetch") as pool:
+        futures = [
+            pool.submit(fetch_tenant, tenant, spreadsheet_id, root, encryption_manager)
+            for tenant, spreadsheet_id in tenants.items()
+        ]
+        results = [future.result() for future in futures]
+
+    merge_tenant_trees(list(tenants), root)
+    write_index(results, root)
+
+    failed = [result.tenant for result in results if not result.ok]
+    logger.info(
+        f"Fetched {len(results) - len(failed)}/{len(results)} tenants in {time.perf_counter() - start:.2f}s"
+        + (f", failed: {failed}" if failed else "")
+    )
+    return results
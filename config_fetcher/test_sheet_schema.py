@@ -0,0 +1,67 @@
+import pytest
+
+from sheet_schema import CONFIGS_SCHEMA, Column, SchemaError, SheetSchema, to_bool
+
+SCHEMA = SheetSchema("Test", [
+    Column("Name", "name", section="miner", skip_if_empty=True),
+    Column("Use", "use", coerce=to_bool),
+    Column("Note", "note", section="miner", required=False),
+])
+
+
+def test_compile_reports_unknown_and_missing_optional_columns():
+    compiled = SCHEMA.compile(["Use", "Name", "Extra"])
+
+    assert compiled.report.ok
+    assert compiled.report.unknown_headers == ["Extra"]
+    assert compiled.report.missing_optional == ["Note"]
+
+
+def test_compile_raises_on_renamed_required_column():
+    with pytest.raises(SchemaError) as excinfo:
+        SCHEMA.compile(["Miner Name", "Use"])
+    assert "missing required columns ['Name']" in str(excinfo.value)
+
+
+def test_parse_reads_by_index_and_coerces():
+    compiled = SCHEMA.compile(["Use", "Name", "Note"])
+
+    record = compiled.parse(["TRUE", "6a01"])
+    assert record.name == "6a01"
+    assert record.use is True
+    assert compiled.section(record, "miner") == {"name": "6a01", "note": ""}
+    assert compiled.parse(["TRUE", ""]) is None
+
+
+def test_extra_columns_are_collected_in_header_order():
+    compiled = CONFIGS_SCHEMA.compile(["Config Id", "PARAM_2", "PARAM_1"])
+
+    assert compiled.extras(["1", "b"]) == {"PARAM_2": "b", "PARAM_1": ""}
+
+
+def test_duplicate_optional_and_extra_columns_keep_the_first():
+    compiled = SCHEMA.compile(["Name", "Use", "Note", "Note"])
+    assert compiled.report.duplicate_headers == ["Note"]
+    assert compiled.section(compiled.parse(["6a01", "TRUE", "first", "second"]), "miner")["note"] == "first"
+
+    compiled = CONFIGS_SCHEMA.compile(["Config Id", "PARAM_1", "PARAM_1"])
+    assert compiled.extras(["1", "a", "b"]) == {"PARAM_1": "a"}
+
+
+def test_duplicate_required_column_raises():
+    with pytest.raises(SchemaError) as excinfo:
+        SCHEMA.compile(["Name", "Use", "Name"])
+    assert "duplicate required columns ['Name']" in str(excinfo.value)
+
+
+def test_omit_if_empty_leaves_the_key_out():
+    schema = SheetSchema("Test", [
+        Column("Name", "name", section="miner"),
+        Column("Netuid", "netuid", section="miner", required=False, omit_if_empty=True),
+    ])
+    compiled = schema.compile(["Name", "Netuid"])
+
+    assert compiled.section(compiled.parse(["6a01", ""]), "miner") == {"name": "6a01"}
+    assert compiled.section(compiled.parse(["6a01", "12"]), "miner") == {"name": "6a01", "netuid": "12"}
+    compiled = schema.compile(["Name"])
+    assert compiled.section(compiled.parse(["6a01"]), "miner") == {"name": "6a01"}
@@ -20,6 +20,9 @@ def mock_google_setup():
         mock_build.return_value = mock_service
         mock_service.spreadsheets.return_value = mock_sheet
         mock_sheet.values.return_value = mock_values
+        mock_sheet.get.return_value.execute.return_value = {
+            'sheets': [{'properties': {'gridProperties': {'rowCount': 1000}}}]
+        }
         mock_values.get.return_value.execute.return_value = {
             'values': [
                 ['Header1', 'Header2'],
@@ -241,3 +244,121 @@ class TestProcessMiners:
         assert len(all_hosts) == 2
         assert len(active_hosts) == 1
         assert len(all_hosts) != len(active_hosts)
+
+    def test_miners_are_read_in_pages(self, mock_google_setup):
+        row = ['s6_6a1', 'AWS', '192.168.1.101', '8001', '6a01', 'main', '1', 'TRUE',
+               'openai_key', 'anthropic_key', 'google_key', 'azure_key', 'perplexity_key']
+        mock_google_setup.values().get().execute.side_effect = [
+            {'values': [self.header, row]},
+            {'values': [row[:4] + ['6a02'] + row[5:], row[:4] + ['6a03'] + row[5:]]},
+            {'values': [row[:4] + ['6a04'] + row[5:]]},
+        ]
+
+        mock_google_setup.get.return_value.execute.return_value = {
+            'sheets': [{'properties': {'gridProperties': {'rowCount': 5}}}]
+        }
+
+        reader = ConfigReader()
+        reader.configs_by_id = {"1": {"param": "value"}}
+        with patch('sync_config.MINERS_PAGE_SIZE', 2):
+            active_hosts, all_hosts = reader.process_miners()
+
+        requested_ranges = [c.kwargs['range'] for c in mock_google_setup.values().get.call_args_list if c.kwargs]
+        assert requested_ranges == ['Miners!A1:ZZ2', 'Miners!A3:ZZ4', 'Miners!A5:ZZ6']
+        assert [m['name'] for m in all_hosts['s6_6a1']['miners']] == ['6a01', '6a02', '6a03', '6a04']
+
+    def test_blank_rows_at_a_page_boundary_do_not_end_the_sheet(self, mock_google_setup):
+        row = ['s6_6a1', 'AWS', '192.168.1.101', '8001', '6a01', 'main', '1', 'TRUE',
+               'openai_key', 'anthropic_key', 'google_key', 'azure_key', 'perplexity_key']
+        # Rows 5 and 6 are blank, so the API cuts the second page short
+        mock_google_setup.values().get().execute.side_effect = [
+            {'values': [self.header, row, row[:4] + ['6a02'] + row[5:]]},
+            {'values': [row[:4] + ['6a03'] + row[5:]]},
+            {'values': [row[:4] + ['6a04'] + row[5:]]},
+        ]
+        mock_google_setup.get.return_value.execute.return_value = {
+            'sheets': [{'properties': {'gridProperties': {'rowCount': 7}}}]
+        }
+
+        reader = ConfigReader()
+        reader.configs_by_id = {"1": {"param": "value"}}
+        with patch('sync_config.MINERS_PAGE_SIZE', 3):
+            active_hosts, all_hosts = reader.process_miners()
+
+        assert [m['name'] for m in all_hosts['s6_6a1']['miners']] == ['6a01', '6a02', '6a03', '6a04']
+
+    def test_streamed_host_trees_match_process_miners(self, tmp_path, mock_google_setup):
+        import yaml
+        from fleet_snapshot import iter_records, read_header
+        from sync_config import NoAliasDumper
+
+        def row(hostname, ip, name, use):
+            return [hostname, 'AWS', ip, '8001', name, 'main', '1', use,
+                    'openai_key', 'anthropic_key', 'google_key', 'azure_key', 'perplexity_key']
+
+        mock_google_setup.values().get().execute.return_value = {'values': [
+            self.header,
+            row('s6_6a1', '192.168.1.101', '6a01', 'TRUE'),
+            row('s6_6b2', '192.168.1.108', '6b01', 'FALSE'),
+            # Rows of one host need not be adjacent
+            row('s6_6a1', '192.168.1.101', '6a02', 'FALSE'),
+            row('s6_6a1', '192.168.1.101', '6a03', 'TRUE'),
+        ]}
+        reader = ConfigReader()
+        reader.encryption_manager.encrypt.side_effect = lambda value: f"encrypted {value}"
+        reader.configs_by_id = {"1": {"KUMA_INTERVAL": "120"}}
+        (tmp_path / "host_vars").mkdir()
+        (tmp_path / "host_vars" / "stale.yml").write_text("miners: []\n")
+
+        counts = reader.stream_host_trees(tmp_path / "host_vars", tmp_path / "all_host_vars")
+        active_hosts, all_hosts = reader.process_miners()
+
+        assert counts == (1, 2)
+        for dir_name, hosts in (("host_vars", active_hosts), ("all_host_vars", all_hosts)):
+            assert sorted(p.name for p in (tmp_path / dir_name).iterdir() if p.suffix == ".yml") == \
+                sorted(f"{hostname}.yml" for hostname in hosts)
+            for hostname, host_data in hosts.items():
+                expected = yaml.dump(host_data, default_flow_style=False, sort_keys=False, Dumper=NoAliasDumper)
+                assert (tmp_path / dir_name / f"{hostname}.yml").read_text() == expected
+        snapshot = tmp_path / "host_vars" / "fleet.jsonl"
+        assert (read_header(snapshot)["hosts"], read_header(snapshot)["miners"]) == (1, 2)
+        assert [r["name"] for r in iter_records(snapshot)] == ['6a01', '6a03']
+        assert sorted(p.name for p in (tmp_path / "host_vars").iterdir()) == ["fleet.jsonl", "s6_6a1.yml"]
+
+    def test_failed_stream_keeps_previous_host_files(self, tmp_path, mock_google_setup):
+        mock_google_setup.values().get().execute.return_value = {'values': [
+            self.header,
+            ['s6_6a1', 'AWS', '192.168.1.101', '8001', '6a01', 'main', '2', 'TRUE',
+             'openai_key', 'anthropic_key', 'google_key', 'azure_key', 'perplexity_key'],
+        ]}
+        reader = ConfigReader()
+        (tmp_path / "host_vars").mkdir()
+        (tmp_path / "host_vars" / "s6_old.yml").write_text("miners: []\n")
+
+        with pytest.raises(ValueError):
+            reader.stream_host_trees(tmp_path / "host_vars", tmp_path / "all_host_vars")
+
+        assert sorted(p.name for p in (tmp_path / "host_vars").iterdir()) == ["s6_old.yml"]
+
+
+def test_host_trees_match_per_tree_dump(tmp_path, mock_google_setup):
+    import yaml
+    from sync_config import NoAliasDumper
+
+    shared = {"name": "6a01", "port": "8001", "branch": "main", "netuid": None,
+              "config": {"ID": "1", "FLAG": "TRUE", "PROMPT": "a long value " * 10, "NOTE": "two\nlines"},
+              "secrets": {"openai_key": "gAAAAA" * 30}}
+    inactive = {**shared, "name": "6a02", "port": "8002"}
+    active_hosts = {"s6_6a1": {"ansible_host": "192.168.1.101", "provider": "AWS", "miners": [shared]}}
+    all_hosts = {"s6_6a1": {"ansible_host": "192.168.1.101", "provider": "AWS", "miners": [shared, inactive]},
+                 "s6_6b2": {"ansible_host": "192.168.1.108", "provider": "AWS", "miners": []}}
+    (tmp_path / "host_vars").mkdir()
+    (tmp_path / "host_vars" / "stale.yml").write_text("miners: []\n")
+
+    ConfigReader().save_host_trees({tmp_path / "host_vars": active_hosts, tmp_path / "all_host_vars": all_hosts})
+
+    for dir_name, hosts in (("host_vars", active_hosts), ("all_host_vars", all_hosts)):
+        assert sorted(p.stem for p in (tmp_path / dir_name).glob("*.yml")) == sorted(hosts)
+        for hostname, host_data in hosts.items():
+            expected = yaml.dump(host_data, default_flow_style=False, sort_keys=False, Dumper=NoAliasDumper)
+            assert (tmp_path / dir_name / f"{hostname}.yml").read_text() == expected
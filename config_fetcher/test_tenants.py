@@ -0,0 +1,74 @@
+import pytest
+import yaml
+from unittest.mock import patch
+
+from fleet_snapshot import iter_records, read_header
+from sync_config import ConfigReader
+from tenants import fetch_and_save_tenants, load_tenants_from_env
+
+MINER = {"name": "6b01", "port": "8091", "branch": "main",
+         "config": {"ID": "1", "KUMA_INTERVAL": "120"}, "secrets": {"openai_key": "encrypted"}}
+# (hostname, host fields, miner, active) rows of each sheet
+MINERS = {
+    "sheet-a": [("host1", {"ansible_host": "10.0.0.1", "provider": "AWS"}, {**MINER, "name": "6a01"}, True),
+                ("host2", {"ansible_host": "10.0.0.2", "provider": "AWS"}, {**MINER, "name": "6a02"}, False)],
+    "sheet-b": [("host1", {"ansible_host": "10.1.0.1", "provider": "GCP"}, MINER, True)],
+}
+
+
+class FakeReader:
+    def __init__(self, spreadsheet_id, encryption_manager=None):
+        if spreadsheet_id == "broken":
+            raise RuntimeError("sheet unavailable")
+        self.spreadsheet_id = spreadsheet_id
+
+    def process_configs(self):
+        pass
+
+    def iter_miners(self):
+        return iter(MINERS[self.spreadsheet_id])
+
+    stream_host_trees = ConfigReader.stream_host_trees
+
+
+@pytest.fixture
+def fake_reader():
+    with patch("tenants.ConfigReader", FakeReader), patch("tenants.EncryptionManager"):
+        yield
+
+
+def test_load_tenants_from_env():
+    with patch.dict("os.environ", {"SPREADSHEETS": "a=id1, b=id2,"}):
+        assert load_tenants_from_env() == {"a": "id1", "b": "id2"}
+    with patch.dict("os.environ", {"SPREADSHEETS": "a"}):
+        with pytest.raises(ValueError):
+            load_tenants_from_env()
+
+
+def test_tenants_are_namespaced_and_merged(tmp_path, fake_reader):
+    results = fetch_and_save_tenants({"a": "sheet-a", "b": "sheet-b"}, tmp_path)
+
+    assert all(result.ok for result in results)
+    assert sorted(p.name for p in (tmp_path / "tenants" / "a" / "all_host_vars").glob("*.yml")) == ["host1.yml", "host2.yml"]
+    assert sorted(p.name for p in (tmp_path / "host_vars").glob("*.yml")) == ["a__host1.yml", "b__host1.yml"]
+    assert yaml.safe_load((tmp_path / "host_vars" / "b__host1.yml").read_text())["provider"] == "GCP"
+
+    index = yaml.safe_load((tmp_path / "tenants" / "index.yml").read_text())
+    assert [t["tenant"] for t in index["tenants"]] == ["a", "b"]
+    assert index["tenants"][0]["all_hosts"] == 2
+
+    snapshot = tmp_path / "host_vars" / "fleet.jsonl"
+    assert read_header(snapshot)["hosts"] == 2
+    assert list(iter_records(snapshot))[1:] == [{
+        "name": "6b01", "host": "b__host1", "ip": "10.1.0.1", "port": "8091", "provider": "GCP",
+        "branch": "main", "netuid": None, "kuma": {"KUMA_INTERVAL": "120"},
+    }]
+
+
+def test_failed_tenant_keeps_previous_files(tmp_path, fake_reader):
+    fetch_and_save_tenants({"a": "sheet-a", "b": "sheet-b"}, tmp_path)
+    results = fetch_and_save_tenants({"a": "sheet-a", "b": "broken"}, tmp_path)
+
+    assert [result.ok for result in results] == [True, False]
+    assert results[1].error == "sheet unavailable"
+    assert (tmp_path / "host_vars" / "b__host1.yml").exists()
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The image copies the shared modules of common/ next to the service's own
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "common"))
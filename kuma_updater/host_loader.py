@@ -0,0 +1,132 @@
+"""Reads the host_vars files into compact miner records, across a process pool for large fleets.
+
+Parsing YAML dominates ``load_hosts`` with thousands of host files, and it is CPU
+bound, so threads do not help. Below ``HOST_VARS_PARALLEL_THRESHOLD`` files the
+files are parsed in this process, as starting the pool would cost more than it saves.
+
+When config_fetcher wrote a fleet snapshot (see common/fleet_snapshot.py) for the
+current host files, the records are streamed from it and no YAML is parsed at all.
+"""
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Iterable, Iterator, List, NamedTuple, Optional
+
+import yaml
+from fleet_snapshot import SnapshotError, iter_records, read_header
+
+logger = logging.getLogger()
+
+# libyaml's loader when PyYAML was built with it, several times faster
+Loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# Files handed to a worker at once, so results are not pickled file by file
+CHUNK_SIZE = 64
+
+
+class MinerRecord(NamedTuple):
+    name: str
+    url: str
+    description: str
+    provider: str
+    branch: str
+    netuid: Optional[str] = None
+    # KUMA_* keys of the miner's Configs row (see monitor_templates.CONFIG_KEYS)
+    kuma_config: Optional[dict] = None
+
+
+def miner_record(name, ip, port, provider, branch, netuid=None, kuma_config=None) -> MinerRecord:
+    """Record from the raw host_vars values, read from the host files or the snapshot.
+
+    Both sources go through here, so a missing, null or empty value gets the same
+    default whichever of them the miner came from.
+    """
+    ip = ip or 'unknown'
+    port = port or '8080'
+    provider = provider or 'unknown'
+    branch = branch or ''
+    if netuid == '':
+        netuid = None
+    return MinerRecord(
+        name=name,
+        url=f"http://{ip}:{port}",
+        description=f"Provider: {provider}\nBranch: {branch}",
+        provider=provider,
+        branch=branch,
+        netuid=netuid,
+        kuma_config=kuma_config or None,
+    )
+
+
+def parse_host_file(path) -> List[MinerRecord]:
+    try:
+        with open(path, 'r') as f:
+            config = yaml.load(f, Loader=Loader)
+    except Exception as e:
+        logger.error(f"Error processing {path}: {e}")
+        return []
+    if not config or 'miners' not in config:
+        logger.warning(f"No miners found in {path}")
+        return []
+
+    ansible_host = config.get('ansible_host')
+    provider = config.get('provider')
+    records = []
+    for miner in config['miners'] or []:
+        name = miner.get('name')
+        if not name:
+            logger.warning(f"Miner without name in {path}")
+            continue
+        kuma_config = {key: value for key, value in (miner.get('config') or {}).items() if key.startswith("KUMA_")}
+        records.append(miner_record(name, ansible_host, miner.get('port'), provider,
+                                    miner.get('branch'), miner.get('netuid'), kuma_config))
+    return records
+
+
+def _parse_chunk(paths) -> List[MinerRecord]:
+    return [record for path in paths for record in parse_host_file(path)]
+
+
+def load_miner_records(paths: Iterable, workers: Optional[int] = None,
+                       threshold: Optional[int] = None) -> Iterator[MinerRecord]:
+    """Yield the miners of every host file, in completion order when parsed in parallel."""
+    paths = [str(path) for path in paths]
+    workers = workers or int(os.getenv("HOST_VARS_WORKERS", "0")) or os.cpu_count() or 1
+    threshold = threshold if threshold is not None else int(os.getenv("HOST_VARS_PARALLEL_THRESHOLD", "500"))
+    if workers < 2 or len(paths) < threshold:
+        for path in paths:
+            yield from parse_host_file(path)
+        return
+
+    chunks = [paths[i:i + CHUNK_SIZE] for i in range(0, len(paths), CHUNK_SIZE)]
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+        for future in as_completed([pool.submit(_parse_chunk, chunk) for chunk in chunks]):
+            yield from future.result()
+
+
+def load_snapshot_records(path, host_files: List) -> Optional[Iterator[MinerRecord]]:
+    """Records streamed from the fleet snapshot at ``path``, None if it is missing or unusable.
+
+    The snapshot is only used if it covers exactly ``host_files`` and is not older
+    than any of them, otherwise it is stale (or the files were edited by hand).
+    """
+    try:
+        snapshot_mtime = os.stat(path).st_mtime
+    except OSError:
+        return None
+    try:
+        header = read_header(path)
+    except (OSError, SnapshotError) as e:
+        logger.warning(f"Ignoring fleet snapshot: {e}")
+        return None
+    stale = header.get("hosts") != len(host_files) or any(
+        os.stat(host_file).st_mtime > snapshot_mtime for host_file in host_files)
+    if stale:
+        logger.warning(f"Fleet snapshot {path} does not match the host files, reading those instead")
+        return None
+    logger.info(f"Loading {header.get('miners')} miners from the fleet snapshot of {header.get('generated_at')}")
+    return (
+        miner_record(record['name'], record.get('ip'), record.get('port'), record.get('provider'),
+                     record.get('branch'), record.get('netuid'), record.get('kuma'))
+        for record in iter_records(path) if record.get('name')
+    )
@@ -0,0 +1,92 @@
+"""Read-only access to Uptime Kuma's SQLite database (``/app/data/kuma.db`` in the kuma container).
+
+Reading monitors straight from the database replaces a full socket.io monitor list
+dump per read with one indexed query. Writes always go through the API.
+"""
+import json
+import logging
+import os
+import sqlite3
+from contextlib import closing
+
+logger = logging.getLogger()
+
+# monitor columns read, and the key the API uses for each of them
+MONITOR_COLUMNS = {
+    "id": "id",
+    "name": "name",
+    "type": "type",
+    "url": "url",
+    "parent": "parent",
+    "description": "description",
+    "interval": "interval",
+    "retry_interval": "retryInterval",
+    "maxretries": "maxretries",
+    "timeout": "timeout",
+    "accepted_statuscodes_json": "accepted_statuscodes",
+    "active": "active",
+}
+
+
+class KumaDbSnapshot:
+    """Monitor state read from the Kuma database.
+
+    The database is opened with ``mode=ro`` for every read, so a read-only mount
+    works and the updater never takes a write lock. Kuma runs it in WAL mode; a
+    read-only connection sees everything Kuma committed, including pages still in
+    the ``-wal`` file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def _connect(self):
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, timeout=5)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def get_monitors(self):
+        """Monitors shaped like ``UptimeKumaApi.get_monitors()`` for the fields the updater uses."""
+        columns = ", ".join(MONITOR_COLUMNS)
+        with closing(self._connect()) as conn:
+            rows = conn.execute(f"SELECT {columns} FROM monitor ORDER BY id").fetchall()
+        monitors = []
+        for row in rows:
+            monitor = {key: row[column] for column, key in MONITOR_COLUMNS.items()}
+            monitor["active"] = bool(monitor["active"])
+            monitor["accepted_statuscodes"] = json.loads(monitor["accepted_statuscodes"] or "[]")
+            monitors.append(monitor)
+        return monitors
+
+
+class SnapshotKumaApi:
+    """Kuma API whose ``get_monitors()`` reads the database snapshot.
+
+    Every other call goes to the wrapped API, and so does ``get_monitors()`` when
+    the database cannot be read.
+    """
+
+    def __init__(self, api, snapshot):
+        self._api = api
+        self.snapshot = snapshot
+
+    def get_monitors(self):
+        try:
+            return self.snapshot.get_monitors()
+        except sqlite3.Error as e:
+            logger.warning(f"Could not read monitors from {self.snapshot.path}, using the API: {e}")
+            return self._api.get_monitors()
+
+    def __getattr__(self, name):
+        return getattr(self._api, name)
+
+
+def snapshot_api(api):
+    """Wrap ``api`` with the database snapshot when KUMA_DB_PATH points to an existing file."""
+    path = os.getenv("KUMA_DB_PATH")
+    if not path:
+        return api
+    if not os.path.exists(path):
+        logger.warning(f"KUMA_DB_PATH {path} not found, reading monitors through the API")
+        return api
+    return SnapshotKumaApi(api, KumaDbSnapshot(path))
@@ -0,0 +1,103 @@
+"""Spreads Kuma's probes over time instead of probing the whole fleet in lockstep.
+
+Kuma starts a monitor's probe cycle when the monitor is created or edited, so a
+burst of creates or edits leaves those monitors probing in the same second for
+good. The updater therefore paces bulk creates and edits over a window, each
+monitor at a stable offset derived from a hash of its name. A probes-per-second
+budget stretches the intervals when the fleet outgrows it, in steps so a few miners
+more or less do not edit the whole fleet, and an optional jitter gives monitors
+slightly different intervals so phases also drift apart over time.
+"""
+import hashlib
+import math
+import os
+import time
+from collections import Counter
+from dataclasses import dataclass
+
+from cycle_runner import time_left
+
+
+def phase(name):
+    """Stable position of ``name`` in [0, 1)."""
+    digest = hashlib.sha256(name.encode()).digest()
+    return int.from_bytes(digest[:8], "big") / 2**64
+
+
+@dataclass
+class LoadShaping:
+    # Maximum average probes per second across the fleet, 0 for no limit
+    probes_per_second: float = 0
+    # Up to this fraction of the interval is added per monitor, by phase
+    jitter: float = 0
+    # Bulk creates/edits are spread over this many seconds (capped at the interval)
+    spread_seconds: float = 60
+    # Fewer writes than this in a cycle are sent right away
+    min_paced_writes: int = 10
+    # Budget intervals are rounded up to a multiple of this, so the fleet is only
+    # re-edited when its size crosses a step
+    budget_step_seconds: int = 30
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            probes_per_second=float(os.getenv("PROBE_BUDGET_PER_SECOND", "0")),
+            jitter=float(os.getenv("PROBE_INTERVAL_JITTER", "0")),
+            spread_seconds=float(os.getenv("MONITOR_WRITE_SPREAD_SECONDS", "60")),
+            budget_step_seconds=int(os.getenv("PROBE_BUDGET_STEP_SECONDS", "30")),
+        )
+
+    def interval(self, name, base_interval, fleet_size):
+        interval = base_interval
+        if self.probes_per_second > 0:
+            needed = fleet_size / self.probes_per_second
+            step = max(self.budget_step_seconds, 1)
+            interval = max(interval, math.ceil(needed / step) * step)
+        return interval + int(phase(name) * interval * self.jitter)
+
+    def offset(self, name, interval, spread_seconds=None):
+        """Seconds into a paced write burst at which ``name`` is written."""
+        spread = self.spread_seconds if spread_seconds is None else spread_seconds
+        return phase(name) * min(spread, interval)
+
+    def pace(self, writes, sleep=time.sleep, clock=time.monotonic, time_left=time_left):
+        """Yield ``(name, interval, item)`` writes in offset order, each at its offset.
+
+        Inside a cycle the spread is capped at half the time left before its
+        deadline, so the writes end in time for the rest of the cycle.
+        """
+        spread = self.spread_seconds
+        remaining = time_left()
+        if remaining is not None:
+            spread = min(spread, max(remaining / 2, 0))
+        if len(writes) < self.min_paced_writes or spread <= 0:
+            yield from writes
+            return
+        start = clock()
+        for write in sorted(writes, key=lambda w: self.offset(w[0], w[1], spread)):
+            delay = start + self.offset(write[0], write[1], spread) - clock()
+            if delay > 0:
+                sleep(delay)
+            yield write
+
+
+def load_profile(monitors, horizon=600):
+    """Expected probes per second from ``(interval, offset)`` pairs over ``horizon`` seconds.
+
+    Returns the mean rate, the busiest second and the 99th percentile second.
+    """
+    if not monitors:
+        return {"monitors": 0, "mean": 0.0, "peak": 0, "p99": 0}
+    seconds = Counter()
+    for interval, offset in monitors:
+        at = offset % interval
+        while at < horizon:
+            seconds[int(at)] += 1
+            at += interval
+    per_second = sorted(seconds.get(s, 0) for s in range(horizon))
+    return {
+        "monitors": len(monitors),
+        "mean": round(sum(1 / interval for interval, _ in monitors), 2),
+        "peak": per_second[-1],
+        "p99": per_second[int(len(per_second) * 0.99)],
+    }
@@ -0,0 +1,223 @@
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+from cycle_runner import check_deadline
+
+from prometheus_client import (
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    start_http_server,
+    write_to_textfile,
+)
+
+logger = logging.getLogger()
+
+REGISTRY = CollectorRegistry()
+
+_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+CYCLE_DURATION = Histogram(
+    "kuma_updater_cycle_duration_seconds",
+    "Wall time of a full update cycle",
+    buckets=_BUCKETS,
+    registry=REGISTRY,
+)
+STAGE_DURATION = Histogram(
+    "kuma_updater_stage_duration_seconds",
+    "Wall time of a single stage of the update cycle",
+    ["stage"],
+    buckets=_BUCKETS,
+    registry=REGISTRY,
+)
+CYCLES = Counter(
+    "kuma_updater_cycles_total",
+    "Update cycles by outcome",
+    ["outcome"],
+    registry=REGISTRY,
+)
+CYCLE_OVERRUNS = Counter(
+    "kuma_updater_cycle_overruns_total",
+    "Update cycles that took longer than the configured interval",
+    registry=REGISTRY,
+)
+LAST_CYCLE_DURATION = Gauge(
+    "kuma_updater_last_cycle_duration_seconds",
+    "Wall time of the most recent update cycle",
+    registry=REGISTRY,
+)
+LAST_CYCLE_TIMESTAMP = Gauge(
+    "kuma_updater_last_cycle_timestamp_seconds",
+    "Unix time at which the most recent update cycle finished",
+    registry=REGISTRY,
+)
+CYCLE_INTERVAL = Gauge(
+    "kuma_updater_cycle_interval_seconds",
+    "Configured interval between update cycles (UPDATE_INTERVAL_MIN)",
+    registry=REGISTRY,
+)
+SKIPPED_TICKS = Counter(
+    "kuma_updater_skipped_ticks_total",
+    "Scheduled cycles skipped because the previous cycle was still running",
+    registry=REGISTRY,
+)
+API_CALLS = Counter(
+    "kuma_updater_api_calls_total",
+    "Uptime Kuma API calls by method",
+    ["method"],
+    registry=REGISTRY,
+)
+API_ERRORS = Counter(
+    "kuma_updater_api_errors_total",
+    "Uptime Kuma API calls that raised, by method",
+    ["method"],
+    registry=REGISTRY,
+)
+MONITOR_WRITES = Counter(
+    "kuma_updater_monitor_writes_total",
+    "Monitor creates and edits sent to Uptime Kuma",
+    ["action"],
+    registry=REGISTRY,
+)
+STAGE_FAILURES = Counter(
+    "kuma_updater_stage_failures_total",
+    "Stages of the update cycle that raised",
+    ["stage"],
+    registry=REGISTRY,
+)
+PROBE_LOAD = Gauge(
+    "kuma_updater_expected_probes_per_second",
+    "Kuma probe rate expected from the planned monitor intervals (mean, peak and p99 second)",
+    ["stat"],
+    registry=REGISTRY,
+)
+SUBTENSOR_CONNECTED = Gauge(
+    "kuma_updater_subtensor_connected",
+    "1 while the subtensor connection is up and the metagraphs are synced",
+    registry=REGISTRY,
+)
+SUBTENSOR_CONNECTS = Counter(
+    "kuma_updater_subtensor_connects_total",
+    "Subtensor connection attempts by outcome",
+    ["outcome"],
+    registry=REGISTRY,
+)
+
+_WRITE_ACTIONS = {"add_monitor": "create", "edit_monitor": "edit"}
+
+_cycle_interval = None
+# Stages that raised during the running cycle; job() logs their errors instead of raising
+_failed_stages = []
+
+
+class InstrumentedKumaApi:
+    """Proxy around UptimeKumaApi that counts calls, errors and monitor writes."""
+
+    def __init__(self, api):
+        self._api = api
+
+    def __getattr__(self, name):
+        attr = getattr(self._api, name)
+        if not callable(attr):
+            return attr
+
+        def wrapper(*args, **kwargs):
+            API_CALLS.labels(method=name).inc()
+            try:
+                result = attr(*args, **kwargs)
+            except Exception:
+                API_ERRORS.labels(method=name).inc()
+                raise
+            if name in _WRITE_ACTIONS:
+                MONITOR_WRITES.labels(action=_WRITE_ACTIONS[name]).inc()
+            return result
+
+        return wrapper
+
+
+@contextmanager
+def stage_timer(stage):
+    """Time one stage of the cycle and count it as failed if it raises.
+
+    A stage does not start once the cycle is past its deadline (see cycle_runner).
+    """
+    start = time.perf_counter()
+    try:
+        check_deadline(stage)
+        yield
+    except Exception:
+        STAGE_FAILURES.labels(stage=stage).inc()
+        _failed_stages.append(stage)
+        raise
+    finally:
+        STAGE_DURATION.labels(stage=stage).observe(time.perf_counter() - start)
+
+
+@contextmanager
+def cycle_timer():
+    """Time a full cycle, flag overruns of the configured interval and flush the textfile.
+
+    The cycle counts as an error if it raises or if any of its stages raised, even
+    when the caller caught and logged that error.
+    """
+    start = time.perf_counter()
+    _failed_stages.clear()
+    outcome = "success"
+    try:
+        yield
+    except Exception:
+        outcome = "error"
+        raise
+    finally:
+        if _failed_stages:
+            outcome = "error"
+        duration = time.perf_counter() - start
+        CYCLE_DURATION.observe(duration)
+        LAST_CYCLE_DURATION.set(duration)
+        LAST_CYCLE_TIMESTAMP.set(time.time())
+        CYCLES.labels(outcome=outcome).inc()
+
+        interval = _cycle_interval
+        if interval and duration > interval:
+            CYCLE_OVERRUNS.inc()
+            logger.warning(
+                f"Update cycle took {duration:.1f}s, longer than the {interval:.0f}s interval")
+        write_textfile()
+
+
+def set_cycle_interval(seconds):
+    global _cycle_interval
+    _cycle_interval = seconds
+    CYCLE_INTERVAL.set(seconds)
+
+
+def set_probe_load(profile):
+    for stat in ("mean", "peak", "p99"):
+        PROBE_LOAD.labels(stat=stat).set(profile[stat])
+
+
+def record_skipped_ticks(count):
+    SKIPPED_TICKS.inc(count)
+
+
+def start_metrics_server():
+    """Expose /metrics over HTTP if METRICS_PORT is set."""
+    port = os.getenv("METRICS_PORT")
+    if not port:
+        return
+    start_http_server(int(port), registry=REGISTRY)
+    logger.info(f"Metrics endpoint listening on :{port}/metrics")
+
+
+def write_textfile():
+    """Write the registry in Prometheus text format if METRICS_TEXTFILE is set."""
+    path = os.getenv("METRICS_TEXTFILE")
+    if not path:
+        return
+    try:
+        write_to_textfile(path, REGISTRY)
+    except Exception as e:
+        logger.error(f"Could not write metrics textfile {path}: {e}")
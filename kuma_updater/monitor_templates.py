@@ -0,0 +1,192 @@
+"""Kuma monitor settings from templates, and the create/edit plan that applies them.
+
+Settings are layered, later layers win:
+
+1. ``DEFAULT_TEMPLATE``
+2. ``defaults`` of the templates file (``MONITOR_TEMPLATES``, default ``monitor_templates.yml``)
+3. its ``providers.<provider>`` entry (provider names match case-insensitively)
+4. its ``branches.<branch>`` entry
+5. ``KUMA_*`` columns of the miner's row in the sheet's Configs tab (``CONFIG_KEYS``)
+
+For example::
+
+    defaults:
+      interval: 60
+    providers:
+      Hetzner:
+        interval: 120
+        retryInterval: 120
+    branches:
+      dev:
+        maxretries: 5
+"""
+import logging
+import os
+from dataclasses import dataclass, field
+from enum import Enum
+
+import yaml
+from cycle_runner import check_deadline
+from uptime_kuma_api import MonitorType
+
+logger = logging.getLogger()
+
+DEFAULT_TEMPLATE = {
+    "type": MonitorType.HTTP,
+    "interval": 60,
+    "retryInterval": 60,
+    "maxretries": 3,
+    "accepted_statuscodes": ["200-299"],
+}
+
+# Configs tab column -> (monitor field, type)
+CONFIG_KEYS = {
+    "KUMA_TYPE": ("type", MonitorType),
+    "KUMA_INTERVAL": ("interval", int),
+    "KUMA_RETRY_INTERVAL": ("retryInterval", int),
+    "KUMA_MAXRETRIES": ("maxretries", int),
+    "KUMA_TIMEOUT": ("timeout", int),
+}
+TEMPLATE_FIELDS = {monitor_field for monitor_field, _ in CONFIG_KEYS.values()} | set(DEFAULT_TEMPLATE)
+# Fields every monitor list carries, the API's and kuma_db's alike. Other fields
+# (unknown template fields) may be missing from the monitors read from the database
+# and cannot be compared there.
+COMPARED_FIELDS = TEMPLATE_FIELDS | {"name", "url", "description", "parent"}
+
+
+class MonitorTemplates:
+    def __init__(self, defaults=None, providers=None, branches=None):
+        self.defaults = {**DEFAULT_TEMPLATE, **(defaults or {})}
+        self.providers = {name.lower(): values for name, values in (providers or {}).items()}
+        self.branches = {str(name): values for name, values in (branches or {}).items()}
+
+    @classmethod
+    def load(cls, path):
+        """Templates from a YAML file; the built-in defaults alone if there is none."""
+        if not path or not os.path.exists(path):
+            return cls()
+        with open(path) as f:
+            data = yaml.safe_load(f) or {}
+        layers = [data.get("defaults") or {}]
+        layers += (data.get("providers") or {}).values()
+        layers += (data.get("branches") or {}).values()
+        unknown = {key for layer in layers for key in layer} - TEMPLATE_FIELDS
+        if unknown:
+            logger.warning(f"Unknown monitor template fields in {path} are applied as is: {sorted(unknown)}")
+        return cls(data.get("defaults"), data.get("providers"), data.get("branches"))
+
+    def for_miner(self, provider, branch, config=None):
+        settings = {
+            **self.defaults,
+            **self.providers.get(str(provider).lower(), {}),
+            **self.branches.get(str(branch), {}),
+        }
+        for key, (monitor_field, coerce) in CONFIG_KEYS.items():
+            value = (config or {}).get(key)
+            if value in (None, ""):
+                continue
+            try:
+                settings[monitor_field] = coerce(value)
+            except (TypeError, ValueError):
+                logger.warning(f"Invalid {key} value {value!r} in Configs, using the template value")
+        return settings
+
+
+_cache = {}
+
+
+def load_templates(path=None):
+    """``MonitorTemplates.load`` cached until the file changes."""
+    path = path or os.getenv("MONITOR_TEMPLATES", "monitor_templates.yml")
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        mtime = None
+    cached = _cache.get(path)
+    if cached is None or cached[0] != mtime:
+        cached = _cache[path] = (mtime, MonitorTemplates.load(path))
+    return cached[1]
+
+
+def _normalize(value):
+    if isinstance(value, Enum):
+        value = value.value
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, (list, tuple)):
+        return sorted(_normalize(v) for v in value)
+    return value
+
+
+def diff_fields(existing, desired):
+    """Fields of ``desired`` whose value differs from ``existing``.
+
+    Values are compared after normalization (enums by value, numbers as floats,
+    lists unordered). A field of ``COMPARED_FIELDS`` that ``existing`` does not carry
+    differs; any other missing field is skipped, since its current value is unknown.
+    """
+    changes = {}
+    for key, value in desired.items():
+        if key not in existing:
+            if key in COMPARED_FIELDS:
+                changes[key] = value
+        elif _normalize(existing[key]) != _normalize(value):
+            changes[key] = value
+    return changes
+
+
+@dataclass
+class MonitorPlan:
+    creates: list = field(default_factory=list)
+    # (monitor id, name, changed fields)
+    edits: list = field(default_factory=list)
+    unchanged: int = 0
+    # Desired interval of every planned monitor, by name
+    intervals: dict = field(default_factory=dict)
+
+    def add(self, existing, desired):
+        self.intervals[desired["name"]] = desired.get("interval", DEFAULT_TEMPLATE["interval"])
+        if existing is None:
+            self.creates.append(desired)
+            return
+        changes = diff_fields(existing, desired)
+        if changes:
+            self.edits.append((existing["id"], desired["name"], changes))
+        else:
+            self.unchanged += 1
+
+    def summary(self):
+        changed_fields = {}
+        for _, _, changes in self.edits:
+            for key in changes:
+                changed_fields[key] = changed_fields.get(key, 0) + 1
+        return (f"{len(self.creates)} to create, {len(self.edits)} to edit {changed_fields}, "
+                f"{self.unchanged} unchanged")
+
+
+def apply_plan(api, plan, shaping=None):
+    """Send the plan's edits and creates, paced by ``shaping`` (see load_shaping) if given.
+
+    This is not a bulk apply: Kuma's API has no batch write, so every edit and create
+    is its own ``edit_monitor``/``add_monitor`` call. The plan only saves the calls
+    for unchanged monitors and the fields an edit does not touch. Kuma (re)starts a
+    monitor's probe cycle on every create and edit, so pacing them keeps a large
+    change from lining up the probes of the monitors it touched.
+    """
+    logger.info(f"Monitor plan: {plan.summary()}")
+    writes = [(name, plan.intervals[name], ("edit", monitor_id, changes)) for monitor_id, name, changes in plan.edits]
+    writes += [(data["name"], plan.intervals[data["name"]], ("create", None, data)) for data in plan.creates]
+    for name, _, (action, monitor_id, data) in (shaping.pace(writes) if shaping else writes):
+        # The writes left over are retried by the next cycle
+        check_deadline("the remaining monitor writes")
+        try:
+            if action == "edit":
+                api.edit_monitor(monitor_id, **data)
+                logger.info(f"Updated monitor: {name} (ID: {monitor_id}) - Fields: {list(data)}")
+            else:
+                response = api.add_monitor(**data)
+                logger.info(f"Created monitor: {name} (ID: {response.get('monitorID')})")
+        except Exception as e:
+            logger.error(f"Error {'updating' if action == 'edit' else 'creating'} monitor {name}: {e}")
@@ -0,0 +1,31 @@
+import yaml
+from fleet_snapshot import SNAPSHOT_FILE, snapshot_records, write_snapshot
+
+from host_loader import load_miner_records, load_snapshot_records
+
+
+def test_host_files_and_snapshot_give_the_same_records(tmp_path):
+    hosts = {
+        "host1": {"ansible_host": "10.0.0.1", "provider": "Hetzner", "miners": [
+            {"name": "m1", "port": 8091, "branch": "main", "netuid": 6, "config": {"KUMA_INTERVAL": "120", "WALLET": "x"}},
+            # No port, empty branch
+            {"name": "m2", "branch": ""},
+        ]},
+        # No provider, null address and port
+        "host2": {"ansible_host": None, "miners": [{"name": "m3", "port": None, "branch": "dev"}]},
+    }
+    paths = []
+    for hostname, host in hosts.items():
+        path = tmp_path / f"{hostname}.yml"
+        path.write_text(yaml.safe_dump(host))
+        paths.append(path)
+    write_snapshot(snapshot_records(hosts), tmp_path / SNAPSHOT_FILE, hosts=len(hosts))
+
+    from_files = sorted(load_miner_records(paths, workers=1))
+    from_snapshot = sorted(load_snapshot_records(tmp_path / SNAPSHOT_FILE, paths))
+    assert from_files == from_snapshot
+    assert [(r.name, r.url, r.provider) for r in from_files] == [
+        ("m1", "http://10.0.0.1:8091", "Hetzner"),
+        ("m2", "http://10.0.0.1:8080", "Hetzner"),
+        ("m3", "http://unknown:8080", "unknown"),
+    ]
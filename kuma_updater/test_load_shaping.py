@@ -0,0 +1,27 @@
+from load_shaping import LoadShaping
+
+
+def test_budget_interval_changes_in_steps():
+    shaping = LoadShaping(probes_per_second=10, budget_step_seconds=30)
+    # 1000 and 1001 miners need 100s and 100.1s, both are run at 120s
+    assert shaping.interval("m1", 60, 1000) == shaping.interval("m1", 60, 1001) == 120
+    assert shaping.interval("m1", 60, 1201) == 150
+    # The template interval still wins when it is longer
+    assert shaping.interval("m1", 300, 1000) == 300
+
+
+def test_pace_spread_is_capped_by_the_cycle_deadline():
+    now = [0.0]
+
+    def sleep(seconds):
+        now[0] += seconds
+
+    shaping = LoadShaping(spread_seconds=60)
+    writes = [(f"m{i}", 600, i) for i in range(50)]
+    assert len(list(shaping.pace(writes, sleep=sleep, clock=lambda: now[0], time_left=lambda: 20))) == 50
+    # Half of the 20s left in the cycle, not the 60s spread
+    assert 9 <= now[0] <= 10
+
+    now[0] = 0.0
+    list(shaping.pace(writes, sleep=sleep, clock=lambda: now[0], time_left=lambda: None))
+    assert 50 <= now[0] <= 60
@@ -0,0 +1,26 @@
+from unittest.mock import MagicMock, patch
+
+import update_status
+from metrics import REGISTRY
+
+
+def cycles(outcome):
+    return REGISTRY.get_sample_value("kuma_updater_cycles_total", {"outcome": outcome}) or 0
+
+
+def test_cycle_with_a_failing_stage_counts_as_error(monkeypatch):
+    monkeypatch.setenv("KUMA_PASS", "secret")
+    api = MagicMock()
+    bt_conn = MagicMock(netuids=[6])
+    before = {outcome: cycles(outcome) for outcome in ("success", "error")}
+
+    with patch.object(update_status, "snapshot_api", return_value=api), \
+            patch.object(update_status, "UptimeKumaApi"), \
+            patch.object(update_status.provisioning, "ensure"), \
+            patch.object(update_status, "load_hosts", side_effect=OSError("host_vars missing")), \
+            patch.object(update_status, "update_miner_groups"):
+        update_status.job(bt_conn)
+
+    assert cycles("error") == before["error"] + 1
+    assert cycles("success") == before["success"]
+    api.disconnect.assert_called_once()
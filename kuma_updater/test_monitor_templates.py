@@ -0,0 +1,12 @@
+from monitor_templates import DEFAULT_TEMPLATE, diff_fields
+
+
+def test_missing_fields_count_as_changes():
+    existing = {"id": 1, "name": "m1", "url": "http://10.0.0.1:8091", **DEFAULT_TEMPLATE,
+                "accepted_statuscodes": ["200-299"], "interval": 60.0}
+    assert diff_fields(existing, {"name": "m1", "interval": 60, "type": DEFAULT_TEMPLATE["type"]}) == {}
+
+    # A Configs KUMA_TIMEOUT on a monitor listed without a timeout is applied
+    assert diff_fields(existing, {"name": "m1", "timeout": 30}) == {"timeout": 30}
+    # An unknown template field the monitor list does not carry cannot be compared
+    assert diff_fields(existing, {"name": "m1", "keyword": "ok"}) == {}
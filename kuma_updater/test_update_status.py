@@ -0,0 +1,40 @@
+from unittest.mock import MagicMock, patch
+
+import update_status
+from update_status import Provisioning, ProvisionedState
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_deleted_notification_redoes_the_bootstrap():
+    clock = FakeClock()
+    provisioning = Provisioning(notification_check_seconds=600, clock=clock)
+    api = MagicMock()
+    api.get_notifications.return_value = [{"id": 7, "name": "Miner Restarter Webhook"}]
+    states = [
+        ProvisionedState({"Active Miners": 1}, {"email": None, "internal_webhook": 7}, complete=True),
+        ProvisionedState({"Active Miners": 1}, {"email": None, "internal_webhook": 8}, complete=True),
+    ]
+
+    with patch.object(update_status, "load_default_groups_and_notifications", side_effect=states) as bootstrap:
+        provisioning.ensure(api, [6])
+        # Cached, and the notifications are not listed again before the check interval
+        clock.now += 300
+        provisioning.ensure(api, [6])
+        api.get_notifications.assert_not_called()
+
+        clock.now += 300
+        assert provisioning.ensure(api, [6]).notifications["internal_webhook"] == 7
+        assert bootstrap.call_count == 1
+
+        # The webhook notification was deleted in Kuma and is set up again
+        api.get_notifications.return_value = []
+        clock.now += 600
+        assert provisioning.ensure(api, [6]).notifications["internal_webhook"] == 8
+        assert bootstrap.call_count == 2
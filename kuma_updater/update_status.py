@@ -1,15 +1,34 @@
+import asyncio
+import concurrent.futures
 import csv
 import hashlib
 import logging
 import os
+import threading
 import time
+from dataclasses import dataclass, field
+from enum import Enum
 
-import bittensor as bt
-import requests
-import schedule
 from pathlib import Path
 from uptime_kuma_api import UptimeKumaApi, MonitorType, NotificationType
-import yaml
+
+from cycle_runner import CycleRunner, check_deadline, install_trigger_signal
+from fleet_snapshot import SNAPSHOT_FILE
+from host_loader import load_miner_records, load_snapshot_records
+from kuma_db import snapshot_api
+from load_shaping import LoadShaping, load_profile
+from monitor_templates import MonitorPlan, apply_plan, load_templates
+from metrics import (
+    SUBTENSOR_CONNECTED,
+    SUBTENSOR_CONNECTS,
+    InstrumentedKumaApi,
+    cycle_timer,
+    record_skipped_ticks,
+    set_cycle_interval,
+    set_probe_load,
+    stage_timer,
+    start_metrics_server,
+)
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
@@ -17,50 +36,200 @@ logging.basicConfig(
 logger = logging.getLogger()
 
 
+class ConnectionState(Enum):
+    DISCONNECTED = "disconnected"
+    CONNECTING = "connecting"
+    CONNECTED = "connected"
+    # The last attempt failed, the next one is allowed after a backoff
+    BACKOFF = "backoff"
+
+
+def _import_bittensor():
+    """Import bittensor on first use; the import alone takes several seconds."""
+    import bittensor
+    from bittensor.core.metagraph import AsyncMetagraph
+    return bittensor, AsyncMetagraph
+
+
 class BittensorConnection:
-    def _init_subtensor_connection(self, netuid) -> None:
-        for attempt in range(3):
+    """One subtensor websocket shared by the metagraphs of every configured netuid.
+
+    The AsyncSubtensor lives on a private event loop in a background thread, so the
+    per-netuid metagraphs can be synced concurrently over that single connection.
+
+    Connecting never blocks the caller: ``start()`` (and any sync while disconnected)
+    schedules the connection on that loop and returns, so the Kuma bootstrap can run
+    meanwhile. A failed attempt moves to BACKOFF and the next one waits
+    ``backoff_base * 2**(failures-1)`` seconds, capped at ``backoff_max``.
+    """
+
+    def __init__(self, netuids, backoff_base=5, backoff_max=300, clock=time.monotonic) -> None:
+        self.netuids = list(netuids)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.clock = clock
+        self.subtensor = None
+        self.metagraphs = {}
+        self.state = ConnectionState.DISCONNECTED
+        self._failures = 0
+        self._retry_at = 0.0
+        self._attempt = None
+        self._lock = threading.Lock()
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(
+            target=self._loop.run_forever, name="subtensor-loop", daemon=True
+        ).start()
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    async def _connect(self) -> None:
+        bt, AsyncMetagraph = await asyncio.to_thread(_import_bittensor)
+        if self.subtensor is not None:
             try:
-                self.subtensor = bt.subtensor()
-                self.metagraph = bt.metagraph(
-                    netuid=netuid, lite=True, subtensor=self.subtensor
-                )
-                logger.info("Subtensor connection created")
-                break
+                await self.subtensor.close()
             except Exception as e:
-                logger.warning(
-                    f"Failed to connect: {e} (Attempt {attempt + 1})")
-                time.sleep(5)
-        else:
-            logger.error("Could not estabilsh connection with subtensor")
+                logger.debug(f"Error closing previous subtensor connection: {e}")
 
-    def __init__(self, netuid) -> None:
-        self._init_subtensor_connection(netuid)
-
-    def safe_sync(self) -> None:
+        subtensor = bt.AsyncSubtensor()
+        await subtensor.initialize()
+        metagraphs = {
+            netuid: AsyncMetagraph(netuid=netuid, lite=True, sync=False, subtensor=subtensor)
+            for netuid in self.netuids
+        }
+        await asyncio.gather(*(m.sync(subtensor=subtensor) for m in metagraphs.values()))
+        self.subtensor = subtensor
+        self.metagraphs = metagraphs
+
+    def start(self) -> None:
+        """Connect in the background (no-op while connected, connecting or backing off)."""
+        with self._lock:
+            if self.state in (ConnectionState.CONNECTING, ConnectionState.CONNECTED):
+                return
+            if self.state == ConnectionState.BACKOFF and self.clock() < self._retry_at:
+                return
+            self.state = ConnectionState.CONNECTING
+            self._attempt = asyncio.run_coroutine_threadsafe(self._attempt_connect(), self._loop)
+
+    async def _attempt_connect(self) -> None:
+        try:
+            await self._connect()
+        except Exception as e:
+            with self._lock:
+                self._failures += 1
+                delay = min(self.backoff_base * 2 ** (self._failures - 1), self.backoff_max)
+                self._retry_at = self.clock() + delay
+                self.state = ConnectionState.BACKOFF
+            logger.warning(f"Failed to connect to subtensor: {e} "
+                           f"(attempt {self._failures}, retrying in {delay:.0f}s)")
+            SUBTENSOR_CONNECTS.labels(outcome="failed").inc()
+        else:
+            with self._lock:
+                self._failures = 0
+                self.state = ConnectionState.CONNECTED
+            logger.info(f"Subtensor connection created for netuids {self.netuids}")
+            SUBTENSOR_CONNECTS.labels(outcome="connected").inc()
+        SUBTENSOR_CONNECTED.set(self.state == ConnectionState.CONNECTED)
+
+    def wait_connected(self, timeout=None) -> bool:
+        """Block until the current connection attempt is over; True if connected."""
+        if self._attempt is not None:
+            try:
+                self._attempt.result(timeout)
+            except concurrent.futures.TimeoutError:
+                pass
+        return self.state == ConnectionState.CONNECTED
+
+    async def _sync_all(self) -> None:
+        netuids = list(self.metagraphs)
+        results = await asyncio.gather(
+            *(self.metagraphs[netuid].sync(subtensor=self.subtensor) for netuid in netuids),
+            return_exceptions=True,
+        )
+        failed = {n: r for n, r in zip(netuids, results) if isinstance(r, Exception)}
+        for netuid, error in failed.items():
+            logger.warning(f"Could not sync metagraph for netuid {netuid}, keeping previous snapshot: {error}")
+        if not netuids or len(failed) == len(netuids):
+            raise ConnectionError("No metagraph could be synced")
+
+    def safe_sync(self) -> bool:
+        """Sync every netuid's metagraph concurrently.
+
+        Returns False without waiting when there is no connection (a reconnect is
+        started in the background), so the caller can leave the groups alone this cycle.
+        """
+        if self.state != ConnectionState.CONNECTED:
+            logger.info(f"Subtensor {self.state.value}, skipping metagraph sync")
+            self.start()
+            return False
         try:
             logger.debug("Syncing with metagraph")
-            self.metagraph.sync()
+            self._run(self._sync_all())
+            return True
         except Exception as e:
             logger.error(
-                f"Could not sync with metagraph: {e}, trying to create new connection..."
+                f"Could not sync with metagraph: {e}, reconnecting in the background"
             )
-            self._init_subtensor_connection()
+            with self._lock:
+                self.state = ConnectionState.DISCONNECTED
+            SUBTENSOR_CONNECTED.set(0)
+            self.start()
+            return False
 
-    def get_active_hotkeys(self):
-        self.safe_sync()
+    def get_active_hotkeys(self, netuid):
         active_hotkeys = set()
+        metagraph = self.metagraphs.get(netuid)
+        if metagraph is None:
+            return active_hotkeys
 
-        for hotkey in self.metagraph.hotkeys:
+        for hotkey in metagraph.hotkeys:
             active_hotkeys.add(hashlib.sha256(hotkey.encode()).hexdigest())
 
         return active_hotkeys
 
-    def get_active_axons(self):
-        self.safe_sync()
+    def get_active_axons(self, netuid):
         active_axons = set()
-        for axon in self.metagraph.addresses:
+        metagraph = self.metagraphs.get(netuid)
+        if metagraph is None:
+            return active_axons
+
+        for axon in metagraph.addresses:
             active_axons.add(axon)
+        return active_axons
+
+
+def parse_netuids(value):
+    """Parse a comma separated NETUIDS value such as "6,12"."""
+    return [int(netuid) for netuid in value.split(",") if netuid.strip()]
+
+
+def group_names(netuid, multi_netuid):
+    """Names of the (active, inactive) Kuma groups holding the miners of a netuid.
+
+    A single-subnet updater keeps the historical "Active Miners" / "Inactive Miners" names.
+    """
+    if not multi_netuid:
+        return "Active Miners", "Inactive Miners"
+    return f"Active Miners SN{netuid}", f"Inactive Miners SN{netuid}"
+
+
+def resolve_netuid(miner, netuids):
+    """Netuid a miner from host_vars belongs to, defaulting to the first served netuid."""
+    default_netuid = netuids[0]
+    if not miner.get('netuid'):
+        return default_netuid
+    try:
+        netuid = int(miner['netuid'])
+    except (TypeError, ValueError):
+        logger.warning(f"Invalid netuid {miner['netuid']!r} for miner {miner.get('name')}")
+        return default_netuid
+    if netuid not in netuids:
+        if len(netuids) > 1:
+            logger.warning(
+                f"Miner {miner.get('name')} is on netuid {netuid}, which this updater does not serve; "
+                f"using netuid {default_netuid}")
+        return default_netuid
+    return netuid
 
 
 def find_group_id(monitors, group_name):
@@ -84,7 +253,7 @@ def load_hotkeys(csv_filename="hotkeys.csv"):
     return hotkey_map
 
 
-def setup_email_notification(api):
+def setup_email_notification(api, notifications=None):
     """Setup email notification if configured"""
     # Get email configuration from environment
     email_to = os.getenv('NOTIFICATION_MAIL')
@@ -96,7 +265,8 @@ def setup_email_notification(api):
     
     try:
         # Check if email notification already exists
-        notifications = api.get_notifications()
+        if notifications is None:
+            notifications = api.get_notifications()
         email_notification_name = "Miner Status Email Alerts"
         
         for notif in notifications:
@@ -130,13 +300,14 @@ def setup_email_notification(api):
         return None
 
 
-def setup_internal_webhook_notification(api):
+def setup_internal_webhook_notification(api, notifications=None):
     """Setup internal webhook notification for miner-restarter"""
     webhook_url = os.getenv('INTERNAL_WEBHOOK_URL', 'http://miner-restarter:9999/webhook')
     
     try:
         # Check if internal webhook notification already exists
-        notifications = api.get_notifications()
+        if notifications is None:
+            notifications = api.get_notifications()
         webhook_notification_name = "Miner Restarter Webhook"
         
         for notif in notifications:
@@ -164,17 +335,25 @@ def setup_internal_webhook_notification(api):
         return None
 
 
-def load_default_groups_and_notifications(api):
-    """Initialize default groups and notifications in Uptime Kuma"""
+def load_default_groups_and_notifications(api, netuids=None):
+    """Initialize default groups and notifications in Uptime Kuma
+
+    Returns the resulting ProvisionedState.
+    """
 
     # Get existing monitors to check for duplicates
     existing_monitors = api.get_monitors()
 
-    # Create default groups if they don't exist
-    groups_to_create = [
-        {'name': 'Active Miners', 'active': True},
-        {'name': 'Inactive Miners', 'active': False}
-    ]
+    # Create default groups if they don't exist, one active/inactive pair per netuid
+    netuids = netuids or [None]
+    groups_to_create = []
+    for netuid in netuids:
+        active_name, inactive_name = group_names(netuid, len(netuids) > 1)
+        groups_to_create += [
+            {'name': active_name, 'active': True},
+            {'name': inactive_name, 'active': False}
+        ]
+    active_group_names = {group['name'] for group in groups_to_create if group['active']}
     created_groups = {}
 
     for group in groups_to_create:
@@ -213,12 +392,16 @@ def load_default_groups_and_notifications(api):
             created_groups[group_name] = group_id
             logger.info(f"Group already exists: {group_name} (ID: {group_id})")
 
+    # One notification list for the three notification checks below
+    try:
+        notifications = api.get_notifications()
+    except Exception as e:
+        logger.error(f"Error listing notifications: {e}")
+        notifications = None
+
     # Setup webhook notification for Active Miners group
-    if 'Active Miners' in created_groups:
+    if active_group_names & created_groups.keys() and notifications is not None:
         try:
-            # Check if notifications already exist
-            notifications = api.get_notifications()
-
             # Create webhook notification if it doesn't exist
             webhook_name = "Active Miners Webhook"
             webhook_exists = any(notif.get('name') ==
@@ -257,29 +440,123 @@ def load_default_groups_and_notifications(api):
             logger.error(f"Error setting up webhook notification: {e}")
     
     # Setup email notification
-    setup_email_notification(api)
+    email_id = setup_email_notification(api, notifications)
     
     # Setup internal webhook notification for miner-restarter
-    setup_internal_webhook_notification(api)
+    webhook_id = setup_internal_webhook_notification(api, notifications)
 
+    return ProvisionedState(
+        groups=created_groups,
+        notifications={"email": email_id, "internal_webhook": webhook_id},
+        complete=len(created_groups) == len(groups_to_create) and webhook_id is not None
+        and (email_id is not None or not os.getenv('NOTIFICATION_MAIL')),
+    )
+
+
+@dataclass
+class ProvisionedState:
+    """Kuma groups and notifications created (or found) by the bootstrap."""
+    groups: dict = field(default_factory=dict)
+    notifications: dict = field(default_factory=dict)
+    # False when something could not be set up, so the bootstrap is retried
+    complete: bool = False
+
+
+class Provisioning:
+    """Runs the group/notification bootstrap once and caches its result.
+
+    A steady-state cycle makes no Kuma calls for it. The cache is dropped, and the
+    bootstrap runs again on the next cycle, when the set of netuids changes, when
+    the bootstrap was incomplete, or when a cycle finds one of the cached groups
+    missing or with another ID (``verify``) or one of the cached notifications gone
+    (``verify_notifications``, every ``NOTIFICATION_CHECK_MIN`` minutes, default 30).
+    """
+
+    def __init__(self, notification_check_seconds=None, clock=time.monotonic):
+        self.state = None
+        self.netuids = None
+        if notification_check_seconds is None:
+            notification_check_seconds = float(os.getenv("NOTIFICATION_CHECK_MIN", "30")) * 60
+        self.notification_check_seconds = notification_check_seconds
+        self.clock = clock
+        self.notifications_checked_at = None
+
+    def ensure(self, api, netuids):
+        if self.state is not None and self.clock() - self.notifications_checked_at >= self.notification_check_seconds:
+            self.verify_notifications(api)
+        if self.state is None or self.netuids != list(netuids):
+            self.state = load_default_groups_and_notifications(api, netuids)
+            self.netuids = list(netuids)
+            self.notifications_checked_at = self.clock()
+            logger.info(f"Kuma bootstrap done: groups {self.state.groups}, notifications {self.state.notifications}")
+            if not self.state.complete:
+                logger.warning("Kuma bootstrap incomplete, retrying it next cycle")
+                state, self.state = self.state, None
+                return state
+        return self.state
+
+    def verify(self, monitors):
+        """Drop the cached bootstrap if ``monitors`` contradict the cached group IDs."""
+        if self.state is None:
+            return
+        for name, group_id in self.state.groups.items():
+            found = find_group_id(monitors, name)
+            if found != group_id:
+                self.invalidate(f"group {name} is {found} instead of {group_id}")
+                return
+
+    def verify_notifications(self, api):
+        """Drop the cached bootstrap if one of its notifications was deleted in Kuma.
+
+        Notifications are not in the monitor list ``verify`` sees, so this lists them.
+        """
+        self.notifications_checked_at = self.clock()
+        try:
+            existing = {notification.get('id') for notification in api.get_notifications()}
+        except Exception as e:
+            logger.warning(f"Could not list notifications to verify the Kuma bootstrap: {e}")
+            return
+        for kind, notification_id in self.state.notifications.items():
+            if notification_id is not None and notification_id not in existing:
+                self.invalidate(f"{kind} notification {notification_id} no longer exists")
+                return
+
+    def invalidate(self, reason):
+        if self.state is not None:
+            logger.warning(f"Kuma bootstrap out of date ({reason}), redoing it next cycle")
+        self.state = None
+
+
+provisioning = Provisioning()
 
-def load_hosts(api, config_folder=os.path.join(os.getcwd(), 'host_vars/')):
-    """Load monitors from YAML configuration files"""
+
+def load_hosts(api, config_folder=os.path.join(os.getcwd(), 'host_vars/'), netuids=None):
+    """Load monitors from YAML configuration files
+
+    Miners are parented to the Active Miners group of their `netuid` (from the
+    spreadsheet's optional Netuid column), falling back to the first configured netuid.
+    """
 
     # Get existing monitors
     existing_monitors = api.get_monitors()
+    provisioning.verify(existing_monitors)
     existing_monitors_by_name = {
         monitor.get('name'): monitor
         for monitor in existing_monitors
         if monitor.get('type') != 'group'
     }
 
-    # Get Active Miners group ID
-    active_group_id = find_group_id(existing_monitors, 'Active Miners')
-
-    if not active_group_id:
-        logger.warning(
-            "Active Miners group not found. Monitors will be created without a parent group.")
+    # Get the Active/Inactive Miners group IDs for every netuid
+    netuids = netuids or [None]
+    active_group_ids = {}
+    netuid_group_ids = {}
+    for netuid in netuids:
+        active_name, inactive_name = group_names(netuid, len(netuids) > 1)
+        active_group_ids[netuid] = find_group_id(existing_monitors, active_name)
+        netuid_group_ids[netuid] = {active_group_ids[netuid], find_group_id(existing_monitors, inactive_name)} - {None}
+        if not active_group_ids[netuid]:
+            logger.warning(
+                f"{active_name} group not found. Monitors will be created without a parent group.")
 
     # Process all YAML files in the config folder
     config_path = Path(config_folder)
@@ -293,155 +570,105 @@ def load_hosts(api, config_folder=os.path.join(os.getcwd(), 'host_vars/')):
 
     logger.info(f"FOUND YAML FILES: {yaml_files}")
 
-    for yaml_file in yaml_files:
-        try:
-            with open(yaml_file, 'r') as f:
-                config = yaml.safe_load(f)
-
-            if not config or 'miners' not in config:
-                logger.warning(f"No miners found in {yaml_file}")
-                continue
-
-            ansible_host = config.get('ansible_host', 'unknown')
-            provider = config.get('provider', 'unknown')
-
-            # Process each miner
-            for miner in config['miners']:
-                miner_name = miner.get('name')
-                if not miner_name:
-                    logger.warning(f"Miner without name in {yaml_file}")
-                    continue
-
-                # Prepare monitor data
-                port = miner.get('port', '8080')
-                branch = miner.get('branch', '')
-                url = f"http://{ansible_host}:{port}"
-                description = f"Provider: {provider}\nBranch: {branch}"
-
-                monitor_data = {
-                    'type': MonitorType.HTTP,
-                    'name': miner_name,
-                    'url': url,
-                    'interval': 60,  # Check every 60 seconds
-                    'retryInterval': 60,
-                    'maxretries': 3,
-                    'accepted_statuscodes': ["200-299"],
-                    'description': description
-                }
+    templates = load_templates()
+    shaping = LoadShaping.from_env()
+    records = load_snapshot_records(config_path / SNAPSHOT_FILE, yaml_files)
+    if records is None:
+        records = load_miner_records(yaml_files)
+    fleet_size = 0
+    if shaping.probes_per_second > 0:
+        # The probe budget depends on the size of the whole fleet
+        records = list(records)
+        fleet_size = len(records)
+
+    plan = MonitorPlan()
+    for record in records:
+        netuid = resolve_netuid(record._asdict(), netuids)
+        active_group_id = active_group_ids[netuid]
+
+        # Prepare monitor data
+        monitor_data = {
+            'name': record.name,
+            'url': record.url,
+            'description': record.description,
+            **templates.for_miner(record.provider, record.branch, record.kuma_config),
+        }
+        monitor_data['interval'] = shaping.interval(record.name, monitor_data['interval'], fleet_size)
 
-                # Add to Active Miners group if it exists
-                if active_group_id:
-                    monitor_data['parent'] = active_group_id
-
-                # Add tags based on provider
-                # monitor_data['tags'] = [
-                #    {'name': provider, 'color': '#0000FF'},
-                #    {'name': 'miner', 'color': '#00FF00'}
-                # ]
-
-                # Check if monitor already exists
-                if miner_name in existing_monitors_by_name:
-                    existing_monitor = existing_monitors_by_name[miner_name]
-                    monitor_id = existing_monitor.get('id')
-
-                    # Check if update is needed
-                    needs_update = False
-                    update_fields = {}
-
-                    # Check each field for differences
-                    if existing_monitor.get('url') != url:
-                        update_fields['url'] = url
-                        needs_update = True
-
-                    if existing_monitor.get('description') != description:
-                        update_fields['description'] = description
-                        needs_update = True
-
-                    if existing_monitor.get('interval') != 60:
-                        update_fields['interval'] = 60
-                        needs_update = True
-
-                    if existing_monitor.get('retryInterval') != 60:
-                        update_fields['retryInterval'] = 60
-                        needs_update = True
-
-                    if existing_monitor.get('maxretries') != 3:
-                        update_fields['maxretries'] = 3
-                        needs_update = True
-
-                    # Check if parent group needs update
-                    if active_group_id and existing_monitor.get('parent') != active_group_id:
-                        update_fields['parent'] = active_group_id
-                        needs_update = True
-
-                    if needs_update:
-                        try:
-                            # Update the monitor
-                            api.edit_monitor(monitor_id, **update_fields)
-                            logger.info(
-                                f"Updated monitor: {miner_name} (ID: {monitor_id}) - Fields: {list(update_fields.keys())}")
-                        except Exception as e:
-                            logger.error(
-                                f"Error updating monitor {miner_name}: {e}")
-                    else:
-                        logger.info(
-                            f"Monitor already up to date: {miner_name}")
-                else:
-                    # Create new monitor
-                    try:
-                        response = api.add_monitor(**monitor_data)
-                        monitor_id = response.get('monitorID')
-                        logger.info(
-                            f"Created monitor: {miner_name} (ID: {monitor_id})")
+        existing_monitor = existing_monitors_by_name.get(record.name)
+        # New monitors start in the Active Miners group; update_miner_groups moves
+        # them between the groups of their netuid, so either group is left alone
+        if active_group_id and (existing_monitor is None
+                                or existing_monitor.get('parent') not in netuid_group_ids[netuid]):
+            monitor_data['parent'] = active_group_id
 
-                        # Add custom properties as tags or in description
-                        # Since Uptime Kuma doesn't support arbitrary custom fields,
-                        # we can encode the config in the description or use tags
-                        if miner.get('config'):
-                            # You might want to store important config values as tags
-                            # or append them to the description
-                            pass
+        plan.add(existing_monitor, monitor_data)
 
-                    except Exception as e:
-                        logger.error(
-                            f"Error creating monitor {miner_name}: {e}")
+    apply_plan(api, plan, shaping)
+    report_probe_load(plan, shaping)
+    return plan
 
-        except Exception as e:
-            logger.error(f"Error processing {yaml_file}: {e}")
+
+def report_probe_load(plan, shaping):
+    """Log and export the probe load the planned intervals put on Kuma."""
+    profile = load_profile([
+        (interval, shaping.offset(name, interval)) for name, interval in plan.intervals.items()
+    ])
+    set_probe_load(profile)
+    logger.info(
+        f"Probe load for {profile['monitors']} monitors: {profile['mean']}/s on average, "
+        f"busiest second {profile['peak']}, 99th percentile {profile['p99']}")
+    return profile
 
 
 def update_miner_groups(api, bt_conn):
     # Get current monitors
     monitors = api.get_monitors()
 
-    # Find group IDs
-    active_group_id = find_group_id(monitors, "Active Miners")
-    inactive_group_id = find_group_id(monitors, "Inactive Miners")
+    # Find group IDs for every netuid, and which netuid each group belongs to
+    multi_netuid = len(bt_conn.netuids) > 1
+    groups_by_netuid = {}
+    netuid_by_group = {}
+    for netuid in bt_conn.netuids:
+        active_name, inactive_name = group_names(netuid, multi_netuid)
+        active_group_id = find_group_id(monitors, active_name)
+        inactive_group_id = find_group_id(monitors, inactive_name)
+        if not active_group_id or not inactive_group_id:
+            logging.error(f"Error: Could not find required groups for netuid {netuid}")
+            continue
+        groups_by_netuid[netuid] = (active_group_id, inactive_group_id)
+        netuid_by_group[active_group_id] = netuid
+        netuid_by_group[inactive_group_id] = netuid
 
-    if not active_group_id or not inactive_group_id:
-        logging.error("Error: Could not find required groups")
+    if not groups_by_netuid:
         return
 
     hk_map = load_hotkeys()
 
     # Get active endpoints from metagraph
-    active_hotkeys = bt_conn.get_active_hotkeys()
-    deduct_monitor_from_axon = False
-    if not hk_map:
-        active_axons = bt_conn.get_active_axons()
-        deduct_monitor_from_axon = True
-
-    logging.info(f"Found {len(active_hotkeys)} active hotkeys in metagraph")
+    with stage_timer("metagraph_sync"):
+        if not bt_conn.safe_sync():
+            # Without a metagraph every miner would look inactive
+            logging.warning("Metagraph not available, leaving the miner groups unchanged this cycle")
+            return
+        active_hotkeys = {netuid: bt_conn.get_active_hotkeys(netuid) for netuid in groups_by_netuid}
+        deduct_monitor_from_axon = False
+        if not hk_map:
+            active_axons = {netuid: bt_conn.get_active_axons(netuid) for netuid in groups_by_netuid}
+            deduct_monitor_from_axon = True
+
+    for netuid, hotkeys in active_hotkeys.items():
+        logging.info(f"Found {len(hotkeys)} active hotkeys in metagraph of netuid {netuid}")
 
     moves_to_active = 0
     moves_to_inactive = 0
 
     for monitor in monitors:
-        if monitor["type"] != "http" or monitor.get("parent") not in [
-            active_group_id,
-            inactive_group_id,
-        ]:
+        netuid = netuid_by_group.get(monitor.get("parent"))
+        if monitor["type"] != "http" or netuid is None:
             continue
+        active_group_id, inactive_group_id = groups_by_netuid[netuid]
+        check_deadline("the remaining group moves")
 
         try:
             name = monitor["name"]
@@ -456,9 +683,9 @@ def update_miner_groups(api, bt_conn):
                 ip = url
 
             if hkey:
-                is_active = hkey in active_hotkeys
+                is_active = hkey in active_hotkeys[netuid]
                 if deduct_monitor_from_axon:
-                    is_active = ip in active_axons
+                    is_active = ip in active_axons[netuid]
             else:
                 is_active = False
                 logging.info(f"Hotkey missing in config file")
@@ -467,11 +694,11 @@ def update_miner_groups(api, bt_conn):
             if is_active and current_parent != active_group_id:
                 api.edit_monitor(monitor["id"], parent=active_group_id)
                 moves_to_active += 1
-                logging.info(f"Moved {monitor['name']} to Active Miners")
+                logging.info(f"Moved {monitor['name']} to the active group of netuid {netuid}")
             elif not is_active and current_parent != inactive_group_id:
                 api.edit_monitor(monitor["id"], parent=inactive_group_id)
                 moves_to_inactive += 1
-                logging.info(f"Moved {monitor['name']} to Inactive Miners")
+                logging.info(f"Moved {monitor['name']} to the inactive group of netuid {netuid}")
 
         except Exception as e:
             logging.error(
@@ -491,36 +718,53 @@ def job(bt_conn):
         logging.error("Error: KUMA_PASS environment variable not set")
         return
 
-    api = UptimeKumaApi(kuma_url)
-
-    try:
-        api.login(kuma_user, kuma_pass)
-        load_default_groups_and_notifications(api)
-        load_hosts(api)
+    with cycle_timer():
+        with stage_timer("connect"):
+            # Monitor lists come from Kuma's database when KUMA_DB_PATH is set
+            api = snapshot_api(InstrumentedKumaApi(UptimeKumaApi(kuma_url)))
 
-        update_miner_groups(api, bt_conn)
-    except Exception as e:
-        logging.error(f"Error: {str(e)}")
-    finally:
-        api.disconnect()
+        try:
+            with stage_timer("login"):
+                api.login(kuma_user, kuma_pass)
+            with stage_timer("load_default_groups_and_notifications"):
+                provisioning.ensure(api, bt_conn.netuids)
+            with stage_timer("load_hosts"):
+                load_hosts(api, netuids=bt_conn.netuids)
+
+            with stage_timer("update_miner_groups"):
+                update_miner_groups(api, bt_conn)
+        except Exception as e:
+            logging.error(f"Error: {str(e)}")
+        finally:
+            api.disconnect()
 
 
 def main():
 
     logging.info("Auto updater started")
-    netuid = int(os.getenv("NETUID", "6"))
-    bt_conn = BittensorConnection(netuid)
-    job(bt_conn)
-    logging.info("Finished initial update.")
-
     interval_mins = int(os.getenv("UPDATE_INTERVAL_MIN", "2"))
-    logging.info(f"Update interval: {interval_mins} min")
+    deadline_mins = float(os.getenv("CYCLE_DEADLINE_MIN", interval_mins))
+    set_cycle_interval(interval_mins * 60)
+    start_metrics_server()
+
+    # NETUIDS="6,12" serves several subnets from one process; NETUID is the single-subnet form
+    netuids = parse_netuids(os.getenv("NETUIDS") or os.getenv("NETUID") or "6")
+    # Connects in the background while the first cycle provisions Kuma
+    bt_conn = BittensorConnection(netuids)
+    bt_conn.start()
 
-    schedule.every(interval_mins).minutes.do(lambda: job(bt_conn))
+    logging.info(f"Update interval: {interval_mins} min")
 
-    while True:
-        schedule.run_pending()
-        time.sleep(1)
+    runner = CycleRunner(
+        "kuma-updater",
+        lambda: job(bt_conn),
+        interval=interval_mins * 60,
+        deadline=deadline_mins * 60,
+        on_skip=record_skipped_ticks,
+    )
+    # `docker kill -s USR1 <container>` forces an immediate update
+    install_trigger_signal(runner)
+    runner.run_forever()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,175 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections import defaultdict
+from contextlib import closing
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from app.inventory import InventoryMiner
+from app.sqlite_store import SqliteStore
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bulk_jobs (
+    id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    finished_at REAL,
+    status TEXT NOT NULL,
+    request TEXT
+);
+CREATE TABLE IF NOT EXISTS bulk_job_items (
+    job_id TEXT NOT NULL,
+    miner TEXT NOT NULL,
+    host TEXT NOT NULL,
+    status TEXT NOT NULL,
+    outcome TEXT,
+    started_at REAL,
+    duration_seconds REAL,
+    -- Miner names are only unique per host
+    PRIMARY KEY (job_id, host, miner)
+);
+"""
+
+
+class JobStore(SqliteStore):
+    """
+    Bulk restart jobs and their per-miner progress in SQLite, next to the restart
+    ledger, so any uvicorn worker can report on a job another worker is running.
+    """
+
+    SCHEMA = SCHEMA
+
+    def create(self, job_id: str, miners: List[InventoryMiner], request: dict) -> None:
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT INTO bulk_jobs (id, created_at, status, request) VALUES (?, ?, 'running', ?)",
+                (job_id, time.time(), json.dumps(request)),
+            )
+            conn.executemany(
+                "INSERT INTO bulk_job_items (job_id, miner, host, status) VALUES (?, ?, ?, 'pending')",
+                [(job_id, m.name, m.host) for m in miners],
+            )
+
+    def start_item(self, job_id: str, host: str, miner: str) -> None:
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "UPDATE bulk_job_items SET status = 'running', started_at = ? "
+                "WHERE job_id = ? AND host = ? AND miner = ?",
+                (time.time(), job_id, host, miner),
+            )
+
+    def finish_item(self, job_id: str, host: str, miner: str, outcome: str, duration_seconds: float) -> None:
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "UPDATE bulk_job_items SET status = 'done', outcome = ?, duration_seconds = ? "
+                "WHERE job_id = ? AND host = ? AND miner = ?",
+                (outcome, duration_seconds, job_id, host, miner),
+            )
+
+    def finish(self, job_id: str, status: str) -> None:
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "UPDATE bulk_jobs SET status = ?, finished_at = ? WHERE id = ?",
+                (status, time.time(), job_id),
+            )
+
+    def get(self, job_id: str, include_items: bool = True) -> Optional[dict]:
+        with closing(self._connect()) as conn:
+            job = conn.execute("SELECT * FROM bulk_jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            counts = dict(conn.execute(
+                "SELECT COALESCE(outcome, status), COUNT(*) FROM bulk_job_items WHERE job_id = ? "
+                "GROUP BY COALESCE(outcome, status)",
+                (job_id,),
+            ).fetchall())
+            items = conn.execute(
+                "SELECT miner, host, status, outcome, started_at, duration_seconds FROM bulk_job_items "
+                "WHERE job_id = ? ORDER BY rowid",
+                (job_id,),
+            ).fetchall() if include_items else []
+
+        result = {
+            "job_id": job["id"],
+            "status": job["status"],
+            "created_at": job["created_at"],
+            "finished_at": job["finished_at"],
+            "request": json.loads(job["request"] or "{}"),
+            "total": sum(counts.values()),
+            "done": sum(n for state, n in counts.items() if state not in ("pending", "running")),
+            "counts": counts,
+        }
+        if include_items:
+            result["items"] = [dict(item) for item in items]
+        return result
+
+
+class BulkRestartExecutor:
+    """
+    Runs bulk restart jobs in the background: at most ``concurrency`` restarts at once
+    across the fleet and ``per_host`` at once on any single host, so a rollout never
+    restarts every miner of a machine at the same moment.
+    """
+
+    def __init__(self, restart: Callable[[str, str], Awaitable[str]], store: JobStore,
+                 concurrency: int = 20, per_host: int = 1,
+                 notify: Optional[Callable[[str], Awaitable]] = None):
+        self.restart = restart
+        self.store = store
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.notify = notify
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def submit(self, miners: List[InventoryMiner], request: dict) -> str:
+        job_id = uuid.uuid4().hex[:12]
+        await asyncio.to_thread(self.store.create, job_id, miners, request)
+        task = asyncio.create_task(self._run(job_id, miners))
+        # Keep a reference until the job is done
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        logger.info(f"Bulk restart job {job_id} started for {len(miners)} miners")
+        return job_id
+
+    async def cancel_all(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _run(self, job_id: str, miners: List[InventoryMiner]):
+        fleet_slots = asyncio.Semaphore(self.concurrency)
+        host_slots: Dict[str, asyncio.Semaphore] = defaultdict(lambda: asyncio.Semaphore(self.per_host))
+        outcomes: Dict[str, int] = defaultdict(int)
+
+        async def restart_one(miner: InventoryMiner):
+            # Host slot first, so waiting on a busy host does not hold a fleet slot
+            async with host_slots[miner.host], fleet_slots:
+                await asyncio.to_thread(self.store.start_item, job_id, miner.host, miner.name)
+                start = time.perf_counter()
+                try:
+                    outcome = await self.restart(miner.host, miner.name)
+                except Exception as e:
+                    logger.error(f"Bulk restart of {miner.name} failed: {e}")
+                    outcome = "error"
+                outcomes[outcome] += 1
+                await asyncio.to_thread(self.store.finish_item, job_id, miner.host, miner.name, outcome,
+                                        time.perf_counter() - start)
+
+        status = "failed"
+        try:
+            await asyncio.gather(*(restart_one(m) for m in miners))
+            status = "done"
+        except asyncio.CancelledError:
+            status = "cancelled"
+            raise
+        finally:
+            await asyncio.to_thread(self.store.finish, job_id, status)
+            summary = ", ".join(f"{n} {outcome}" for outcome, n in sorted(outcomes.items())) or "nothing restarted"
+            logger.info(f"Bulk restart job {job_id} {status}: {summary}")
+            if self.notify is not None and status != "cancelled":
+                await self.notify(f"""
+                MINER-RESTARTER
+                Bulk restart {job_id} of {len(miners)} miners finished: {summary}""")
@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import os
+import signal
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from dotenv import dotenv_values
+from pydantic import ValidationError
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+logger = logging.getLogger(__name__)
+
+# Read in this order, later files win; real environment variables override both
+ENV_FILES = ("config", ".env")
+
+
+class Settings(BaseSettings):
+    """Immutable settings snapshot; get a fresh one with ``get_settings()`` after a reload."""
+    model_config = SettingsConfigDict(env_file=ENV_FILES, extra="ignore", frozen=True)
+
+    SSH_USERNAME: str = "miner-restarter"
+    SSH_KEY_PATH: str = "./app/miner-restarter"
+    # Seconds to open an SSH connection and to run one command on it
+    SSH_CONNECT_TIMEOUT: int = 30
+    SSH_COMMAND_TIMEOUT: int = 120
+    # SSH connections open at once for one /pm2 query
+    PM2_QUERY_CONCURRENCY: int = 50
+    # After a restart, check that pm2 reports the process online PM2_VERIFY_DELAY seconds later
+    PM2_VERIFY_RESTART: bool = True
+    PM2_VERIFY_DELAY: int = 5
+    CHECK_INTERVAL: int = 1200  # seconds
+    CHECK_COUNT: int = 3
+    TIMEOUT_THRESHOLD: int = 3600  # seconds
+    # Bearer token expected on /webhook/fetcher
+    API_TOKEN: str = ""
+    # Webhook events waiting to be processed before /webhook answers 503
+    INGEST_QUEUE_SIZE: int = 10000
+    # Delay between a Down event and the first check; an Up within it cancels the check
+    DOWN_DEBOUNCE_SECONDS: int = 0
+    # A monitor with FLAP_THRESHOLD Down/Up transitions within FLAP_WINDOW_SECONDS is
+    # flapping and its checks are delayed by the whole window
+    FLAP_WINDOW_SECONDS: int = 600
+    FLAP_THRESHOLD: int = 4
+    # Seconds between a worker renewing its checks in the shared monitor state and
+    # cancelling those an Up on another worker has ended
+    MONITOR_STATE_SYNC_INTERVAL: int = 2
+    # Host reachability probe shared by all miners of a host (SSH banner on this port)
+    HOST_PROBE_PORT: int = 22
+    HOST_PROBE_TIMEOUT: int = 10
+    HOST_PROBE_CACHE_SECONDS: int = 30
+    HOST_RECHECK_INTERVAL: int = 60
+    # Restart history (SQLite), backoff between restarts of a miner and circuit breakers
+    RESTART_LEDGER_PATH: str = "data/restart_ledger.db"
+    RESTART_BACKOFF_BASE: int = 300
+    RESTART_BACKOFF_MAX: int = 6 * 3600
+    RESTART_BREAKER_WINDOW: int = 24 * 3600
+    RESTART_BREAKER_THRESHOLD: int = 5
+    HOST_BREAKER_THRESHOLD: int = 10
+    # Kuma's database (read-only). When set, a Down miner whose last CHECK_COUNT heartbeats
+    # are all Down, the newest at most HEARTBEAT_MAX_AGE seconds old, is restarted without
+    # probing it again
+    KUMA_DB_PATH: str = ""
+    HEARTBEAT_MAX_AGE: int = 300
+    HEARTBEAT_CACHE_SECONDS: int = 10
+    # host_vars written by config_fetcher, used to resolve bulk restart selectors
+    HOST_VARS_DIR: str = "host_vars"
+    # Bulk restarts running at once across the fleet and on a single host
+    BULK_RESTART_CONCURRENCY: int = 20
+    BULK_RESTART_PER_HOST: int = 1
+    # Seconds per notification destination, rate limit retries included, how many
+    # times a 429 is retried, and destinations posted at once (read when the pool starts)
+    NOTIFICATION_TIMEOUT: float = 10
+    NOTIFICATION_MAX_RETRIES: int = 2
+    NOTIFICATION_WORKERS: int = 32
+    # How often the env files are checked for changes, 0 disables the watcher
+    CONFIG_WATCH_INTERVAL: int = 30
+
+
+class ConfigService:
+    """
+    Parses the settings once and hands out the same frozen snapshot until a reload,
+    so request handling never touches the env files. ``reload`` runs on SIGHUP and
+    when ``watch`` sees one of the env files change; a snapshot that fails validation
+    is logged and the previous one kept.
+    """
+
+    def __init__(self, env_files: Tuple[str, ...] = ENV_FILES):
+        self.env_files = env_files
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[Settings], None]] = []
+        self._mtimes = self._file_mtimes()
+        self._settings = Settings(_env_file=env_files)
+
+    @property
+    def settings(self) -> Settings:
+        return self._settings
+
+    def on_reload(self, listener: Callable[[Settings], None]):
+        """Call ``listener`` with every new snapshot (e.g. to rebuild derived state)."""
+        self._listeners.append(listener)
+
+    def environ(self) -> Dict[str, str]:
+        """The env files merged under the process environment, as settings see them."""
+        values = {}
+        for env_file in self.env_files:
+            if os.path.exists(env_file):
+                values.update({k: v for k, v in dotenv_values(env_file).items() if v is not None})
+        values.update(os.environ)
+        return values
+
+    def reload(self) -> bool:
+        with self._lock:
+            self._mtimes = self._file_mtimes()
+            try:
+                settings = Settings(_env_file=self.env_files)
+            except ValidationError as e:
+                logger.error(f"Invalid configuration, keeping the previous settings: {e}")
+                return False
+            self._settings = settings
+        for listener in self._listeners:
+            try:
+                listener(settings)
+            except Exception as e:
+                logger.error(f"Error applying reloaded configuration: {e}", exc_info=True)
+        logger.info("Configuration reloaded")
+        return True
+
+    def changed(self) -> bool:
+        return self._file_mtimes() != self._mtimes
+
+    def _file_mtimes(self) -> Dict[str, Optional[float]]:
+        mtimes = {}
+        for env_file in self.env_files:
+            try:
+                mtimes[env_file] = os.stat(env_file).st_mtime
+            except OSError:
+                mtimes[env_file] = None
+        return mtimes
+
+    def install_sighup_handler(self):
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, self.reload)
+        except (NotImplementedError, RuntimeError, ValueError) as e:
+            # Not on the main thread (e.g. under the test client) or no SIGHUP on this platform
+            logger.debug(f"SIGHUP reload not available: {e}")
+
+    async def watch(self):
+        while self._settings.CONFIG_WATCH_INTERVAL > 0:
+            await asyncio.sleep(self._settings.CONFIG_WATCH_INTERVAL)
+            if self.changed():
+                logger.info("Configuration files changed, reloading")
+                self.reload()
+
+
+config = ConfigService()
+
+
+def get_settings() -> Settings:
+    return config.settings
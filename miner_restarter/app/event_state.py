@@ -0,0 +1,324 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import time
+from contextlib import closing, contextmanager
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from app.metrics import ACTIVE_TASKS
+from app.models import MonitorNotification
+from app.sqlite_store import SqliteStore
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS monitor_states (
+    key TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    url TEXT,
+    phase TEXT NOT NULL,
+    generation INTEGER NOT NULL,
+    owner TEXT,
+    lease_until REAL,
+    last_status TEXT,
+    transitions TEXT NOT NULL
+);
+"""
+
+
+class Phase(str, Enum):
+    IDLE = "idle"
+    # Down received, waiting out the debounce delay before the first check
+    DEBOUNCING = "debouncing"
+    # monitor_and_restart is running
+    CHECKING = "checking"
+
+
+@dataclass
+class MonitorState:
+    key: str
+    name: str = ""
+    url: Optional[str] = None
+    phase: Phase = Phase.IDLE
+    # Bumped whenever a check is started or cancelled; a check only runs while its
+    # generation is the current one
+    generation: int = 0
+    # Worker running the current check, which renews the lease while it runs
+    owner: Optional[str] = None
+    lease_until: float = 0
+    # Times of recent Down/Up transitions, to detect flapping
+    transitions: List[float] = field(default_factory=list)
+    last_status: Optional[str] = None
+
+
+class MonitorStateStore(SqliteStore):
+    """
+    Per-monitor event state in SQLite, next to the restart ledger, so a Down and the
+    Up that cancels it are matched whichever uvicorn worker receives them.
+    """
+
+    SCHEMA = SCHEMA
+    ISOLATION_LEVEL = None
+    SYNCHRONOUS = "NORMAL"
+
+    @staticmethod
+    def _load(conn, key: str) -> MonitorState:
+        row = conn.execute("SELECT * FROM monitor_states WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return MonitorState(key)
+        return MonitorState(
+            key=key, name=row["name"], url=row["url"], phase=Phase(row["phase"]),
+            generation=row["generation"], owner=row["owner"], lease_until=row["lease_until"] or 0,
+            transitions=json.loads(row["transitions"]), last_status=row["last_status"],
+        )
+
+    @contextmanager
+    def update(self, key: str) -> Iterator[MonitorState]:
+        """The state of ``key``, locked for the block and saved when it exits without an error."""
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                state = self._load(conn, key)
+                yield state
+                conn.execute(
+                    "INSERT OR REPLACE INTO monitor_states "
+                    "(key, name, url, phase, generation, owner, lease_until, last_status, transitions) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (key, state.name, state.url, state.phase.value, state.generation, state.owner,
+                     state.lease_until, state.last_status, json.dumps(state.transitions)),
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def get(self, key: str) -> MonitorState:
+        with closing(self._connect()) as conn:
+            return self._load(conn, key)
+
+    def renew(self, owner: str, generations: Dict[str, int], lease_until: float) -> Set[str]:
+        """
+        Extend the lease of ``owner``'s checks that are still current and return the
+        keys of those that are not (cancelled or taken over by another worker).
+        """
+        if not generations:
+            return set()
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = conn.execute(
+                    f"SELECT key, generation, owner FROM monitor_states "
+                    f"WHERE key IN ({','.join('?' * len(generations))})",
+                    list(generations),
+                ).fetchall()
+                current = {row["key"] for row in rows
+                           if row["generation"] == generations[row["key"]] and row["owner"] == owner}
+                conn.executemany(
+                    "UPDATE monitor_states SET lease_until = ? WHERE key = ?",
+                    [(lease_until, key) for key in current],
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return set(generations) - current
+
+
+class EventStateMachine:
+    """
+    Tracks every Kuma monitor by ID and decides what a Down or Up event does:
+
+    - Down while idle starts ``monitor_and_restart`` after ``debounce_seconds``
+    - Down while a check is pending or running for the same URL is a duplicate and dropped
+    - Down with a different URL (monitor reused for another miner) replaces the pending check
+    - Up cancels whatever is pending or running for the monitor
+    - a monitor with ``flap_threshold`` transitions within ``flap_window_seconds`` is
+      flapping; its next Down waits the whole window instead of ``debounce_seconds``
+
+    The state lives in a ``MonitorStateStore`` shared by the uvicorn workers. The
+    check runs on the worker that received the Down. Every ``sync_interval`` seconds
+    (see ``run_sync``) that worker renews its lease on the check, and cancels it once
+    an Up or a replacing Down on any worker has superseded it. A check whose worker
+    stopped renewing for ``lease_seconds`` is taken over by the next Down.
+    """
+
+    def __init__(self, monitor: Callable[[str, str], Awaitable[None]], active_tasks: Dict[str, asyncio.Task],
+                 store: MonitorStateStore, debounce_seconds: float = 0, flap_window_seconds: float = 600,
+                 flap_threshold: int = 4, sync_interval: float = 2, lease_seconds: float = 30,
+                 clock: Callable[[], float] = time.time, worker_id: Optional[str] = None):
+        self.monitor = monitor
+        # Shared with MonitoringTask so shutdown cancels every check
+        self.active_tasks = active_tasks
+        self.store = store
+        self.debounce_seconds = debounce_seconds
+        self.flap_window_seconds = flap_window_seconds
+        self.flap_threshold = flap_threshold
+        self.sync_interval = sync_interval
+        self.lease_seconds = lease_seconds
+        self.clock = clock
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        # Generation of every check running on this worker, by monitor key
+        self.generations: Dict[str, int] = {}
+
+    @staticmethod
+    def monitor_key(notification: MonitorNotification) -> Optional[str]:
+        monitor = notification.monitor
+        if monitor is not None and monitor.id is not None:
+            return str(monitor.id)
+        if notification.heartbeat is not None and notification.heartbeat.monitorID is not None:
+            return str(notification.heartbeat.monitorID)
+        return monitor.url if monitor is not None else None
+
+    async def handle(self, notification: MonitorNotification) -> str:
+        """Apply one event and return what was done with it (used as the metrics outcome)."""
+        key = self.monitor_key(notification)
+        if key is None:
+            return "skipped"
+        if notification.is_up:
+            status, name, url = "up", None, None
+        elif notification.is_down and notification.in_active_group:
+            status, name, url = "down", notification.monitor.name, notification.monitor.url
+        else:
+            return "skipped"
+
+        outcome, generation, delay = await asyncio.to_thread(self._transition, key, status, name, url)
+        if outcome in ("cancelled", "replaced", "started", "debounced"):
+            # Whatever this worker ran for the monitor is superseded
+            self._cancel_local(key)
+        if outcome in ("replaced", "started", "debounced"):
+            self._start(key, generation, url, name, delay)
+        return outcome
+
+    def _transition(self, key: str, status: str, name: Optional[str],
+                    url: Optional[str]) -> Tuple[str, int, float]:
+        """Apply the event to the stored state in one transaction: (outcome, generation, delay)."""
+        with self.store.update(key) as state:
+            now = self.clock()
+            self._record_transition(state, status, now)
+            if status == "up":
+                return self._handle_up(state), state.generation, 0
+            return self._handle_down(state, name, url, now)
+
+    def _record_transition(self, state: MonitorState, status: str, now: float):
+        if state.last_status == status:
+            return
+        state.last_status = status
+        state.transitions = [t for t in state.transitions if now - t <= self.flap_window_seconds] + [now]
+
+    def is_flapping(self, state: MonitorState) -> bool:
+        return len(state.transitions) >= self.flap_threshold
+
+    def _handle_up(self, state: MonitorState) -> str:
+        if state.phase is Phase.IDLE:
+            return "ignored"
+        logger.info(f"{state.name} is Up again, cancelling {state.phase.value} check for {state.url}")
+        self._idle(state)
+        return "cancelled"
+
+    def _handle_down(self, state: MonitorState, name: str, url: Optional[str], now: float) -> Tuple[str, int, float]:
+        if not url:
+            logger.warning(f"Skipping monitoring task - monitor {name} has no URL")
+            return "no_url", state.generation, 0
+
+        outcome = "started"
+        if state.phase is not Phase.IDLE:
+            if state.lease_until < now:
+                logger.warning(f"Check of {state.url} on {state.owner} stopped renewing its lease, taking it over")
+            elif state.url == url:
+                logger.info(f"Monitoring task already {state.phase.value} for {url}, dropping duplicate Down")
+                return "duplicate", state.generation, 0
+            else:
+                logger.info(f"Monitor {state.key} moved from {state.url} to {url}, replacing its check")
+                outcome = "replaced"
+
+        delay = self.debounce_seconds
+        if self.is_flapping(state):
+            delay = max(delay, self.flap_window_seconds)
+            outcome = "debounced"
+            logger.info(f"{name} is flapping ({len(state.transitions)} transitions), delaying checks by {delay:.0f}s")
+
+        state.name = name
+        state.url = url
+        state.phase = Phase.DEBOUNCING if delay > 0 else Phase.CHECKING
+        state.generation += 1
+        state.owner = self.worker_id
+        state.lease_until = now + self.lease_seconds
+        return outcome, state.generation, delay
+
+    @staticmethod
+    def _idle(state: MonitorState):
+        state.phase = Phase.IDLE
+        state.generation += 1
+        state.owner = None
+        state.lease_until = 0
+
+    def _start(self, key: str, generation: int, url: str, name: str, delay: float):
+        task = asyncio.create_task(self._run(key, generation, url, name, delay))
+        task.add_done_callback(lambda task: self._finished(key, generation, task))
+        self.active_tasks[key] = task
+        self.generations[key] = generation
+        ACTIVE_TASKS.inc()
+        logger.info(f"Started new monitoring task for {url}")
+
+    async def _run(self, key: str, generation: int, url: str, name: str, delay: float):
+        if delay > 0:
+            await asyncio.sleep(delay)
+            if not await asyncio.to_thread(self._begin_check, key, generation):
+                return
+        await self.monitor(url, name)
+
+    def _begin_check(self, key: str, generation: int) -> bool:
+        """Move a debounced check on to checking, unless it was superseded meanwhile."""
+        with self.store.update(key) as state:
+            if state.generation != generation:
+                return False
+            state.phase = Phase.CHECKING
+            return True
+
+    def _finished(self, key: str, generation: int, task: asyncio.Task):
+        # Runs even for tasks cancelled before they started
+        ACTIVE_TASKS.dec()
+        # A replaced task must not clear the state of its successor
+        if self.generations.get(key) == generation:
+            self.generations.pop(key, None)
+            self.active_tasks.pop(key, None)
+            if not task.cancelled():
+                asyncio.ensure_future(asyncio.to_thread(self._release, key, generation))
+
+    def _release(self, key: str, generation: int):
+        try:
+            with self.store.update(key) as state:
+                if state.generation == generation:
+                    self._idle(state)
+        except sqlite3.Error as e:
+            # The lease runs out and the next Down starts a new check anyway
+            logger.error(f"Could not mark the check of monitor {key} finished: {e}")
+
+    def _cancel_local(self, key: str):
+        task = self.active_tasks.pop(key, None)
+        self.generations.pop(key, None)
+        if task is not None:
+            task.cancel()
+
+    async def sync(self):
+        """Renew the leases of this worker's checks and cancel those superseded elsewhere."""
+        generations = dict(self.generations)
+        stale = await asyncio.to_thread(self.store.renew, self.worker_id, generations,
+                                        self.clock() + self.lease_seconds)
+        for key in stale:
+            if self.generations.get(key) == generations[key]:
+                logger.info(f"Check of monitor {key} was cancelled on another worker")
+                self._cancel_local(key)
+
+    async def run_sync(self):
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                await self.sync()
+            except sqlite3.Error as e:
+                logger.error(f"Could not sync monitor states with {self.store.path}: {e}")
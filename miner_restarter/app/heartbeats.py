@@ -0,0 +1,92 @@
+import asyncio
+import logging
+import sqlite3
+import time
+from contextlib import closing
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DOWN = 0
+UP = 1
+# A failed check Kuma is still retrying before it declares the monitor Down
+PENDING = 2
+
+
+@dataclass(frozen=True)
+class HeartbeatRecord:
+    # 0 = down, 1 = up, 2 = pending, 3 = maintenance
+    status: int
+    # Unix time of the heartbeat
+    time: float
+    ping: Optional[float] = None
+    msg: str = ""
+
+
+def parse_kuma_time(value: str) -> float:
+    """Kuma stores heartbeat times as naive UTC strings ("2024-01-01 12:00:00.123")."""
+    return datetime.fromisoformat(value).replace(tzinfo=timezone.utc).timestamp()
+
+
+class KumaDbHeartbeats:
+    """Recent heartbeats of a monitor, read from Kuma's SQLite database opened read-only."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def recent(self, monitor_name: str, limit: int) -> List[HeartbeatRecord]:
+        """The last ``limit`` heartbeats of the (non-group) monitor called ``monitor_name``, newest first."""
+        with closing(sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, timeout=5)) as conn:
+            rows = conn.execute(
+                "SELECT status, time, ping, msg FROM heartbeat "
+                "WHERE monitor_id = (SELECT id FROM monitor WHERE name = ? AND type != 'group' LIMIT 1) "
+                "ORDER BY time DESC LIMIT ?",
+                (monitor_name, limit),
+            ).fetchall()
+        return [HeartbeatRecord(status, parse_kuma_time(at), ping, msg or "") for status, at, ping, msg in rows]
+
+
+class HeartbeatHistory:
+    """
+    Cached view of the heartbeats Kuma already recorded, so a Down miner does not have
+    to be probed again from scratch. ``verdict`` turns them into a decision:
+
+    - "down": the newest heartbeat is Down, at most ``max_age`` seconds old, and the
+      last ``count`` are all failed checks (Down, or Pending while Kuma retried), enough
+      evidence to restart without probing
+    - "up": the newest heartbeat is Up, the miner recovered
+    - None: not enough (or too old) evidence, probe as usual
+    """
+
+    def __init__(self, source: KumaDbHeartbeats, cache_seconds: float = 10, max_age: float = 300,
+                 clock: Callable[[], float] = time.time):
+        self.source = source
+        self.cache_seconds = cache_seconds
+        self.max_age = max_age
+        self.clock = clock
+        self._cache: Dict[Tuple[str, int], Tuple[float, List[HeartbeatRecord]]] = {}
+
+    async def recent(self, monitor_name: str, limit: int) -> List[HeartbeatRecord]:
+        key = (monitor_name, limit)
+        cached = self._cache.get(key)
+        if cached is not None and self.clock() - cached[0] < self.cache_seconds:
+            return cached[1]
+        try:
+            beats = await asyncio.to_thread(self.source.recent, monitor_name, limit)
+        except sqlite3.Error as e:
+            logger.warning(f"Could not read heartbeats of {monitor_name} from {self.source.path}: {e}")
+            return []
+        self._cache[key] = (self.clock(), beats)
+        return beats
+
+    async def verdict(self, monitor_name: str, count: int) -> Optional[str]:
+        beats = await self.recent(monitor_name, count)
+        if not beats or self.clock() - beats[0].time > self.max_age:
+            return None
+        if beats[0].status == UP:
+            return "up"
+        if beats[0].status == DOWN and len(beats) == count and all(beat.status in (DOWN, PENDING) for beat in beats):
+            return "down"
+        return None
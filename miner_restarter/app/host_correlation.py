@@ -0,0 +1,253 @@
+import asyncio
+import inspect
+import json
+import logging
+import time
+from contextlib import closing
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+from app.metrics import HOST_PROBE_DURATION, HOSTS_DOWN
+from app.sqlite_store import SqliteStore
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS host_probes (
+    host TEXT PRIMARY KEY,
+    checked_at REAL,
+    reachable INTEGER,
+    probing_until REAL
+);
+CREATE TABLE IF NOT EXISTS host_outages (
+    host TEXT PRIMARY KEY,
+    since REAL NOT NULL,
+    miners TEXT NOT NULL
+);
+"""
+
+
+@dataclass
+class HostOutage:
+    hostname: str
+    since: float
+    miners: Set[str] = field(default_factory=set)
+
+
+class HostStateStore(SqliteStore):
+    """
+    Host probe results and host outages in SQLite, next to the restart ledger, so the
+    uvicorn workers probe a host once between them and alert once per outage.
+    """
+
+    SCHEMA = SCHEMA
+    ISOLATION_LEVEL = None
+    SYNCHRONOUS = "NORMAL"
+
+    def claim_probe(self, host: str, now: float, cache_seconds: float,
+                    lease_seconds: float) -> Tuple[str, Optional[bool]]:
+        """
+        ``("cached", reachable)`` if a result younger than ``cache_seconds`` exists,
+        ``("wait", None)`` while another worker is probing the host, otherwise
+        ``("probe", None)`` and the host is claimed for ``lease_seconds``.
+        """
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT * FROM host_probes WHERE host = ?", (host,)).fetchone()
+                if row is not None and row["checked_at"] is not None and now - row["checked_at"] < cache_seconds:
+                    verdict = ("cached", bool(row["reachable"]))
+                elif row is not None and (row["probing_until"] or 0) > now:
+                    verdict = ("wait", None)
+                else:
+                    verdict = ("probe", None)
+                    conn.execute(
+                        "INSERT INTO host_probes (host, probing_until) VALUES (?, ?) "
+                        "ON CONFLICT (host) DO UPDATE SET probing_until = excluded.probing_until",
+                        (host, now + lease_seconds),
+                    )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return verdict
+
+    def save_probe(self, host: str, checked_at: float, reachable: Optional[bool]) -> None:
+        """Store a probe result and release the claim; None releases it without a result."""
+        with closing(self._connect()) as conn:
+            if reachable is None:
+                conn.execute("UPDATE host_probes SET probing_until = NULL WHERE host = ?", (host,))
+            else:
+                conn.execute(
+                    "INSERT OR REPLACE INTO host_probes (host, checked_at, reachable, probing_until) "
+                    "VALUES (?, ?, ?, NULL)",
+                    (host, checked_at, int(reachable)),
+                )
+
+    def add_to_outage(self, host: str, miner: str, now: float) -> bool:
+        """Record ``miner`` against the outage of ``host``; True if this started the outage."""
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT miners FROM host_outages WHERE host = ?", (host,)).fetchone()
+                miners = set(json.loads(row["miners"])) if row is not None else set()
+                if row is None:
+                    conn.execute("INSERT INTO host_outages (host, since, miners) VALUES (?, ?, ?)",
+                                 (host, now, json.dumps([miner])))
+                elif miner not in miners:
+                    conn.execute("UPDATE host_outages SET miners = ? WHERE host = ?",
+                                 (json.dumps(sorted(miners | {miner})), host))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return row is None
+
+    def end_outage(self, host: str) -> Optional[HostOutage]:
+        """Remove the outage of ``host`` and return it, None if there was none (or another worker ended it)."""
+        with closing(self._connect()) as conn:
+            row = conn.execute("DELETE FROM host_outages WHERE host = ? RETURNING since, miners", (host,)).fetchone()
+        if row is None:
+            return None
+        return HostOutage(host, row["since"], set(json.loads(row["miners"])))
+
+    def outages(self) -> Dict[str, HostOutage]:
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT host, since, miners FROM host_outages").fetchall()
+        return {row["host"]: HostOutage(row["host"], row["since"], set(json.loads(row["miners"]))) for row in rows}
+
+
+class HostProbe:
+    """
+    Checks whether a host is reachable by reading its SSH banner. Results are kept in
+    ``store`` for ``cache_seconds``, and one caller probes a host while the others (of
+    this worker or any other) wait for its result, so a host running N miners is
+    probed once, not N times.
+    """
+
+    def __init__(self, store: HostStateStore, port: int = 22, timeout: float = 10, cache_seconds: float = 30,
+                 poll_interval: float = 0.2, clock: Callable[[], float] = time.time):
+        self.store = store
+        self.port = port
+        self.timeout = timeout
+        self.cache_seconds = cache_seconds
+        # How often a worker waiting on another worker's probe looks for its result
+        self.poll_interval = poll_interval
+        self.clock = clock
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    async def is_reachable(self, hostname: str) -> bool:
+        pending = self._in_flight.get(hostname)
+        if pending is None:
+            pending = self._in_flight[hostname] = asyncio.ensure_future(self._probe_and_store(hostname))
+        # Shielded so one waiter being cancelled does not cancel the probe for the others
+        return await asyncio.shield(pending)
+
+    async def _probe_and_store(self, hostname: str) -> bool:
+        try:
+            while True:
+                # The banner read can take twice the timeout, after the connection
+                action, reachable = await asyncio.to_thread(
+                    self.store.claim_probe, hostname, self.clock(), self.cache_seconds, 2 * self.timeout + 1)
+                if action == "cached":
+                    return reachable
+                if action == "probe":
+                    break
+                await asyncio.sleep(self.poll_interval)
+
+            reachable = None
+            try:
+                reachable = await self.probe(hostname)
+                return reachable
+            finally:
+                await asyncio.to_thread(self.store.save_probe, hostname, self.clock(), reachable)
+        finally:
+            self._in_flight.pop(hostname, None)
+
+    async def probe(self, hostname: str) -> bool:
+        start = time.perf_counter()
+        result = "unreachable"
+        writer = None
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(hostname, self.port), timeout=self.timeout
+            )
+            banner = await asyncio.wait_for(reader.readline(), timeout=self.timeout)
+            if banner.startswith(b"SSH-"):
+                result = "reachable"
+                return True
+            result = "no_banner"
+            logger.warning(f"{hostname}:{self.port} accepted the connection but sent no SSH banner")
+            return False
+        except (OSError, asyncio.TimeoutError) as e:
+            logger.info(f"Host {hostname}:{self.port} is unreachable: {type(e).__name__} {e}")
+            return False
+        finally:
+            if writer is not None:
+                writer.close()
+            HOST_PROBE_DURATION.labels(result=result).observe(time.perf_counter() - start)
+
+
+class HostOutageTracker:
+    """
+    Correlates miner Down events by host. While a host is unreachable its miners wait
+    instead of being probed and restarted one by one, and a single host-down alert
+    (plus one recovery alert) is sent for the whole host. The outages are kept in the
+    probe's store, so that holds across the uvicorn workers.
+    """
+
+    def __init__(self, probe: HostProbe, notify: Callable[[str], Any], recheck_interval: float = 60):
+        self.probe = probe
+        self.store = probe.store
+        self.notify = notify
+        self.recheck_interval = recheck_interval
+
+    @property
+    def outages(self) -> Dict[str, HostOutage]:
+        """Current outages by hostname, as recorded by any worker."""
+        return self.store.outages()
+
+    async def host_is_down(self, hostname: str, miner_name: str) -> bool:
+        """Probe ``hostname`` and record ``miner_name`` against its outage if it is unreachable."""
+        if await self.probe.is_reachable(hostname):
+            await self._recovered(hostname)
+            return False
+
+        if await asyncio.to_thread(self.store.add_to_outage, hostname, miner_name, self.probe.clock()):
+            HOSTS_DOWN.inc()
+            logger.warning(f"Host {hostname} is unreachable, suppressing per-miner restarts")
+            await self._notify(f"""
+                MINER-RESTARTER
+                Host {hostname} is unreachable (no SSH banner on port {self.probe.port}).
+                Miner restarts on this host are suspended until it is back.""")
+        return True
+
+    async def wait_until_reachable(self, hostname: str, miner_name: str) -> Optional[float]:
+        """Block while ``hostname`` is down; returns the seconds waited, or None if it was up."""
+        if not await self.host_is_down(hostname, miner_name):
+            return None
+        start = time.monotonic()
+        while True:
+            await asyncio.sleep(self.recheck_interval)
+            if not await self.host_is_down(hostname, miner_name):
+                return time.monotonic() - start
+
+    async def _recovered(self, hostname: str):
+        outage = await asyncio.to_thread(self.store.end_outage, hostname)
+        if outage is None:
+            return
+        HOSTS_DOWN.dec()
+        down_for = self.probe.clock() - outage.since
+        logger.info(f"Host {hostname} is reachable again after {down_for:.0f}s")
+        await self._notify(f"""
+                MINER-RESTARTER
+                Host {hostname} is reachable again after {down_for / 60:.0f} minutes.
+                Resuming checks for {len(outage.miners)} miners: {", ".join(sorted(outage.miners))}""")
+
+    async def _notify(self, message: str):
+        try:
+            result = self.notify(message)
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            logger.error(f"Failed to send notifications: {str(e)}")
@@ -0,0 +1,70 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, List, Optional
+
+from app.metrics import INGEST_QUEUE_DEPTH
+
+logger = logging.getLogger(__name__)
+
+
+class IngestQueue:
+    """
+    Bounded in-process queue between the webhook endpoint and the event processing.
+
+    The endpoint only validates and enqueues, so Uptime Kuma gets its response without
+    waiting on the bookkeeping. Consumers run ``handler`` for every item in order of
+    arrival; an exception in the handler is logged and does not stop the consumer.
+    """
+
+    def __init__(self, handler: Callable[[Any], Awaitable[None]], maxsize: int = 10000, consumers: int = 1):
+        self.handler = handler
+        self.maxsize = maxsize
+        self.consumers = consumers
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._tasks = [asyncio.create_task(self._consume()) for _ in range(self.consumers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+        self._loop = None
+        INGEST_QUEUE_DEPTH.set(0)
+
+    def submit(self, item) -> bool:
+        """Enqueue ``item`` without waiting; returns False when the queue is full."""
+        # Started lazily as well, for callers that do not run the app lifespan
+        self.start()
+        try:
+            self._queue.put_nowait(item)
+        except asyncio.QueueFull:
+            return False
+        INGEST_QUEUE_DEPTH.inc()
+        return True
+
+    async def join(self):
+        """Wait until every queued item has been handled."""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def _consume(self):
+        queue = self._queue
+        while True:
+            item = await queue.get()
+            INGEST_QUEUE_DEPTH.dec()
+            try:
+                await self.handler(item)
+            except Exception as e:
+                logger.error(f"Error processing queued event: {e}", exc_info=True)
+            finally:
+                queue.task_done()
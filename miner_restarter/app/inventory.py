@@ -0,0 +1,92 @@
+import logging
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import FrozenSet, List, Optional, Tuple
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class InventoryMiner:
+    name: str
+    # Address used for SSH (ansible_host), and the host_vars file it came from
+    host: str
+    hostname: str
+    provider: str = ""
+    branch: str = ""
+    port: str = ""
+
+
+class Inventory:
+    """
+    Miners from the host_vars files written by config_fetcher, re-read only when one
+    of the files changes. The cache is keyed on each file's mtime and size rather than
+    the directory's mtime, which does not change when a file is rewritten in place.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self._signature: Optional[FrozenSet[Tuple[str, int, int]]] = None
+        self._miners: List[InventoryMiner] = []
+
+    def miners(self) -> List[InventoryMiner]:
+        try:
+            signature = frozenset(
+                (entry.name, entry.stat().st_mtime_ns, entry.stat().st_size)
+                for entry in os.scandir(self.directory)
+                if entry.name.endswith(".yml")
+            )
+        except OSError:
+            logger.warning(f"host_vars directory {self.directory} not found")
+            return []
+        if signature != self._signature:
+            self._miners = self._load()
+            self._signature = signature
+        return self._miners
+
+    def _load(self) -> List[InventoryMiner]:
+        miners = []
+        for path in sorted(self.directory.glob("*.yml")):
+            try:
+                with open(path) as f:
+                    host_data = yaml.safe_load(f) or {}
+            except (OSError, yaml.YAMLError) as e:
+                logger.error(f"Could not read {path}: {e}")
+                continue
+            host = host_data.get("ansible_host")
+            if not host:
+                continue
+            for miner in host_data.get("miners") or []:
+                if not miner.get("name"):
+                    continue
+                miners.append(InventoryMiner(
+                    name=miner["name"],
+                    host=host,
+                    hostname=path.stem,
+                    provider=host_data.get("provider", ""),
+                    branch=str(miner.get("branch", "")),
+                    port=str(miner.get("port", "")),
+                ))
+        logger.info(f"Loaded {len(miners)} miners from {self.directory}")
+        return miners
+
+    def select(self, names: Optional[List[str]] = None, host: Optional[str] = None,
+               provider: Optional[str] = None, branch: Optional[str] = None) -> Tuple[List[InventoryMiner], List[str]]:
+        """
+        Miners matching every given filter. ``host`` matches the address or the host_vars
+        name. Returns the matches and the requested ``names`` that are not in the inventory.
+        """
+        wanted = set(names) if names is not None else None
+        selected = [
+            m for m in self.miners()
+            if (wanted is None or m.name in wanted)
+            and (host is None or host in (m.host, m.hostname))
+            and (provider is None or m.provider.lower() == provider.lower())
+            and (branch is None or m.branch == branch)
+        ]
+        found = {m.name for m in selected}
+        missing = sorted(wanted - found) if wanted is not None else []
+        return selected, missing
@@ -1,20 +1,33 @@
-from fastapi import FastAPI, Request, BackgroundTasks
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import ValidationError
 import asyncio
 import logging
 import json
-from typing import List
+from typing import Optional
+from app.bulk_restart import BulkRestartExecutor, JobStore
+from app.event_state import EventStateMachine, MonitorStateStore
+from app.ingest import IngestQueue
+from app.inventory import Inventory
+from app.models import BulkRestartRequest, MonitorNotification, Pm2Request
+from app.config import config, get_settings
 from app.monitoring_task import MonitoringTask
+from app.webhook_handler import notify_all
+from app.metrics import (
+    WEBHOOKS,
+    MetricsMiddleware,
+    render_latest,
+)
 import sys
 from contextlib import asynccontextmanager
-from dotenv import load_dotenv
 import os
 
 
 root_logger = logging.getLogger()
-root_logger.setLevel(logging.DEBUG)
+root_logger.setLevel(os.environ.get("LOG_LEVEL", "INFO").upper())
 
 logging.basicConfig(
-    level=logging.DEBUG,
+    level=root_logger.level,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     handlers=[
         logging.StreamHandler(sys.stdout)  
@@ -23,61 +36,241 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+settings = get_settings()
 monitoring_task = MonitoringTask()
+event_states = EventStateMachine(
+    monitoring_task.monitor_and_restart,
+    monitoring_task.active_tasks,
+    # Shared with the other uvicorn workers, which may receive this monitor's Up
+    MonitorStateStore(settings.RESTART_LEDGER_PATH),
+    debounce_seconds=settings.DOWN_DEBOUNCE_SECONDS,
+    flap_window_seconds=settings.FLAP_WINDOW_SECONDS,
+    flap_threshold=settings.FLAP_THRESHOLD,
+    sync_interval=settings.MONITOR_STATE_SYNC_INTERVAL,
+)
+
+inventory = Inventory(settings.HOST_VARS_DIR)
+bulk_restarts = BulkRestartExecutor(
+    # Bulk jobs send one summary instead of a notification per miner
+    lambda host, miner: monitoring_task.restart_service(host, miner, notify=False),
+    JobStore(settings.RESTART_LEDGER_PATH),
+    concurrency=settings.BULK_RESTART_CONCURRENCY,
+    per_host=settings.BULK_RESTART_PER_HOST,
+    notify=notify_all,
+)
+# Seconds between progress events on /restarts/bulk/{job_id}/events
+BULK_PROGRESS_INTERVAL = 1.0
+
+
+async def process_notification(notification: MonitorNotification):
+    if notification.monitor is None:
+        WEBHOOKS.labels(endpoint="webhook", outcome="skipped").inc()
+        logger.info("Skipping notification without a monitor (test notification)")
+        return
+
+    outcome = await event_states.handle(notification)
+    if outcome == "skipped":
+        logger.info(f"Skipping monitoring task - no Down status detected for {notification.monitor.name}")
+    WEBHOOKS.labels(endpoint="webhook", outcome=outcome).inc()
+
+
+ingest_queue = IngestQueue(process_notification, maxsize=settings.INGEST_QUEUE_SIZE)
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    config.install_sighup_handler()
+    watcher = asyncio.create_task(config.watch())
+    state_sync = asyncio.create_task(event_states.run_sync())
+    ingest_queue.start()
     logger.info("Monitor and restart service started")
     yield
-    for task in monitoring_task.active_tasks.values():
+    watcher.cancel()
+    state_sync.cancel()
+    await ingest_queue.stop()
+    for task in list(monitoring_task.active_tasks.values()):
         task.cancel()
+    await bulk_restarts.cancel_all()
     logger.info("Monitor and restart service stopped")
 
 app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+
+
+@app.get("/metrics")
+async def metrics():
+    body, content_type = render_latest()
+    return Response(content=body, media_type=content_type)
+
+
+@app.get("/restarts")
+def restart_history(miner: Optional[str] = None, host: Optional[str] = None, limit: int = 50):
+    """Recent restarts (and refused restarts) from the ledger, newest first."""
+    # Plain def: FastAPI runs it in its threadpool, off the event loop
+    ledger = monitoring_task.ledger
+    response = {"restarts": ledger.history(miner=miner, host=host, limit=min(limit, 1000))}
+    if miner and response["restarts"]:
+        decision = ledger.check(miner, response["restarts"][0]["host"])
+        response["next_restart"] = {
+            "allowed": decision.allowed,
+            "reason": decision.reason,
+            "retry_after": round(decision.retry_after),
+        }
+    return response
+
+
+def bearer_token_valid(request: Request) -> bool:
+    expected = get_settings().API_TOKEN.strip('"').strip("'")
+    return bool(expected) and request.headers.get("Authorization") == f"Bearer {expected}"
+
+
+@app.post("/restarts/bulk", status_code=202)
+async def start_bulk_restart(request: Request):
+    """
+    Restart the miners named in the body and/or matching its selector, resolved against
+    the host_vars inventory. Returns a job ID right away; follow it with
+    GET /restarts/bulk/{job_id} or the /events stream.
+    """
+    if not bearer_token_valid(request):
+        WEBHOOKS.labels(endpoint="bulk_restart", outcome="unauthorized").inc()
+        return JSONResponse(status_code=401, content={"status": "error", "message": "Missing or invalid bearer token"})
+    try:
+        body = BulkRestartRequest.model_validate_json(await request.body())
+    except ValidationError as e:
+        WEBHOOKS.labels(endpoint="bulk_restart", outcome="invalid").inc()
+        return JSONResponse(status_code=422, content={
+            "status": "error",
+            "message": "Invalid bulk restart request",
+            "errors": e.errors(include_url=False, include_context=False, include_input=False),
+        })
+
+    selector = body.selector.model_dump() if body.selector else {}
+    miners, missing = await asyncio.to_thread(inventory.select, body.miners, **selector)
+    if not miners:
+        WEBHOOKS.labels(endpoint="bulk_restart", outcome="empty").inc()
+        return JSONResponse(status_code=404, content={
+            "status": "error", "message": "No miners matched", "missing": missing,
+        })
+
+    job_id = await bulk_restarts.submit(miners, body.model_dump(exclude_none=True))
+    WEBHOOKS.labels(endpoint="bulk_restart", outcome="accepted").inc()
+    return {"status": "accepted", "job_id": job_id, "total": len(miners), "missing": missing}
+
+
+@app.get("/restarts/bulk/{job_id}")
+def bulk_restart_status(job_id: str):
+    job = bulk_restarts.store.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"status": "error", "message": f"Unknown job {job_id}"})
+    return job
+
+
+@app.get("/restarts/bulk/{job_id}/events")
+async def bulk_restart_events(job_id: str):
+    """Server-sent events: a ``progress`` event whenever the job advances, then ``done``."""
+    store = bulk_restarts.store
+    if await asyncio.to_thread(store.get, job_id, False) is None:
+        return JSONResponse(status_code=404, content={"status": "error", "message": f"Unknown job {job_id}"})
+
+    async def events():
+        # Polls the job store, so the stream works from any worker, not only the one running the job
+        last = None
+        while True:
+            job = await asyncio.to_thread(store.get, job_id, False)
+            finished = job["status"] != "running"
+            if finished:
+                job = await asyncio.to_thread(store.get, job_id)
+            if job != last:
+                event = "done" if finished else "progress"
+                yield f"event: {event}\ndata: {json.dumps(job)}\n\n"
+                last = job
+            if finished:
+                return
+            await asyncio.sleep(BULK_PROGRESS_INTERVAL)
 
-@app.post("/webhook")
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+PM2_OPERATIONS = ("list", "status", "logs")
+
+
+@app.post("/pm2/{operation}")
+async def pm2_operation(operation: str, request: Request):
+    """
+    pm2 ``list`` (once per host), ``status`` or ``logs`` (per miner) for the miners in the
+    body, selected like /restarts/bulk, run on all their hosts in parallel.
+    """
+    if operation not in PM2_OPERATIONS:
+        return JSONResponse(status_code=404, content={
+            "status": "error", "message": f"Unknown operation {operation}, expected one of {list(PM2_OPERATIONS)}",
+        })
+    if not bearer_token_valid(request):
+        WEBHOOKS.labels(endpoint="pm2", outcome="unauthorized").inc()
+        return JSONResponse(status_code=401, content={"status": "error", "message": "Missing or invalid bearer token"})
+    try:
+        body = Pm2Request.model_validate_json(await request.body())
+    except ValidationError as e:
+        WEBHOOKS.labels(endpoint="pm2", outcome="invalid").inc()
+        return JSONResponse(status_code=422, content={
+            "status": "error",
+            "message": "Invalid pm2 request",
+            "errors": e.errors(include_url=False, include_context=False, include_input=False),
+        })
+
+    selector = body.selector.model_dump() if body.selector else {}
+    miners, missing = await asyncio.to_thread(inventory.select, body.miners, **selector)
+    if not miners:
+        WEBHOOKS.labels(endpoint="pm2", outcome="empty").inc()
+        return JSONResponse(status_code=404, content={
+            "status": "error", "message": "No miners matched", "missing": missing,
+        })
+
+    concurrency = get_settings().PM2_QUERY_CONCURRENCY
+    if operation == "list":
+        reports = await monitoring_task.pm2.across("list", [m.host for m in miners], concurrency)
+    else:
+        kwargs = {"lines": body.lines} if operation == "logs" else {}
+        reports = await monitoring_task.pm2.across(operation, [(m.host, m.name) for m in miners], concurrency, **kwargs)
+    WEBHOOKS.labels(endpoint="pm2", outcome="accepted").inc()
+    return {
+        "status": "ok" if all(r.result.ok for r in reports) else "partial",
+        "operation": operation,
+        "results": [r.to_dict() for r in reports],
+        "missing": missing,
+    }
+
+
+@app.post("/webhook", status_code=202)
 async def handle_webhook(request: Request):
+    """
+    Validate the Uptime Kuma payload and queue it; the Down/Up handling happens in
+    process_notification (see EventStateMachine) after the response is sent.
+    """
+    body = await request.body()
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Raw webhook data: {body.decode(errors='replace')}")
+
     try:
-        webhook_data = await request.json()
-        logger.debug(f"Raw webhook data: {json.dumps(webhook_data, indent=2)}")
-        
-        monitor_name = webhook_data["monitor"]["name"]
-        monitor_url = webhook_data["monitor"]["url"]
-        monitor_msg = webhook_data.get("msg", "")
-        monitor_pathName = webhook_data["monitor"]["pathName"]
-        
-        # Only trigger monitoring task if status is "Down"
-        if "Down" in monitor_msg and "Active Miners" in monitor_pathName:
-        
-            # Check if there's already an active monitoring task for this URL
-            if monitor_url not in monitoring_task.active_tasks:
-                # Create new monitoring task
-                
-                task = asyncio.create_task(
-                    monitoring_task.monitor_and_restart(monitor_url, monitor_name)
-                )
-                monitoring_task.active_tasks[monitor_url] = task
-                logger.info(f"Started new monitoring task for {monitor_url}")
-            else:
-                logger.info(f"Monitoring task already active for {monitor_url}")
-
-            return {
-                "status": "success",
-                "message": f"Monitoring initiated for {monitor_name}",
-                "url": monitor_url
-            }
-        else:
-            logger.info(f"Skipping monitoring task - no Down status detected for {monitor_name}")
-            return {
-                "status": "skipped",
-                "message": f"No monitoring needed for {monitor_name} - status is not Down",
-                "url": monitor_url
-            }
-        
-    except Exception as e:
-        error_msg = f"Error processing webhook: {str(e)}"
-        logger.error(error_msg, exc_info=True)
-        return {"status": "error", "message": error_msg}
+        notification = MonitorNotification.model_validate_json(body)
+    except ValidationError as e:
+        WEBHOOKS.labels(endpoint="webhook", outcome="invalid").inc()
+        logger.warning(f"Rejected invalid webhook payload: {e.error_count()} validation errors")
+        return JSONResponse(status_code=422, content={
+            "status": "error",
+            "message": "Invalid webhook payload",
+            "errors": e.errors(include_url=False, include_context=False, include_input=False),
+        })
+
+    if not ingest_queue.submit(notification):
+        WEBHOOKS.labels(endpoint="webhook", outcome="rejected").inc()
+        logger.error("Webhook queue is full, rejecting notification")
+        return JSONResponse(status_code=503, content={"status": "error", "message": "Webhook queue is full"})
+
+    WEBHOOKS.labels(endpoint="webhook", outcome="accepted").inc()
+    return {
+        "status": "accepted",
+        "monitor": notification.monitor.name if notification.monitor else None,
+    }
     
 @app.post("/webhook/fetcher")
 async def handle_webhook_fetcher(request: Request):
@@ -86,29 +279,29 @@ async def handle_webhook_fetcher(request: Request):
         logger.info(f"Received request:\n {request}")
         auth_header = request.headers.get("Authorization")
         if not auth_header or not auth_header.startswith("Bearer "):
+            WEBHOOKS.labels(endpoint="webhook_fetcher", outcome="unauthorized").inc()
             logger.warning("Missing or invalid Authorization header")
             return {"status": "error", "message": "Missing or invalid bearer token"}, 401
         
         # Extract token (remove "Bearer " prefix)
         token = auth_header[7:]  # Skip "Bearer " (7 characters)
         
-        load_dotenv()
-        EXPECTED_TOKEN = os.getenv("API_TOKEN")
-        EXPECTED_TOKEN = EXPECTED_TOKEN.strip('"').strip("'")
+        EXPECTED_TOKEN = get_settings().API_TOKEN.strip('"').strip("'")
 
-        if token != EXPECTED_TOKEN:
+        if not EXPECTED_TOKEN or token != EXPECTED_TOKEN:
+            WEBHOOKS.labels(endpoint="webhook_fetcher", outcome="unauthorized").inc()
             logger.warning(f"Invalid bearer token provided: {token[:8]}...")
-            logger.warning(f"Token received: {token}")
-            logger.warning(f"Token expected: {EXPECTED_TOKEN}")
             return {"status": "error", "message": "Invalid bearer token"}, 401
         
         webhook_data = await request.json()
-        logger.debug(f"Raw webhook data: {json.dumps(webhook_data, indent=2)}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Raw webhook data: {json.dumps(webhook_data, indent=2)}")
         
         monitor_name = webhook_data["name"]
         monitor_url = webhook_data["url"]                        
       
         await monitoring_task.restart_service(monitor_url, monitor_name)
+        WEBHOOKS.labels(endpoint="webhook_fetcher", outcome="restarted").inc()
         
         return {
             "status": "success",
@@ -117,6 +310,7 @@ async def handle_webhook_fetcher(request: Request):
         }        
         
     except Exception as e:
+        WEBHOOKS.labels(endpoint="webhook_fetcher", outcome="error").inc()
         error_msg = f"Error processing webhook: {str(e)}"
         logger.error(error_msg, exc_info=True)
         return {"status": "error", "message": error_msg}
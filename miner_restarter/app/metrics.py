@@ -0,0 +1,193 @@
+import logging
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client import multiprocess
+
+logger = logging.getLogger(__name__)
+
+# uvicorn runs several workers; with PROMETHEUS_MULTIPROC_DIR set every worker
+# writes its samples there and /metrics aggregates them.
+MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+TRACING_ENABLED = os.environ.get("TRACING_ENABLED", "false").lower() in ("1", "true", "yes")
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+_SLOW_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "miner_restarter_http_request_duration_seconds",
+    "Time spent handling an HTTP request",
+    ["method", "path", "status"],
+    buckets=_LATENCY_BUCKETS,
+)
+WEBHOOKS = Counter(
+    "miner_restarter_webhooks_total",
+    "Webhooks received by endpoint and outcome",
+    ["endpoint", "outcome"],
+)
+ACTIVE_TASKS = Gauge(
+    "miner_restarter_active_monitoring_tasks",
+    "Monitoring tasks currently in flight",
+    multiprocess_mode="livesum",
+)
+INGEST_QUEUE_DEPTH = Gauge(
+    "miner_restarter_ingest_queue_depth",
+    "Webhook events accepted but not yet processed",
+    multiprocess_mode="livesum",
+)
+PROBE_DURATION = Histogram(
+    "miner_restarter_probe_duration_seconds",
+    "Latency of check_endpoint probes",
+    ["result"],
+    buckets=_SLOW_BUCKETS,
+)
+HOST_PROBE_DURATION = Histogram(
+    "miner_restarter_host_probe_duration_seconds",
+    "Latency of host reachability (SSH banner) probes",
+    ["result"],
+    buckets=_LATENCY_BUCKETS,
+)
+HOSTS_DOWN = Gauge(
+    "miner_restarter_hosts_down",
+    "Hosts currently unreachable, whose miner restarts are suspended",
+    multiprocess_mode="livesum",
+)
+HEARTBEAT_VERDICTS = Counter(
+    "miner_restarter_heartbeat_verdicts_total",
+    "Restart decisions taken from Kuma's heartbeat history (down, up, or probe when inconclusive)",
+    ["verdict"],
+)
+SSH_CONNECT_DURATION = Histogram(
+    "miner_restarter_ssh_connect_duration_seconds",
+    "Time to establish an SSH connection to a miner host",
+    buckets=_SLOW_BUCKETS,
+)
+RESTART_COMMAND_DURATION = Histogram(
+    "miner_restarter_restart_command_duration_seconds",
+    "Time taken by the remote pm2 restart command",
+    buckets=_SLOW_BUCKETS,
+)
+REMOTE_COMMANDS = Counter(
+    "miner_restarter_remote_commands_total",
+    "SSH commands run on miner hosts by operation and outcome",
+    ["operation", "outcome"],
+)
+RESTARTS = Counter(
+    "miner_restarter_restarts_total",
+    "Restart attempts by outcome",
+    ["outcome"],
+)
+NOTIFICATION_DURATION = Histogram(
+    "miner_restarter_notification_duration_seconds",
+    "Time taken to deliver a notification to one webhook",
+    ["type"],
+    buckets=_LATENCY_BUCKETS + (30,),
+)
+NOTIFICATIONS = Counter(
+    "miner_restarter_notifications_total",
+    "Notifications sent by webhook type and outcome",
+    ["type", "outcome"],
+)
+
+trace_id_var: ContextVar[str] = ContextVar("trace_id", default="-")
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+@contextmanager
+def trace_span(name: str, **attributes):
+    """Log a timed span tagged with the current trace id when TRACING_ENABLED is set."""
+    if not TRACING_ENABLED:
+        yield
+        return
+
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        duration_ms = (time.perf_counter() - start) * 1000
+        attrs = " ".join(f"{k}={v}" for k, v in attributes.items())
+        status = f"error={type(error).__name__}" if error else "ok"
+        logger.info(f"span trace_id={trace_id_var.get()} name={name} duration_ms={duration_ms:.1f} {status} {attrs}".rstrip())
+
+
+@contextmanager
+def observe(histogram, **labels):
+    """Observe the duration of the wrapped block on a histogram."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metric = histogram.labels(**labels) if labels else histogram
+        metric.observe(time.perf_counter() - start)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording request latency per route and tagging every request
+    with a trace id (taken from X-Trace-Id or generated), echoed in the response.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-trace-id":
+                trace_id = value.decode("latin-1")
+                break
+        trace_id = trace_id or new_trace_id()
+        token = trace_id_var.set(trace_id)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_trace_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = [*message.get("headers", ()), (b"x-trace-id", trace_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            with trace_span("http_request", method=scope["method"], path=scope["path"]):
+                await self.app(scope, receive, send_with_trace_id)
+        finally:
+            # The router stores the matched route in the scope
+            route = scope.get("route")
+            path = route.path if route else "unmatched"
+            HTTP_REQUEST_DURATION.labels(
+                method=scope["method"], path=path, status=str(status)
+            ).observe(time.perf_counter() - start)
+            trace_id_var.reset(token)
+
+
+def render_latest() -> tuple[bytes, str]:
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -1,10 +1,73 @@
-from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from pydantic import BaseModel, ConfigDict, Field, model_validator
+from typing import List, Optional
+
+
+class MonitorInfo(BaseModel):
+    # Uptime Kuma sends the full monitor row; only these fields are read
+    model_config = ConfigDict(extra="ignore")
+
+    id: Optional[int] = None
+    name: str
+    url: Optional[str] = None
+    pathName: str = ""
+
+
+class Heartbeat(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+    monitorID: Optional[int] = None
+    # 0 = down, 1 = up, 2 = pending, 3 = maintenance
+    status: Optional[int] = None
+    msg: str = ""
+
 
 class MonitorNotification(BaseModel):
-    url: Dict[str, Any]
-    name: Dict[str, Any]
-    msg: str
+    """Body of an Uptime Kuma webhook notification."""
+    model_config = ConfigDict(extra="ignore")
+
+    # Both are null for the "Test" button in the notification settings
+    monitor: Optional[MonitorInfo] = None
+    heartbeat: Optional[Heartbeat] = None
+    msg: str = ""
+
+    @property
+    def is_down(self) -> bool:
+        if self.heartbeat is not None and self.heartbeat.status is not None:
+            return self.heartbeat.status == 0
+        return "Down" in self.msg
+
+    @property
+    def is_up(self) -> bool:
+        if self.heartbeat is not None and self.heartbeat.status is not None:
+            return self.heartbeat.status == 1
+        return "Up" in self.msg
+
+    @property
+    def in_active_group(self) -> bool:
+        return self.monitor is not None and "Active Miners" in self.monitor.pathName
+
+
+class MinerSelector(BaseModel):
+    # host matches the ansible_host address or the host_vars file name
+    host: Optional[str] = None
+    provider: Optional[str] = None
+    branch: Optional[str] = None
+
+
+class BulkRestartRequest(BaseModel):
+    """Miners to restart: explicit names, a selector, or both (names filtered by the selector)."""
+    miners: Optional[List[str]] = None
+    selector: Optional[MinerSelector] = None
+
+    @model_validator(mode="after")
+    def require_target(self):
+        selector = self.selector
+        if not self.miners and (selector is None or not selector.model_dump(exclude_none=True)):
+            raise ValueError("Give a list of miners or a selector with host, provider or branch")
+        return self
+
 
-    class Config:
-        extra = "allow"  # Allow additional fields that may be sent by Uptime Kuma
\ No newline at end of file
+class Pm2Request(BulkRestartRequest):
+    """Miners to query with pm2, selected like a bulk restart."""
+    # Log lines per miner for the logs operation
+    lines: int = Field(100, ge=1, le=5000)
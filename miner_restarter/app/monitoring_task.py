@@ -1,29 +1,26 @@
 import asyncio
 import aiohttp
-import asyncssh
 import logging
-from pydantic_settings import BaseSettings
-from typing import Dict, List
-from pydantic import Field
+import time
+from typing import Dict, Optional
 from datetime import datetime
-from app.webhook_handler import send_notification_to_all
+from app.config import Settings, config, get_settings
+from app.webhook_handler import notify_all
+from app.heartbeats import HeartbeatHistory, KumaDbHeartbeats
+from app.host_correlation import HostOutageTracker, HostProbe, HostStateStore
+from app.remote_exec import Pm2, RemoteExecutor
+from app.restart_ledger import RestartDecision, RestartLedger
+from app.metrics import (
+    HEARTBEAT_VERDICTS,
+    PROBE_DURATION,
+    RESTART_COMMAND_DURATION,
+    RESTARTS,
+    trace_span,
+)
 import sys
-from dotenv import load_dotenv
 import os
 
 
-class Settings(BaseSettings):
-    load_dotenv("config")
-    SSH_USERNAME: str = os.environ.get("SSH_USERNAME", "miner-restarter")
-    SSH_KEY_PATH: str = os.environ.get("SSH_KEY_PATH", "./app/miner-restarter")
-    CHECK_INTERVAL: int = int(os.environ.get(
-        "CHECK_INTERVAL", 1200))  # 5 minutes in seconds
-    CHECK_COUNT: int = int(os.environ.get("CHECK_COUNT", 3))
-    TIMEOUT_THRESHOLD: int = int(os.environ.get(
-        "TIMEOUT_THRESHOLD", 3600))  # seconds
-    # AWS_IPS =["98.80.70.48","34.238.193.115"]
-
-
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -32,24 +29,87 @@ logging.basicConfig(
     ]
 )
 logger = logging.getLogger(__name__)
-settings = Settings()
 
 
 class MonitoringTask:
     def __init__(self):
+        settings = get_settings()
+        # Keyed by Kuma monitor ID, see EventStateMachine
         self.active_tasks: Dict[str, asyncio.Task] = {}
+        self.hosts = HostOutageTracker(
+            HostProbe(
+                # Shared with the other uvicorn workers, so they probe and alert once per host
+                HostStateStore(settings.RESTART_LEDGER_PATH),
+                port=settings.HOST_PROBE_PORT,
+                timeout=settings.HOST_PROBE_TIMEOUT,
+                cache_seconds=settings.HOST_PROBE_CACHE_SECONDS,
+            ),
+            notify=notify_all,
+            recheck_interval=settings.HOST_RECHECK_INTERVAL,
+        )
+        self.ledger = RestartLedger(
+            settings.RESTART_LEDGER_PATH,
+            backoff_base=settings.RESTART_BACKOFF_BASE,
+            backoff_max=settings.RESTART_BACKOFF_MAX,
+            window_seconds=settings.RESTART_BREAKER_WINDOW,
+            miner_threshold=settings.RESTART_BREAKER_THRESHOLD,
+            host_threshold=settings.HOST_BREAKER_THRESHOLD,
+        )
+        self.heartbeats = HeartbeatHistory(
+            KumaDbHeartbeats(settings.KUMA_DB_PATH),
+            cache_seconds=settings.HEARTBEAT_CACHE_SECONDS,
+            max_age=settings.HEARTBEAT_MAX_AGE,
+        ) if settings.KUMA_DB_PATH else None
+        self.remote = RemoteExecutor(
+            settings.SSH_USERNAME,
+            settings.SSH_KEY_PATH,
+            connect_timeout=settings.SSH_CONNECT_TIMEOUT,
+            exec_timeout=settings.SSH_COMMAND_TIMEOUT,
+        )
+        self.pm2 = Pm2(self.remote, self.get_sudo_username)
+        config.on_reload(self.apply_settings)
+
+    def apply_settings(self, settings: Settings):
+        """
+        Push a reloaded settings snapshot into the helpers built from the settings above.
+        Their paths (RESTART_LEDGER_PATH, KUMA_DB_PATH) only change on a restart.
+        """
+        self.hosts.probe.port = settings.HOST_PROBE_PORT
+        self.hosts.probe.timeout = settings.HOST_PROBE_TIMEOUT
+        self.hosts.probe.cache_seconds = settings.HOST_PROBE_CACHE_SECONDS
+        self.hosts.recheck_interval = settings.HOST_RECHECK_INTERVAL
+        self.ledger.backoff_base = settings.RESTART_BACKOFF_BASE
+        self.ledger.backoff_max = settings.RESTART_BACKOFF_MAX
+        self.ledger.window_seconds = settings.RESTART_BREAKER_WINDOW
+        self.ledger.miner_threshold = settings.RESTART_BREAKER_THRESHOLD
+        self.ledger.host_threshold = settings.HOST_BREAKER_THRESHOLD
+        if self.heartbeats is not None:
+            self.heartbeats.cache_seconds = settings.HEARTBEAT_CACHE_SECONDS
+            self.heartbeats.max_age = settings.HEARTBEAT_MAX_AGE
+        self.remote.username = settings.SSH_USERNAME
+        self.remote.key_path = settings.SSH_KEY_PATH
+        self.remote.connect_timeout = settings.SSH_CONNECT_TIMEOUT
+        self.remote.exec_timeout = settings.SSH_COMMAND_TIMEOUT
 
     async def check_endpoint(self, url: str, timeout: int = 60) -> bool:
+        start = time.perf_counter()
+        result = "error"
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, timeout=timeout) as response:
-                    return response.status in range(200, 299) or response.status in range(400, 499)
+            with trace_span("check_endpoint", url=url):
+                async with aiohttp.ClientSession() as session:
+                    async with session.get(url, timeout=timeout) as response:
+                        healthy = response.status in range(200, 299) or response.status in range(400, 499)
+            result = "healthy" if healthy else "unhealthy"
+            return healthy
         except asyncio.TimeoutError:
+            result = "timeout"
             logger.info(f"Request to {url} timed out after {timeout} seconds")
             return False
         except Exception as e:
             logger.error(f"Error checking {url}: {str(e)}")
             return False
+        finally:
+            PROBE_DURATION.labels(result=result).observe(time.perf_counter() - start)
 
     def extract_hostname(self, url: str) -> str:
         """Extract hostname without port number from URL."""
@@ -75,44 +135,88 @@ class MonitoringTask:
         # return 'ubuntu' if hostname in ["98.80.70.48","34.238.193.115"] else 'root'
         return 'miner'
 
-    async def restart_service(self, hostname: str, service_name: str):
+    async def restart_service(self, hostname: str, service_name: str, notify: bool = True,
+                              restart_id: Optional[int] = None) -> str:
+        settings = get_settings()
+        clean_hostname = self.extract_hostname(hostname)
+        started_at = time.time()
+        start = time.perf_counter()
+        outcome = "error"
+        detail = ""
         try:
-            clean_hostname = self.extract_hostname(hostname)
-            sudo_username = self.get_sudo_username(clean_hostname)
-            print(f"""Attempting to connect with:
-                    hostname: {clean_hostname},
-                    username: {settings.SSH_USERNAME}
-                    client_key: {settings.SSH_KEY_PATH}                    
-                  """)
-            
-            async with asyncssh.connect(
-                clean_hostname,
-                username=settings.SSH_USERNAME,
-                client_keys=[settings.SSH_KEY_PATH],
-                known_hosts=None
-            ) as conn:
-                command = f"sudo -u {sudo_username} /usr/local/bin/pm2 restart {service_name}"
-                logger.info(f"Executing command on {hostname}: {command}")
-                result = await conn.run(command)
-                if result.exit_status == 0:
-                    message = f"""
+            logger.info(f"Restarting {service_name} on {clean_hostname} as {self.remote.username}")
+            verify_after = settings.PM2_VERIFY_DELAY if settings.PM2_VERIFY_RESTART else None
+            with trace_span("pm2_restart", host=clean_hostname, service=service_name):
+                restart = await self.pm2.restart(clean_hostname, service_name, verify_after=verify_after)
+            result = restart.result
+            if result.exit_status is not None:
+                RESTART_COMMAND_DURATION.observe(result.exec_seconds)
+
+            if result.error:
+                # Unreachable host or hung pm2, counted against the host like a failed connection
+                detail = f"{result.error}: {result.detail}"
+                RESTARTS.labels(outcome="error").inc()
+                logger.error(f"Could not restart {service_name} on {hostname}: {detail}")
+            elif result.exit_status != 0 or restart.verified is False:
+                outcome = "failed"
+                detail = restart.verify_detail or result.stderr.strip()
+                RESTARTS.labels(outcome="failed").inc()
+                message = f"""
+                    MINER-RESTARTER                     
+                    Failed to restart miner {service_name} on {hostname}: {detail}"""
+                if notify:
+                    await notify_all(message)
+                logger.error(f"Failed to restart {service_name}: {detail}")
+            else:
+                outcome = "success"
+                RESTARTS.labels(outcome="success").inc()
+                if restart.process is not None:
+                    detail = f"pm2: {restart.process.status}, pid {restart.process.pid}, {restart.process.restarts} restarts"
+                elif restart.verify_detail:
+                    detail = f"Not verified: {restart.verify_detail}"
+                message = f"""
                     MINER-RESTARTER                     
                     Successfully restarted miner {service_name} on {hostname}"""
-                    send_notification_to_all(message)
+                if notify:
+                    await notify_all(message)
 
-                    logger.info(
-                        f"Successfully restarted {service_name} on {hostname}")
-                else:
-                    message = f"""
-                    MINER-RESTARTER                     
-                    Failed to restart miner {service_name} on {hostname}"""
-                    send_notification_to_all(message)
-                    logger.error(
-                        f"Failed to restart {service_name}: {result.stderr}")
+                logger.info(
+                    f"Successfully restarted {service_name} on {hostname}" + (f" ({detail})" if detail else ""))
         except Exception as e:
-            logger.error(f"SSH connection/command failed: {str(e)}")
+            detail = str(e)
+            RESTARTS.labels(outcome="error").inc()
+            logger.error(f"Restart of {service_name} on {clean_hostname} failed: {str(e)}")
+        finally:
+            # restart_id completes the row RestartLedger.claim inserted for this restart
+            await asyncio.to_thread(self.ledger.record, service_name, clean_hostname, outcome, started_at=started_at,
+                                    duration_seconds=time.perf_counter() - start, detail=detail,
+                                    restart_id=restart_id)
+        return outcome
+
+    async def refuse_restart(self, monitor_name: str, hostname: str, decision: RestartDecision):
+        # RestartLedger.claim has recorded the refusal
+        RESTARTS.labels(outcome=decision.reason).inc()
+        logger.info(f"Not restarting {monitor_name} on {hostname}: {decision.reason}, "
+                    f"next restart allowed in {decision.retry_after:.0f}s")
+        if not decision.newly_opened:
+            return
+        # The thresholds the ledger decided with
+        window_hours = self.ledger.window_seconds / 3600
+        if decision.reason == "host_breaker":
+            cause = f"{self.ledger.host_threshold} restarts failed on host {hostname} in the last {window_hours:.0f} hours."
+        else:
+            cause = f"Miner {monitor_name} was restarted {self.ledger.miner_threshold} times in the last {window_hours:.0f} hours."
+        message = f"""
+                MINER-RESTARTER
+                {cause}
+                Automatic restarts are paused for up to {decision.retry_after / 3600:.1f} hours, please check it manually."""
+        await notify_all(message)
 
     async def monitor_and_restart(self, url: str, monitor_name: str):
+        with trace_span("monitor_and_restart", url=url, monitor=monitor_name):
+            await self._monitor_and_restart(url, monitor_name)
+
+    async def _monitor_and_restart(self, url: str, monitor_name: str):
         logger.info(f"Starting monitoring task for {url} ({monitor_name})")
         
         # Add validation for url parameter
@@ -120,11 +224,31 @@ class MonitoringTask:
             logger.error(f"URL is None or empty for monitor {monitor_name}")
             return
         
-        settings = Settings()
+        # One snapshot for the whole task, a reload applies to the next one
+        settings = get_settings()
         failures = 0
         checks = 0
 
-        for _ in range(settings.CHECK_COUNT):
+        # When the whole host is down, wait for it with the other miners on it
+        # instead of probing this miner's endpoint
+        hostname = self.extract_hostname(url)
+        waited = await self.hosts.wait_until_reachable(hostname, monitor_name)
+        if waited is not None:
+            logger.info(f"Host {hostname} is back after {waited:.0f}s, checking {monitor_name}")
+
+        # Kuma has usually recorded enough heartbeats already to decide without probing
+        verdict = None
+        if self.heartbeats is not None and waited is None:
+            verdict = await self.heartbeats.verdict(monitor_name, settings.CHECK_COUNT)
+            HEARTBEAT_VERDICTS.labels(verdict=verdict or "probe").inc()
+        if verdict == "up":
+            logger.info(f"Latest Kuma heartbeat of {monitor_name} is Up, not restarting")
+            return
+        if verdict == "down":
+            failures = settings.CHECK_COUNT
+            logger.info(f"Last {failures} Kuma heartbeats of {monitor_name} are Down, skipping the checks")
+
+        for _ in range(settings.CHECK_COUNT if verdict is None else 0):
             is_healthy = await self.check_endpoint(url, settings.TIMEOUT_THRESHOLD)
 
             if not is_healthy:
@@ -139,26 +263,32 @@ class MonitoringTask:
             checks += 1
 
         if failures == settings.CHECK_COUNT:
+            if await self.hosts.host_is_down(hostname, monitor_name):
+                RESTARTS.labels(outcome="suppressed_host_down").inc()
+                logger.info(f"All checks failed for {url} but host {hostname} is down, not restarting")
+                return
+            # Decided and recorded in one transaction, so two workers cannot both restart it
+            decision = await asyncio.to_thread(self.ledger.claim, monitor_name, hostname)
+            if not decision.allowed:
+                await self.refuse_restart(monitor_name, hostname, decision)
+                return
             logger.info(f"All checks failed for {url}, initiating restart")
-            try:
-                message = f"""
+            if verdict == "down":
+                evidence = f"The last {settings.CHECK_COUNT} Kuma heartbeats of the {monitor_name} miner failed."
+            else:
+                evidence = f"After {settings.CHECK_COUNT} checks in {settings.CHECK_INTERVAL} second intervals and {settings.TIMEOUT_THRESHOLD} second timeout the {monitor_name} miner didn't respond."
+            message = f"""
                 MINER-RESTARTER
-                After {settings.CHECK_COUNT} checks in {settings.CHECK_INTERVAL} second intervals and {settings.TIMEOUT_THRESHOLD} second timeout the {monitor_name} miner didn't respond.
+                {evidence}
                 Scheduling restart...\n
                 """
-                send_notification_to_all(message)
-            except Exception as e:
-                logger.error(f"Failed to send notifications: {str(e)}")
+            await notify_all(message)
             try:
-                # Use the existing extract_hostname method instead of inline parsing
-                hostname = self.extract_hostname(url)
                 if hostname:
-                    await self.restart_service(hostname, monitor_name)
+                    await self.restart_service(hostname, monitor_name, restart_id=decision.restart_id)
                 else:
                     logger.error(f"Could not extract hostname from URL: {url}")
+                    await asyncio.to_thread(self.ledger.record, monitor_name, hostname, "error",
+                                            detail=f"No hostname in {url}", restart_id=decision.restart_id)
             except Exception as e:
-                logger.error(f"Failed to initiate restart: {str(e)}")
-
-        # Cleanup task reference
-        if url in self.active_tasks:
-            del self.active_tasks[url]
\ No newline at end of file
+                logger.error(f"Failed to initiate restart: {str(e)}")
\ No newline at end of file
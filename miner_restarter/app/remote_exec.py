@@ -0,0 +1,323 @@
+"""
+SSH commands on the miner hosts, with timeouts and structured results.
+
+Every connection and every command has a timeout, so an unreachable host or a hung
+``pm2`` fails its command instead of holding the task that sent it. Output is read
+line by line as it arrives (logged at debug level, and passed to an optional
+callback) and returned with the exit status in a ``RemoteResult``.
+
+``Pm2`` builds the pm2 operations on top: restart (optionally verified with
+``pm2 jlist`` over the same connection), process list, status and log tail, one host
+or many hosts at once.
+"""
+import asyncio
+import json
+import logging
+import shlex
+import time
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Iterable, List, Optional
+
+import asyncssh
+
+from app.metrics import REMOTE_COMMANDS, SSH_CONNECT_DURATION, trace_span
+
+logger = logging.getLogger(__name__)
+
+# (host, "stdout" or "stderr", line) for every line of output as it arrives
+OutputCallback = Callable[[str, str, str], None]
+
+
+@dataclass
+class RemoteResult:
+    host: str
+    command: str
+    exit_status: Optional[int] = None
+    stdout: str = ""
+    stderr: str = ""
+    # connect_timeout, connect_error, exec_timeout or exec_error; None if the command completed
+    error: Optional[str] = None
+    detail: str = ""
+    connect_seconds: float = 0.0
+    exec_seconds: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.exit_status == 0
+
+    def to_dict(self) -> dict:
+        return {**asdict(self), "ok": self.ok}
+
+
+class RemoteConnectError(Exception):
+    def __init__(self, kind: str, detail: str, seconds: float):
+        super().__init__(detail)
+        self.kind = kind
+        self.detail = detail
+        self.seconds = seconds
+
+
+class RemoteSession:
+    """Commands over one open SSH connection, see ``RemoteExecutor.session``."""
+
+    def __init__(self, executor: "RemoteExecutor", host: str, conn, connect_seconds: float):
+        self.executor = executor
+        self.host = host
+        self.conn = conn
+        self.connect_seconds = connect_seconds
+
+    async def run(self, command: str, operation: str = "command", timeout: Optional[float] = None,
+                  on_output: Optional[OutputCallback] = None) -> RemoteResult:
+        timeout = timeout or self.executor.exec_timeout
+        result = RemoteResult(self.host, command, connect_seconds=self.connect_seconds)
+        start = time.perf_counter()
+        try:
+            with trace_span(f"ssh_{operation}", host=self.host):
+                await asyncio.wait_for(self._exec(result, on_output), timeout)
+        except asyncio.TimeoutError:
+            result.error = "exec_timeout"
+            result.detail = f"No exit status after {timeout}s"
+        except Exception as e:
+            result.error = "exec_error"
+            result.detail = str(e)
+        result.exec_seconds = time.perf_counter() - start
+        REMOTE_COMMANDS.labels(operation=operation, outcome=_outcome(result)).inc()
+        if result.error:
+            logger.warning(f"{operation} on {self.host} failed ({result.error}): {result.detail}")
+        return result
+
+    async def _exec(self, result: RemoteResult, on_output: Optional[OutputCallback]):
+        process = await self.conn.create_process(result.command)
+        stdout: List[str] = []
+        stderr: List[str] = []
+
+        async def pump(reader, stream: str, lines: List[str]):
+            while True:
+                line = await reader.readline()
+                if not line:
+                    return
+                lines.append(line)
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"{self.host} {stream}: {line.rstrip()}")
+                if on_output is not None:
+                    on_output(self.host, stream, line)
+
+        try:
+            await asyncio.gather(pump(process.stdout, "stdout", stdout), pump(process.stderr, "stderr", stderr))
+            completed = await process.wait()
+            result.exit_status = completed.exit_status
+        finally:
+            # Whatever arrived before a timeout is kept
+            result.stdout = "".join(stdout)
+            result.stderr = "".join(stderr)
+
+
+class RemoteExecutor:
+    """Opens SSH connections to the miner hosts, with ``connect_timeout`` to connect and ``exec_timeout`` per command."""
+
+    def __init__(self, username: str, key_path: str, connect_timeout: float = 30, exec_timeout: float = 120):
+        self.username = username
+        self.key_path = key_path
+        self.connect_timeout = connect_timeout
+        self.exec_timeout = exec_timeout
+
+    @asynccontextmanager
+    async def session(self, host: str):
+        """An open connection to ``host``; raises RemoteConnectError if there is none in time."""
+        start = time.perf_counter()
+        try:
+            with trace_span("ssh_connect", host=host):
+                conn = await asyncio.wait_for(
+                    asyncssh.connect(host, username=self.username, client_keys=[self.key_path], known_hosts=None),
+                    self.connect_timeout,
+                )
+        except asyncio.TimeoutError:
+            raise RemoteConnectError("connect_timeout", f"No SSH connection to {host} after "
+                                     f"{self.connect_timeout}s", time.perf_counter() - start)
+        except Exception as e:
+            raise RemoteConnectError("connect_error", str(e), time.perf_counter() - start)
+        finally:
+            SSH_CONNECT_DURATION.observe(time.perf_counter() - start)
+        async with conn:
+            yield RemoteSession(self, host, conn, time.perf_counter() - start)
+
+    async def run(self, host: str, command: str, operation: str = "command", timeout: Optional[float] = None,
+                  on_output: Optional[OutputCallback] = None) -> RemoteResult:
+        try:
+            async with self.session(host) as session:
+                return await session.run(command, operation, timeout, on_output)
+        except RemoteConnectError as e:
+            REMOTE_COMMANDS.labels(operation=operation, outcome=e.kind).inc()
+            logger.warning(f"{operation} on {host} failed ({e.kind}): {e.detail}")
+            return RemoteResult(host, command, error=e.kind, detail=e.detail, connect_seconds=e.seconds)
+
+
+def _outcome(result: RemoteResult) -> str:
+    if result.error:
+        return result.error
+    return "success" if result.exit_status == 0 else "failed"
+
+
+@dataclass
+class Pm2Process:
+    name: str
+    status: str
+    pid: Optional[int] = None
+    # pm2's restart counter (pm2_env.restart_time)
+    restarts: int = 0
+    # Epoch seconds the process was last started, by the host's clock
+    started_at: Optional[float] = None
+    memory: Optional[int] = None
+    cpu: Optional[float] = None
+
+    @classmethod
+    def from_jlist(cls, entry: dict) -> "Pm2Process":
+        env = entry.get("pm2_env") or {}
+        monit = entry.get("monit") or {}
+        uptime = env.get("pm_uptime")
+        return cls(
+            name=entry.get("name", ""),
+            status=env.get("status", "unknown"),
+            pid=entry.get("pid") or None,
+            restarts=env.get("restart_time", 0),
+            started_at=uptime / 1000 if uptime else None,
+            memory=monit.get("memory"),
+            cpu=monit.get("cpu"),
+        )
+
+
+def parse_jlist(stdout: str) -> List[Pm2Process]:
+    """Processes in ``pm2 jlist`` output; pm2 may print notices before the JSON."""
+    start = stdout.find("[")
+    if start < 0:
+        raise ValueError("No process list in pm2 jlist output")
+    return [Pm2Process.from_jlist(entry) for entry in json.loads(stdout[start:])]
+
+
+@dataclass
+class Pm2Restart:
+    result: RemoteResult
+    # Whether pm2 jlist was read after the restart, and the restarted process in it
+    checked: bool = False
+    process: Optional[Pm2Process] = None
+    verify_detail: str = ""
+
+    @property
+    def verified(self) -> Optional[bool]:
+        """Whether pm2 reports the process online after the restart; None if that is unknown."""
+        if not self.checked:
+            return None
+        return self.process is not None and self.process.status == "online"
+
+
+@dataclass
+class Pm2Report:
+    """Structured result of a pm2 operation on one host (and miner, for status and logs)."""
+    host: str
+    miner: Optional[str]
+    result: RemoteResult
+    processes: List[Pm2Process] = field(default_factory=list)
+    logs: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        report = {
+            "host": self.host,
+            "miner": self.miner,
+            "ok": self.result.ok,
+            "error": self.result.error,
+            "detail": self.result.detail or ("" if self.result.ok else self.result.stderr.strip()),
+            "seconds": round(self.result.connect_seconds + self.result.exec_seconds, 3),
+            "processes": [asdict(p) for p in self.processes],
+        }
+        if self.logs is not None:
+            report["logs"] = self.logs
+        return report
+
+
+class Pm2:
+    """pm2 on the miner hosts, run through ``sudo -u <user>`` (``sudo_user`` maps a host to the user)."""
+
+    def __init__(self, executor: RemoteExecutor, sudo_user: Callable[[str], str],
+                 binary: str = "/usr/local/bin/pm2"):
+        self.executor = executor
+        self.sudo_user = sudo_user
+        self.binary = binary
+
+    def command(self, host: str, *args) -> str:
+        return " ".join(["sudo", "-u", shlex.quote(self.sudo_user(host)), self.binary,
+                         *(shlex.quote(str(arg)) for arg in args)])
+
+    async def restart(self, host: str, name: str, verify_after: Optional[float] = None) -> Pm2Restart:
+        """
+        Restart ``name``; with ``verify_after``, wait that many seconds and read its state
+        from ``pm2 jlist`` over the same connection.
+        """
+        command = self.command(host, "restart", name)
+        try:
+            async with self.executor.session(host) as session:
+                restart = Pm2Restart(await session.run(command, "pm2_restart"))
+                if verify_after is None or not restart.result.ok:
+                    return restart
+                await asyncio.sleep(verify_after)
+                listing = await session.run(self.command(host, "jlist"), "pm2_jlist")
+        except RemoteConnectError as e:
+            REMOTE_COMMANDS.labels(operation="pm2_restart", outcome=e.kind).inc()
+            return Pm2Restart(RemoteResult(host, command, error=e.kind, detail=e.detail, connect_seconds=e.seconds))
+
+        if not listing.ok:
+            restart.verify_detail = f"pm2 jlist failed: {listing.detail or listing.stderr.strip()}"
+            return restart
+        try:
+            processes = parse_jlist(listing.stdout)
+        except ValueError as e:
+            restart.verify_detail = f"Unreadable pm2 jlist output: {e}"
+            return restart
+        restart.checked = True
+        restart.process = next((p for p in processes if p.name == name), None)
+        if restart.process is None:
+            restart.verify_detail = f"{name} is not in pm2's process list"
+        elif not restart.verified:
+            restart.verify_detail = f"{name} is {restart.process.status} {verify_after}s after the restart"
+        return restart
+
+    async def list_processes(self, host: str) -> Pm2Report:
+        result = await self.executor.run(host, self.command(host, "jlist"), "pm2_jlist")
+        report = Pm2Report(host, None, result)
+        if result.ok:
+            try:
+                report.processes = parse_jlist(result.stdout)
+            except ValueError as e:
+                result.error, result.detail = "exec_error", f"Unreadable pm2 jlist output: {e}"
+        return report
+
+    async def status(self, host: str, name: str) -> Pm2Report:
+        report = await self.list_processes(host)
+        report.miner = name
+        report.processes = [p for p in report.processes if p.name == name]
+        return report
+
+    async def logs(self, host: str, name: str, lines: int = 100) -> Pm2Report:
+        command = self.command(host, "logs", name, "--nostream", "--lines", lines, "--raw")
+        result = await self.executor.run(host, command, "pm2_logs")
+        return Pm2Report(host, name, result, logs=result.stdout if result.ok else None)
+
+    async def across(self, operation: str, targets: Iterable, concurrency: int = 50, **kwargs) -> List[Pm2Report]:
+        """
+        Run ``list`` on every host in ``targets``, or ``status``/``logs`` on every
+        ``(host, miner)`` in it, with at most ``concurrency`` connections open at once.
+        """
+        if operation == "list":
+            calls = [self.list_processes(host) for host in dict.fromkeys(targets)]
+        elif operation in ("status", "logs"):
+            method = getattr(self, operation)
+            calls = [method(host, name, **kwargs) for host, name in targets]
+        else:
+            raise ValueError(f"Unknown pm2 operation {operation}")
+        slots = asyncio.Semaphore(concurrency)
+
+        async def bounded(call):
+            async with slots:
+                return await call
+
+        return list(await asyncio.gather(*map(bounded, calls)))
@@ -0,0 +1,195 @@
+import logging
+import sqlite3
+import time
+from contextlib import closing
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+from app.sqlite_store import SqliteStore
+
+logger = logging.getLogger(__name__)
+
+# Outcomes of an actual restart attempt, "started" while it runs; the other rows are
+# refused restarts, recorded with the RestartDecision reason as outcome
+ATTEMPT_OUTCOMES = ("started", "success", "failed", "error")
+FAILED_OUTCOMES = ("failed", "error")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS restarts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    miner TEXT NOT NULL,
+    host TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    duration_seconds REAL,
+    outcome TEXT NOT NULL,
+    detail TEXT
+);
+CREATE INDEX IF NOT EXISTS restarts_by_miner ON restarts (miner, started_at);
+CREATE INDEX IF NOT EXISTS restarts_by_host ON restarts (host, started_at);
+"""
+
+
+@dataclass
+class RestartDecision:
+    allowed: bool
+    # "ok", "backoff", "miner_breaker" or "host_breaker"
+    reason: str = "ok"
+    # Seconds until a restart is allowed again (an upper bound for open breakers)
+    retry_after: float = 0
+    # True for the first refusal after a breaker opened, so it is alerted once
+    newly_opened: bool = False
+    # Ledger row of the restart claimed by ``claim``, to be completed by ``record``
+    restart_id: Optional[int] = None
+
+
+class RestartLedger(SqliteStore):
+    """
+    SQLite record of every miner restart, shared by all uvicorn workers.
+
+    ``check`` decides whether a miner may be restarted now: the n-th restart of a miner
+    within ``window_seconds`` has to wait ``backoff_base * 2**(n-1)`` seconds (capped at
+    ``backoff_max``) after the previous one. The miner's breaker opens after
+    ``miner_threshold`` restarts in the window, the host's after ``host_threshold``
+    failed restarts on it; an open breaker refuses restarts until enough of those have
+    aged out of the window.
+
+    ``claim`` makes the same decision and records its result (a "started" row or the
+    refusal) in the same transaction, so two workers cannot both restart a miner.
+    """
+
+    SCHEMA = SCHEMA
+
+    def __init__(self, path: str, backoff_base: float = 300, backoff_max: float = 6 * 3600,
+                 window_seconds: float = 24 * 3600, miner_threshold: int = 5, host_threshold: int = 10,
+                 retention_days: float = 30, clock: Callable[[], float] = time.time):
+        super().__init__(path)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.window_seconds = window_seconds
+        self.miner_threshold = miner_threshold
+        self.host_threshold = host_threshold
+        self.retention_days = retention_days
+        self.clock = clock
+
+    def _initialize(self, conn: sqlite3.Connection) -> None:
+        conn.execute(
+            "DELETE FROM restarts WHERE started_at < ?",
+            (self.clock() - self.retention_days * 86400,),
+        )
+        conn.commit()
+
+    def record(self, miner: str, host: str, outcome: str, started_at: Optional[float] = None,
+               duration_seconds: Optional[float] = None, detail: str = "",
+               restart_id: Optional[int] = None) -> None:
+        """Record a restart, or complete the row ``claim`` inserted for it with ``restart_id``."""
+        try:
+            with closing(self._connect()) as conn, conn:
+                if restart_id is not None:
+                    conn.execute(
+                        "UPDATE restarts SET outcome = ?, duration_seconds = ?, detail = ? WHERE id = ?",
+                        (outcome, duration_seconds, detail[:1000], restart_id),
+                    )
+                    return
+                conn.execute(
+                    "INSERT INTO restarts (miner, host, started_at, duration_seconds, outcome, detail) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (miner, host, started_at if started_at is not None else self.clock(),
+                     duration_seconds, outcome, detail[:1000]),
+                )
+        except sqlite3.Error as e:
+            logger.error(f"Could not record restart of {miner} in {self.path}: {e}")
+
+    def check(self, miner: str, host: str) -> RestartDecision:
+        """Whether ``miner`` may be restarted now, without recording anything."""
+        try:
+            with closing(self._connect()) as conn:
+                return self._decide(conn, miner, host, self.clock())
+        except sqlite3.Error as e:
+            # Losing the ledger must not stop restarts altogether
+            logger.error(f"Could not read restart ledger {self.path}: {e}")
+            return RestartDecision(allowed=True)
+
+    def claim(self, miner: str, host: str) -> RestartDecision:
+        """
+        Decide like ``check`` and record the outcome in the same transaction: a
+        "started" row (its id in ``restart_id``) if the restart is allowed, otherwise
+        the refusal.
+        """
+        now = self.clock()
+        try:
+            with closing(self._connect()) as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    decision = self._decide(conn, miner, host, now)
+                    outcome, detail = "started", ""
+                    if not decision.allowed:
+                        outcome, detail = decision.reason, f"next restart allowed in {decision.retry_after:.0f}s"
+                    cursor = conn.execute(
+                        "INSERT INTO restarts (miner, host, started_at, outcome, detail) VALUES (?, ?, ?, ?, ?)",
+                        (miner, host, now, outcome, detail),
+                    )
+                    conn.commit()
+                except BaseException:
+                    conn.rollback()
+                    raise
+        except sqlite3.Error as e:
+            logger.error(f"Could not read restart ledger {self.path}: {e}")
+            return RestartDecision(allowed=True)
+        if decision.allowed:
+            decision.restart_id = cursor.lastrowid
+        return decision
+
+    def _decide(self, conn: sqlite3.Connection, miner: str, host: str, now: float) -> RestartDecision:
+        since = now - self.window_seconds
+        attempts = ",".join("?" * len(ATTEMPT_OUTCOMES))
+        failures = ",".join("?" * len(FAILED_OUTCOMES))
+        count, last = conn.execute(
+            f"SELECT COUNT(*), MAX(started_at) FROM restarts "
+            f"WHERE miner = ? AND started_at >= ? AND outcome IN ({attempts})",
+            (miner, since, *ATTEMPT_OUTCOMES),
+        ).fetchone()
+        host_failures, last_host_failure = conn.execute(
+            f"SELECT COUNT(*), MAX(started_at) FROM restarts "
+            f"WHERE host = ? AND started_at >= ? AND outcome IN ({failures})",
+            (host, since, *FAILED_OUTCOMES),
+        ).fetchone()
+        if host_failures >= self.host_threshold:
+            opened = self._first_refusal(conn, "host", host, "host_breaker", last_host_failure)
+            return RestartDecision(False, "host_breaker", last_host_failure + self.window_seconds - now,
+                                   newly_opened=opened)
+        if count >= self.miner_threshold:
+            opened = self._first_refusal(conn, "miner", miner, "miner_breaker", last)
+            return RestartDecision(False, "miner_breaker", last + self.window_seconds - now,
+                                   newly_opened=opened)
+
+        if count:
+            wait = min(self.backoff_base * 2 ** (count - 1), self.backoff_max)
+            if now - last < wait:
+                return RestartDecision(False, "backoff", last + wait - now)
+        return RestartDecision(True)
+
+    @staticmethod
+    def _first_refusal(conn, column: str, value: str, reason: str, since: float) -> bool:
+        # Refusals are recorded with the reason as outcome (see MonitoringTask), so the
+        # breaker has only just opened if none was recorded since the restart that opened it
+        return conn.execute(
+            f"SELECT 1 FROM restarts WHERE {column} = ? AND outcome = ? AND started_at >= ? LIMIT 1",
+            (value, reason, since),
+        ).fetchone() is None
+
+    def history(self, miner: Optional[str] = None, host: Optional[str] = None, limit: int = 50) -> List[dict]:
+        clauses, params = [], []
+        if miner:
+            clauses.append("miner = ?")
+            params.append(miner)
+        if host:
+            clauses.append("host = ?")
+            params.append(host)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                f"SELECT miner, host, started_at, duration_seconds, outcome, detail FROM restarts "
+                f"{where} ORDER BY started_at DESC, id DESC LIMIT ?",
+                (*params, limit),
+            ).fetchall()
+        return [dict(row) for row in rows]
@@ -0,0 +1,43 @@
+import os
+import sqlite3
+from typing import Optional
+
+
+class SqliteStore:
+    """
+    Base of the SQLite stores the uvicorn workers share (restart ledger, bulk jobs,
+    monitor and host state). ``_connect`` opens ``path``, and on first use creates
+    its directory, switches it to WAL so the other workers can read while one of them
+    writes, and runs ``SCHEMA`` and ``_initialize``.
+    """
+
+    SCHEMA = ""
+    # sqlite3's isolation_level; None for autocommit, with transactions opened
+    # explicitly with BEGIN IMMEDIATE
+    ISOLATION_LEVEL: Optional[str] = ""
+    # PRAGMA synchronous for every connection, SQLite's default (FULL) if None
+    SYNCHRONOUS: Optional[str] = None
+
+    def __init__(self, path: str):
+        self.path = path
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            # Before connecting, SQLite does not create missing directories
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=self.ISOLATION_LEVEL)
+        conn.row_factory = sqlite3.Row
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(self.SCHEMA)
+            self._initialize(conn)
+            self._initialized = True
+        if self.SYNCHRONOUS:
+            conn.execute(f"PRAGMA synchronous={self.SYNCHRONOUS}")
+        return conn
+
+    def _initialize(self, conn: sqlite3.Connection) -> None:
+        """Runs once after the schema, on the first connection."""
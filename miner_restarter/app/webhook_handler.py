@@ -1,11 +1,14 @@
-import os
+import asyncio
+import concurrent.futures
+import threading
+import time
 import requests
 import logging
-from typing import List, Tuple, Optional
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv()
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Mapping, Tuple, Optional
+from app.config import config, get_settings
+from app.metrics import NOTIFICATION_DURATION, NOTIFICATIONS, trace_span
 
 # Set up logging
 log_file = "/root/webhook_handler.log"
@@ -17,17 +20,22 @@ logging.basicConfig(
 )
 
 
-def load_webhooks_from_env() -> List[Tuple[str, str]]:
+def load_webhooks_from_env(env: Optional[Mapping[str, str]] = None) -> List[Tuple[str, str]]:
     """
     Load webhook configurations from environment variables.
     Expected format: WEBHOOK_1_TYPE, WEBHOOK_1_URL, WEBHOOK_2_TYPE, WEBHOOK_2_URL, etc.
+
+    Args:
+        env: Variables to read from. If None, the env files merged with the environment
     """
+    if env is None:
+        env = config.environ()
     webhooks = []
     i = 1
     
     while True:
-        webhook_type = os.getenv(f"WEBHOOK_{i}_TYPE")
-        webhook_url = os.getenv(f"WEBHOOK_{i}_URL")
+        webhook_type = env.get(f"WEBHOOK_{i}_TYPE")
+        webhook_url = env.get(f"WEBHOOK_{i}_URL")
         
         if not webhook_type or not webhook_url:
             break
@@ -48,47 +56,189 @@ def load_webhooks_from_env() -> List[Tuple[str, str]]:
 WEBHOOKS = load_webhooks_from_env()
 
 
-def send_notification_to_webhook(webhook_type: str, webhook_url: str, message: str) -> bool:
+# Expected status code of a successful post, by webhook type
+SUCCESS_STATUS = {"discord": 204, "slack": 200}
+
+_sessions = threading.local()
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+@dataclass
+class DeliveryResult:
+    webhook_type: str
+    webhook_url: str
+    success: bool
+    latency_seconds: float
+    status_code: Optional[int] = None
+    attempts: int = 0
+    error: Optional[str] = None
+
+
+def _session() -> requests.Session:
+    """One keep-alive session per sender thread, reused across notifications."""
+    session = getattr(_sessions, "session", None)
+    if session is None:
+        session = _sessions.session = requests.Session()
+    return session
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=get_settings().NOTIFICATION_WORKERS,
+                                           thread_name_prefix="notify")
+        return _executor
+
+
+def _retry_after(response: requests.Response) -> float:
+    """Seconds to wait after a 429, from the Retry-After header or Discord's JSON body."""
+    header = response.headers.get("Retry-After")
+    if header:
+        try:
+            return float(header)
+        except ValueError:
+            pass
+    try:
+        return float(response.json().get("retry_after", 1))
+    except (ValueError, AttributeError):
+        return 1.0
+
+
+def deliver(webhook_type: str, webhook_url: str, message: str, timeout: Optional[float] = None) -> DeliveryResult:
     """
-    Send a notification to a specific webhook based on its type.
-    
+    Post a notification to one webhook, retrying on 429 rate limits.
+
     Args:
         webhook_type: Type of webhook ('discord' or 'slack')
         webhook_url: The webhook URL
         message: The message to send
-    
+        timeout: Time budget in seconds for this destination, including rate limit waits.
+            Defaults to NOTIFICATION_TIMEOUT. requests applies it per socket operation, so a
+            destination trickling its answer can overrun it; deliver_to_all and notify_all
+            stop waiting for it at the deadline
+
     Returns:
-        bool: True if successful, False otherwise
+        DeliveryResult: Outcome, status code, latency and attempts for this destination
     """
+    webhook_type = webhook_type.lower()
+    settings = get_settings()
+    timeout = settings.NOTIFICATION_TIMEOUT if timeout is None else timeout
+    result = DeliveryResult(webhook_type, webhook_url, success=False, latency_seconds=0.0)
     if not webhook_url:
+        result.error = "URL not provided"
         logging.error(f"{webhook_type.capitalize()} webhook URL not provided.")
-        return False
-    
+        return result
+    if webhook_type not in SUCCESS_STATUS:
+        result.error = "unknown type"
+        logging.error(f"Unknown webhook type: {webhook_type}")
+        return result
+
+    payload = {"content": message} if webhook_type == "discord" else {"text": message}
+    start = time.perf_counter()
+    deadline = start + timeout
+    outcome = "error"
     try:
-        if webhook_type.lower() == "discord":
-            data = {"content": message}
-            response = requests.post(webhook_url, json=data)
-            success = response.status_code == 204
-        elif webhook_type.lower() == "slack":
-            data = {"text": message}
-            response = requests.post(webhook_url, json=data)
-            success = response.status_code == 200
-        else:
-            logging.error(f"Unknown webhook type: {webhook_type}")
-            return False
-        
-        if success:
+        with trace_span("send_notification", type=webhook_type):
+            while True:
+                result.attempts += 1
+                response = _session().post(webhook_url, json=payload, timeout=max(deadline - time.perf_counter(), 0.1))
+                result.status_code = response.status_code
+                if response.status_code != 429:
+                    break
+                wait = _retry_after(response)
+                if result.attempts > settings.NOTIFICATION_MAX_RETRIES or time.perf_counter() + wait >= deadline:
+                    break
+                logging.warning(f"{webhook_type.capitalize()} rate limited the notification, retrying in {wait:.1f}s")
+                time.sleep(wait)
+
+        result.success = response.status_code == SUCCESS_STATUS[webhook_type]
+        outcome = "success" if result.success else ("rate_limited" if response.status_code == 429 else "failed")
+        if result.success:
             logging.info(f"Notification sent to {webhook_type.capitalize()}.")
         else:
+            result.error = f"HTTP {response.status_code}"
             logging.error(
                 f"Failed to send {webhook_type.capitalize()} notification. "
                 f"Status code: {response.status_code}, Response: {response.text}"
             )
-        return success
-        
+    except requests.Timeout:
+        outcome = "timeout"
+        result.error = f"timed out after {timeout:.0f}s"
+        logging.error(f"Timed out sending to {webhook_type} after {timeout:.0f}s")
     except Exception as e:
+        result.error = str(e)
         logging.error(f"Exception sending to {webhook_type}: {str(e)}")
-        return False
+    finally:
+        result.latency_seconds = time.perf_counter() - start
+        NOTIFICATION_DURATION.labels(type=webhook_type).observe(result.latency_seconds)
+        NOTIFICATIONS.labels(type=webhook_type, outcome=outcome).inc()
+    return result
+
+
+def _timed_out(webhook_type: str, webhook_url: str, timeout: float) -> DeliveryResult:
+    logging.error(f"No answer from {webhook_type} within {timeout:.0f}s, giving up on it")
+    return DeliveryResult(webhook_type.lower(), webhook_url, success=False, latency_seconds=timeout,
+                          error=f"timed out after {timeout:.0f}s")
+
+
+def send_notification_to_webhook(webhook_type: str, webhook_url: str, message: str) -> bool:
+    """
+    Send a notification to a specific webhook based on its type.
+    
+    Args:
+        webhook_type: Type of webhook ('discord' or 'slack')
+        webhook_url: The webhook URL
+        message: The message to send
+    
+    Returns:
+        bool: True if successful, False otherwise
+    """
+    return deliver(webhook_type, webhook_url, message).success
+
+
+def deliver_to_all(message: str, webhooks: Optional[List[Tuple[str, str]]] = None) -> List[DeliveryResult]:
+    """
+    Send a notification to all configured webhooks concurrently, so a slow or hung
+    destination only costs its own timeout. A destination still sending at
+    NOTIFICATION_TIMEOUT (retries included) is reported as timed out.
+
+    Args:
+        message: The message to send
+        webhooks: Optional list of (type, url) tuples. If None, uses WEBHOOKS
+
+    Returns:
+        List[DeliveryResult]: One result per webhook, in the order of ``webhooks``
+    """
+    if webhooks is None:
+        webhooks = WEBHOOKS
+
+    if not webhooks:
+        logging.warning("No webhooks configured")
+        return []
+
+    timeout = get_settings().NOTIFICATION_TIMEOUT
+    executor = _get_executor()
+    futures = [executor.submit(deliver, webhook_type, webhook_url, message) for webhook_type, webhook_url in webhooks]
+    deadline = time.monotonic() + timeout
+    results = []
+    for (webhook_type, webhook_url), future in zip(webhooks, futures):
+        try:
+            results.append(future.result(timeout=max(deadline - time.monotonic(), 0)))
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            results.append(_timed_out(webhook_type, webhook_url, timeout))
+    _log_summary(results)
+    return results
+
+
+def _log_summary(results: List[DeliveryResult]):
+    success_count = sum(result.success for result in results)
+    logging.info(
+        f"Sent notifications to {success_count}/{len(results)} webhooks in "
+        f"{max(result.latency_seconds for result in results):.2f}s."
+    )
 
 
 def send_notification_to_all(message: str, webhooks: Optional[List[Tuple[str, str]]] = None):
@@ -98,21 +248,45 @@ def send_notification_to_all(message: str, webhooks: Optional[List[Tuple[str, st
     Args:
         message: The message to send
         webhooks: Optional list of (type, url) tuples. If None, uses WEBHOOKS
+
+    Returns:
+        int: Number of webhooks the notification was delivered to
+    """
+    return sum(result.success for result in deliver_to_all(message, webhooks))
+
+
+async def notify_all(message: str, webhooks: Optional[List[Tuple[str, str]]] = None) -> List[DeliveryResult]:
+    """
+    deliver_to_all for the event loop: every destination is posted from the sender
+    pool and awaited without holding an event loop or default executor thread, for at
+    most NOTIFICATION_TIMEOUT per destination.
     """
     if webhooks is None:
         webhooks = WEBHOOKS
-    
+
     if not webhooks:
         logging.warning("No webhooks configured")
-        return 0
-    
-    success_count = 0
-    for webhook_type, webhook_url in webhooks:
-        if send_notification_to_webhook(webhook_type, webhook_url, message):
-            success_count += 1
-    
-    logging.info(f"Sent notifications to {success_count}/{len(webhooks)} webhooks.")
-    return success_count
+        return []
+
+    timeout = get_settings().NOTIFICATION_TIMEOUT
+    executor = _get_executor()
+
+    async def deliver_within_timeout(webhook_type: str, webhook_url: str) -> DeliveryResult:
+        future = executor.submit(deliver, webhook_type, webhook_url, message)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            return _timed_out(webhook_type, webhook_url, timeout)
+
+    try:
+        results = await asyncio.gather(*(
+            deliver_within_timeout(webhook_type, webhook_url) for webhook_type, webhook_url in webhooks
+        ))
+    except Exception as e:
+        logging.error(f"Failed to send notifications: {str(e)}")
+        return []
+    _log_summary(results)
+    return results
 
 
 def send_notification_to_type(message: str, target_type: str, webhooks: Optional[List[Tuple[str, str]]] = None):
@@ -136,13 +310,16 @@ def send_notification_to_type(message: str, target_type: str, webhooks: Optional
     return send_notification_to_all(message, filtered_webhooks)
 
 
-def reload_webhooks():
+def reload_webhooks(env: Optional[Mapping[str, str]] = None):
     """Reload webhooks from environment variables"""
     global WEBHOOKS
-    WEBHOOKS = load_webhooks_from_env()
+    WEBHOOKS = load_webhooks_from_env(env)
     return WEBHOOKS
 
 
+config.on_reload(lambda settings: reload_webhooks())
+
+
 # Example usage:
 if __name__ == "__main__":
     # Send to all webhooks
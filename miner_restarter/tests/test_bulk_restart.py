@@ -0,0 +1,130 @@
+import asyncio
+import os
+from unittest.mock import patch
+
+import yaml
+from fastapi.testclient import TestClient
+
+from app import main
+from app.bulk_restart import BulkRestartExecutor, JobStore
+from app.inventory import Inventory, InventoryMiner
+
+
+def write_host_vars(directory):
+    directory.mkdir()
+    hosts = {
+        "host1": {"ansible_host": "10.0.0.1", "provider": "Hetzner",
+                  "miners": [{"name": "m1", "branch": "main"}, {"name": "m2", "branch": "dev"}]},
+        "host2": {"ansible_host": "10.0.0.2", "provider": "Latitude",
+                  "miners": [{"name": "m3", "branch": "main"}]},
+    }
+    for name, data in hosts.items():
+        (directory / f"{name}.yml").write_text(yaml.safe_dump(data))
+    return Inventory(str(directory))
+
+
+def test_inventory_selection(tmp_path):
+    inventory = write_host_vars(tmp_path / "host_vars")
+
+    selected, _ = inventory.select(branch="main")
+    assert [m.name for m in selected] == ["m1", "m3"]
+    selected, _ = inventory.select(host="host1", provider="hetzner")
+    assert [(m.name, m.host) for m in selected] == [("m1", "10.0.0.1"), ("m2", "10.0.0.1")]
+    selected, missing = inventory.select(names=["m2", "gone"])
+    assert [m.name for m in selected] == ["m2"] and missing == ["gone"]
+
+
+
+def test_inventory_reloads_files_rewritten_in_place(tmp_path):
+    inventory = write_host_vars(tmp_path / "host_vars")
+    assert len(inventory.miners()) == 3
+
+    # Overwriting a file (as the tenant merge does) leaves the directory's mtime alone
+    path = tmp_path / "host_vars" / "host2.yml"
+    stat = path.stat()
+    path.write_text(yaml.safe_dump({"ansible_host": "10.0.0.2", "miners": [{"name": "m4"}]}))
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert [m.name for m in inventory.miners()] == ["m1", "m2", "m4"]
+
+def test_restarts_are_serialized_per_host(tmp_path):
+    inventory = write_host_vars(tmp_path / "host_vars")
+    store = JobStore(str(tmp_path / "ledger.db"))
+    running, peak = {}, {}
+    summaries = []
+
+    async def restart(host, miner):
+        running[host] = running.get(host, 0) + 1
+        peak[host] = max(peak.get(host, 0), running[host])
+        await asyncio.sleep(0.01)
+        running[host] -= 1
+        return "failed" if miner == "m3" else "success"
+
+    async def notify(message):
+        summaries.append(message)
+
+    async def run():
+        executor = BulkRestartExecutor(restart, store, concurrency=10, per_host=1, notify=notify)
+        job_id = await executor.submit(inventory.miners(), {"selector": {}})
+        await asyncio.gather(*executor._tasks)
+        return job_id
+
+    job = store.get(asyncio.run(run()))
+    assert peak == {"10.0.0.1": 1, "10.0.0.2": 1}
+    assert job["status"] == "done"
+    assert job["total"] == job["done"] == 3
+    assert job["counts"] == {"success": 2, "failed": 1}
+    assert "1 failed, 2 success" in summaries[0]
+
+
+
+def test_same_miner_name_on_two_hosts(tmp_path):
+    store = JobStore(str(tmp_path / "data" / "ledger.db"))
+    miners = [InventoryMiner("m1", "10.0.0.1", "host1"), InventoryMiner("m1", "10.0.0.2", "host2")]
+
+    async def run():
+        executor = BulkRestartExecutor(lambda host, miner: asyncio.sleep(0, "success"), store)
+        job_id = await executor.submit(miners, {"names": ["m1"]})
+        await asyncio.gather(*executor._tasks)
+        return job_id
+
+    job = store.get(asyncio.run(run()))
+    assert [(item["host"], item["outcome"]) for item in job["items"]] == [("10.0.0.1", "success"),
+                                                                           ("10.0.0.2", "success")]
+
+def test_bulk_restart_endpoint(tmp_path):
+    inventory = write_host_vars(tmp_path / "host_vars")
+    store = JobStore(str(tmp_path / "ledger.db"))
+    restarted = []
+
+    async def restart_service(host, miner, notify=True):
+        restarted.append((host, miner, notify))
+        return "success"
+
+    async def notify_all(message):
+        pass
+
+    headers = {"Authorization": "Bearer secret"}
+    with patch.object(main, "inventory", inventory), \
+            patch.object(main.bulk_restarts, "store", store), \
+            patch.object(main.bulk_restarts, "notify", notify_all), \
+            patch.object(main.monitoring_task, "restart_service", restart_service), \
+            patch.object(main.config, "_settings", main.get_settings().model_copy(update={"API_TOKEN": "secret"})), \
+            TestClient(main.app) as client:
+        assert client.post("/restarts/bulk", json={"miners": ["m1"]}).status_code == 401
+        assert client.post("/restarts/bulk", json={}, headers=headers).status_code == 422
+        assert client.post("/restarts/bulk", json={"miners": ["gone"]}, headers=headers).status_code == 404
+
+        response = client.post("/restarts/bulk", json={"selector": {"host": "host1"}}, headers=headers)
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+        assert response.json()["total"] == 2
+
+        with client.stream("GET", f"/restarts/bulk/{job_id}/events") as stream:
+            events = [line for line in stream.iter_lines() if line.startswith("event:")]
+        assert events[-1] == "event: done"
+
+        job = client.get(f"/restarts/bulk/{job_id}").json()
+        assert job["status"] == "done"
+        assert [item["outcome"] for item in job["items"]] == ["success", "success"]
+        assert client.get("/restarts/bulk/unknown").status_code == 404
+    assert sorted(restarted) == [("10.0.0.1", "m1", False), ("10.0.0.1", "m2", False)]
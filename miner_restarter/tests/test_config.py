@@ -0,0 +1,50 @@
+import os
+
+import pytest
+
+from app.config import ConfigService
+
+
+@pytest.fixture
+def env_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for name in ("CHECK_COUNT", "API_TOKEN"):
+        monkeypatch.delenv(name, raising=False)
+    (tmp_path / "config").write_text("CHECK_COUNT = 5\n")
+    (tmp_path / ".env").write_text("API_TOKEN=secret\n")
+    return tmp_path
+
+
+def test_settings_are_parsed_once_and_frozen(env_dir):
+    service = ConfigService()
+    settings = service.settings
+    assert settings.CHECK_COUNT == 5
+    assert settings.API_TOKEN == "secret"
+
+    (env_dir / "config").write_text("CHECK_COUNT = 7\n")
+    # The snapshot does not change until a reload
+    assert service.settings is settings
+    with pytest.raises(Exception):
+        settings.CHECK_COUNT = 1
+
+
+def test_reload_on_file_change(env_dir):
+    service = ConfigService()
+    reloaded = []
+    service.on_reload(reloaded.append)
+
+    (env_dir / "config").write_text("CHECK_COUNT = 7\n")
+    os.utime(env_dir / "config", (1, 1))
+    assert service.changed()
+    assert service.reload()
+    assert service.settings.CHECK_COUNT == 7
+    assert reloaded == [service.settings]
+    assert not service.changed()
+
+
+def test_invalid_reload_keeps_previous_settings(env_dir):
+    service = ConfigService()
+    (env_dir / "config").write_text("CHECK_COUNT = three\n")
+    assert not service.reload()
+    assert service.settings.CHECK_COUNT == 5
+    assert service.environ()["CHECK_COUNT"] == "three"
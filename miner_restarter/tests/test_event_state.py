@@ -0,0 +1,136 @@
+import asyncio
+
+from app.event_state import EventStateMachine, MonitorStateStore, Phase
+from app.models import MonitorNotification
+
+
+def notification(status, monitor_id=1, url="http://10.0.0.1:8091"):
+    return MonitorNotification.model_validate({
+        "heartbeat": {"monitorID": monitor_id, "status": status, "msg": ""},
+        "monitor": {"id": monitor_id, "name": f"miner{monitor_id}", "url": url,
+                    "pathName": f"Active Miners / miner{monitor_id}"},
+        "msg": "",
+    })
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_machine(tmp_path, **kwargs):
+    calls = []
+    finished = asyncio.Event()
+
+    async def monitor(url, name):
+        calls.append((url, name))
+        await finished.wait()
+
+    machine = EventStateMachine(monitor, {}, MonitorStateStore(str(tmp_path / "state.db")), **kwargs)
+    return machine, calls, finished
+
+
+async def settle():
+    # Long enough for a store call in a thread and the task it starts
+    for _ in range(5):
+        await asyncio.sleep(0.01)
+
+
+def test_duplicate_down_is_dropped_and_up_cancels(tmp_path):
+    async def scenario():
+        machine, calls, _ = make_machine(tmp_path)
+        assert await machine.handle(notification(0)) == "started"
+        assert await machine.handle(notification(0)) == "duplicate"
+        await settle()
+        assert calls == [("http://10.0.0.1:8091", "miner1")]
+
+        task = machine.active_tasks["1"]
+        assert await machine.handle(notification(1)) == "cancelled"
+        await settle()
+        assert task.cancelled()
+        assert machine.active_tasks == {}
+        assert machine.store.get("1").phase is Phase.IDLE
+        assert await machine.handle(notification(1)) == "ignored"
+
+    asyncio.run(scenario())
+
+
+def test_reused_monitor_id_replaces_the_check(tmp_path):
+    async def scenario():
+        machine, calls, finished = make_machine(tmp_path)
+        await machine.handle(notification(0, url="http://10.0.0.1:8091"))
+        old_task = machine.active_tasks["1"]
+        assert await machine.handle(notification(0, url="http://10.0.0.2:8091")) == "replaced"
+        await settle()
+        assert old_task.cancelled()
+        assert calls[-1] == ("http://10.0.0.2:8091", "miner1")
+
+        finished.set()
+        await machine.active_tasks["1"]
+        await settle()
+        assert machine.active_tasks == {}
+        assert machine.store.get("1").phase is Phase.IDLE
+
+    asyncio.run(scenario())
+
+
+def test_flapping_monitor_is_debounced(tmp_path):
+    async def scenario():
+        clock = FakeClock()
+        machine, calls, _ = make_machine(tmp_path, flap_window_seconds=600, flap_threshold=4, clock=clock)
+        for status in (0, 1, 0, 1):
+            await machine.handle(notification(status))
+            await settle()
+            clock.now += 10
+        assert await machine.handle(notification(0)) == "debounced"
+        await settle()
+        # The first two Downs were checked right away, the third one waits out the window
+        assert len(calls) == 2
+        assert machine.store.get("1").phase is Phase.DEBOUNCING
+        await machine.handle(notification(1))
+        assert machine.active_tasks == {}
+
+        # Once the window has passed the monitor is no longer flapping
+        clock.now += 1000
+        assert await machine.handle(notification(0)) == "started"
+        await machine.handle(notification(1))
+
+    asyncio.run(scenario())
+
+
+def test_down_and_up_on_different_workers(tmp_path):
+    async def scenario():
+        clock = FakeClock()
+        worker_a, calls, _ = make_machine(tmp_path, clock=clock, worker_id="a")
+        worker_b = EventStateMachine(worker_a.monitor, {}, MonitorStateStore(worker_a.store.path),
+                                     clock=clock, worker_id="b")
+
+        assert await worker_a.handle(notification(0)) == "started"
+        # The other worker sees the check running on the first one
+        assert await worker_b.handle(notification(0)) == "duplicate"
+        await settle()
+        assert len(calls) == 1
+        task = worker_a.active_tasks["1"]
+
+        assert await worker_b.handle(notification(1)) == "cancelled"
+        assert worker_b.store.get("1").phase is Phase.IDLE
+        # The first worker stops its check on its next sync
+        await worker_a.sync()
+        await settle()
+        assert task.cancelled()
+        assert worker_a.active_tasks == {}
+
+        # A check whose worker stopped renewing its lease is taken over
+        assert await worker_a.handle(notification(0)) == "started"
+        clock.now += worker_a.lease_seconds + 1
+        assert await worker_b.handle(notification(0)) == "started"
+        await worker_a.sync()
+        await settle()
+        assert worker_a.active_tasks == {}
+        assert list(worker_b.active_tasks) == ["1"]
+        await worker_b.handle(notification(1))
+
+    asyncio.run(scenario())
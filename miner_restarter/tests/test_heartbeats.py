@@ -0,0 +1,65 @@
+import asyncio
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, patch
+
+from app import monitoring_task
+from app.heartbeats import DOWN, PENDING, UP, HeartbeatHistory, KumaDbHeartbeats
+
+NOW = datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def write_kuma_db(path, beats):
+    """A Kuma database with one monitor "m1" and ``beats`` as (status, seconds ago)."""
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE monitor (id INTEGER PRIMARY KEY, name TEXT, type TEXT);
+        CREATE TABLE heartbeat (id INTEGER PRIMARY KEY, monitor_id INTEGER, status INTEGER,
+                                msg TEXT, time DATETIME, ping INTEGER);
+        INSERT INTO monitor VALUES (1, 'Active Miners', 'group'), (2, 'm1', 'http');
+    """)
+    conn.executemany(
+        "INSERT INTO heartbeat (monitor_id, status, msg, time, ping) VALUES (2, ?, '', ?, 10)",
+        [(status, (NOW - timedelta(seconds=ago)).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]) for status, ago in beats],
+    )
+    conn.commit()
+    conn.close()
+
+
+def verdict(tmp_path, beats, count=3):
+    path = tmp_path / "kuma.db"
+    path.unlink(missing_ok=True)
+    write_kuma_db(path, beats)
+    history = HeartbeatHistory(KumaDbHeartbeats(str(path)), max_age=300, clock=NOW.timestamp)
+    return asyncio.run(history.verdict("m1", count))
+
+
+def test_verdict_from_heartbeats(tmp_path):
+    # Kuma retries as Pending before it declares the monitor Down
+    assert verdict(tmp_path, [(UP, 240), (PENDING, 180), (PENDING, 120), (DOWN, 60)]) == "down"
+    assert verdict(tmp_path, [(DOWN, 120), (DOWN, 60), (UP, 0)]) == "up"
+    # Too few failures, or too old to trust: probe as usual
+    assert verdict(tmp_path, [(UP, 120), (DOWN, 60)]) is None
+    assert verdict(tmp_path, [(DOWN, 1200), (DOWN, 1100), (DOWN, 1000)]) is None
+    assert verdict(tmp_path, [(DOWN, 30)], count=1) == "down"
+
+
+def test_down_heartbeats_skip_probing(tmp_path):
+    path = tmp_path / "kuma.db"
+    write_kuma_db(path, [(PENDING, 180), (PENDING, 120), (DOWN, 60)])
+
+    async def scenario():
+        task = monitoring_task.MonitoringTask()
+        task.heartbeats = HeartbeatHistory(KumaDbHeartbeats(str(path)), clock=NOW.timestamp)
+        task.hosts.wait_until_reachable = AsyncMock(return_value=None)
+        task.hosts.host_is_down = AsyncMock(return_value=False)
+        task.ledger.claim = lambda miner, host: monitoring_task.RestartDecision(True)
+        task.check_endpoint = AsyncMock(return_value=False)
+        task.restart_service = AsyncMock(return_value="success")
+        with patch.object(monitoring_task, "notify_all", AsyncMock()):
+            await task._monitor_and_restart("http://10.0.0.1:8091", "m1")
+        return task
+
+    task = asyncio.run(scenario())
+    task.check_endpoint.assert_not_called()
+    task.restart_service.assert_awaited_once_with("10.0.0.1", "m1", restart_id=None)
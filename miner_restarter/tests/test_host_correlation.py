@@ -0,0 +1,74 @@
+import asyncio
+
+from app.host_correlation import HostOutageTracker, HostProbe, HostStateStore
+
+
+class CountingProbe(HostProbe):
+    def __init__(self, reachable, store, **kwargs):
+        super().__init__(store, poll_interval=0.005, **kwargs)
+        self.reachable = reachable
+        self.probes = 0
+
+    async def probe(self, hostname):
+        self.probes += 1
+        await asyncio.sleep(0.05)
+        return self.reachable
+
+
+def test_concurrent_callers_share_one_probe(tmp_path):
+    async def scenario():
+        probe = CountingProbe(True, HostStateStore(str(tmp_path / "hosts.db")))
+        results = await asyncio.gather(*(probe.is_reachable("10.0.0.1") for _ in range(8)))
+        assert results == [True] * 8
+        assert probe.probes == 1
+        # Served from the cache afterwards
+        assert await probe.is_reachable("10.0.0.1")
+        assert probe.probes == 1
+
+    asyncio.run(scenario())
+
+
+def test_one_alert_per_host_outage(tmp_path):
+    async def scenario():
+        probe = CountingProbe(False, HostStateStore(str(tmp_path / "hosts.db")), cache_seconds=0)
+        alerts = []
+        tracker = HostOutageTracker(probe, alerts.append)
+        down = await asyncio.gather(*(tracker.host_is_down("10.0.0.1", f"miner{i}") for i in range(4)))
+        assert down == [True] * 4
+        assert len(alerts) == 1
+        assert "10.0.0.1 is unreachable" in alerts[0]
+        assert tracker.outages["10.0.0.1"].miners == {"miner0", "miner1", "miner2", "miner3"}
+
+        probe.reachable = True
+        assert not await tracker.host_is_down("10.0.0.1", "miner0")
+        assert len(alerts) == 2
+        assert "Resuming checks for 4 miners" in alerts[1]
+        assert tracker.outages == {}
+
+    asyncio.run(scenario())
+
+
+def test_workers_share_probes_and_outages(tmp_path):
+    async def scenario():
+        # Created on first use, like data/ on a fresh checkout
+        path = str(tmp_path / "data" / "hosts.db")
+        probes = [CountingProbe(False, HostStateStore(path)) for _ in range(2)]
+        alerts = []
+        trackers = [HostOutageTracker(probe, alerts.append) for probe in probes]
+
+        down = await asyncio.gather(*(tracker.host_is_down("10.0.0.1", f"miner{i}")
+                                      for i, tracker in enumerate(trackers)))
+        assert down == [True, True]
+        # One worker probed while the other waited for its result, and one alert was sent
+        assert sum(probe.probes for probe in probes) == 1
+        assert len(alerts) == 1
+        assert trackers[1].outages["10.0.0.1"].miners == {"miner0", "miner1"}
+
+        for probe in probes:
+            probe.reachable, probe.cache_seconds = True, 0
+        assert await asyncio.gather(*(t.host_is_down("10.0.0.1", "miner0") for t in trackers)) == [False, False]
+        # The recovery alert comes from one worker only
+        assert len(alerts) == 2
+        assert "Resuming checks for 2 miners" in alerts[1]
+
+    asyncio.run(scenario())
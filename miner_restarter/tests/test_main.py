@@ -1,26 +1,71 @@
 from fastapi.testclient import TestClient
+from app import main
 from app.main import app
 import json
 from datetime import datetime
+from unittest.mock import patch
 
 client = TestClient(app)
 
-def test_monitor_notification():
-    test_notification = {
-        "monitorID": 1,
-        "monitor": "Test Server",
-        "status": 0,
-        "msg": "Server is down",
-        "time": datetime.now().isoformat(),
-        "important": True,
-        "ping": 1500,
-        "duration": 2000,
-        "extra": {
-            "error": "Connection timeout"
-        }
+def kuma_notification(status=0, path_name="Active Miners / Test Server"):
+    return {
+        "heartbeat": {
+            "monitorID": 1,
+            "status": status,
+            "msg": "Connection timeout",
+            "time": datetime.now().isoformat(),
+            "ping": 1500,
+        },
+        "monitor": {
+            "id": 1,
+            "name": "Test Server",
+            "url": "http://10.0.0.1:8091",
+            "pathName": path_name,
+            "type": "http",
+        },
+        "msg": "[Test Server] [✅ Up] OK" if status else "[Test Server] [🔴 Down] Connection timeout",
     }
 
-    response = client.post("/webhook", json=test_notification)
+def test_monitor_notification(tmp_path):
+    from app.event_state import MonitorStateStore
+
+    # In a directory that does not exist yet, like data/ on a fresh checkout
+    store = MonitorStateStore(str(tmp_path / "data" / "restart_ledger.db"))
+    with patch.object(main.event_states, "store", store), TestClient(app) as lifespan_client:
+        response = lifespan_client.post("/webhook", json=kuma_notification(status=1))
+        assert response.status_code == 202
+        assert response.json()["status"] == "accepted"
+        assert response.json()["monitor"] == "Test Server"
+        # Up events are consumed without starting a monitoring task
+        lifespan_client.portal.call(main.ingest_queue.join)
+        assert main.monitoring_task.active_tasks == {}
+    # The event was applied to the shared monitor state
+    assert store.get("1").last_status == "up"
+
+def test_invalid_notification_is_rejected():
+    response = client.post("/webhook", json={"monitor": {"url": "http://10.0.0.1:8091"}, "msg": "Down"})
+    assert response.status_code == 422
+    assert response.json()["errors"][0]["loc"] == ["monitor", "name"]
+
+def test_full_queue_returns_503():
+    with patch.object(main.ingest_queue, "submit", return_value=False):
+        response = client.post("/webhook", json=kuma_notification())
+    assert response.status_code == 503
+
+def test_metrics_endpoint():
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert "miner_restarter_http_request_duration_seconds" in response.text
+    assert "miner_restarter_active_monitoring_tasks" in response.text
+    assert response.headers["X-Trace-Id"]
+
+def test_restart_history(tmp_path):
+    from app.restart_ledger import RestartLedger
+
+    ledger = RestartLedger(str(tmp_path / "ledger.db"))
+    ledger.record("Test Server", "10.0.0.1", "success", duration_seconds=2.5)
+    with patch.object(main.monitoring_task, "ledger", ledger):
+        response = client.get("/restarts", params={"miner": "Test Server"})
     assert response.status_code == 200
-    assert response.json()["status"] == "received"
-    assert response.json()["notification"]["monitor"] == "Test Server"
\ No newline at end of file
+    assert response.json()["restarts"][0]["outcome"] == "success"
+    assert response.json()["next_restart"]["reason"] == "backoff"
@@ -0,0 +1,142 @@
+import asyncio
+import json
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+from app import monitoring_task, remote_exec
+from app.config import ConfigService
+from app.remote_exec import Pm2, RemoteExecutor
+from app.restart_ledger import RestartLedger
+
+
+class Reader:
+    def __init__(self, lines, hang=False):
+        self.lines = list(lines)
+        self.hang = hang
+
+    async def readline(self):
+        if self.lines:
+            return self.lines.pop(0)
+        if self.hang:
+            await asyncio.sleep(3600)
+        return ""
+
+
+class Connection:
+    """SSH connection answering each command with ``replies[<pm2 subcommand>]``."""
+
+    def __init__(self, replies):
+        self.replies = replies
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def create_process(self, command):
+        self.commands.append(command)
+        stdout, exit_status, hang = self.replies[command.split()[4]]
+        return SimpleNamespace(stdout=Reader(stdout, hang), stderr=Reader([]),
+                               wait=AsyncMock(return_value=SimpleNamespace(exit_status=exit_status)))
+
+
+def jlist(status):
+    return [json.dumps([{"name": "m1", "pid": 42, "pm2_env": {"status": status, "restart_time": 3}}]) + "\n"]
+
+
+def test_timeouts_return_structured_results():
+    async def hanging_connect(host, **kwargs):
+        await asyncio.sleep(3600)
+
+    async def scenario():
+        executor = RemoteExecutor("miner", "key", connect_timeout=0.05, exec_timeout=0.05)
+        with patch.object(remote_exec.asyncssh, "connect", hanging_connect):
+            unreachable = await executor.run("10.0.0.1", "uptime")
+        conn = Connection({"logs": (["starting\n"], 0, True)})
+        with patch.object(remote_exec.asyncssh, "connect", AsyncMock(return_value=conn)):
+            hung = await Pm2(executor, lambda host: "miner").logs("10.0.0.1", "m1")
+        return unreachable, hung
+
+    unreachable, hung = asyncio.run(scenario())
+    assert (unreachable.error, unreachable.ok) == ("connect_timeout", False)
+    assert hung.result.error == "exec_timeout"
+    # Output streamed before the timeout is kept
+    assert hung.result.stdout == "starting\n"
+    assert "logs" not in hung.to_dict()
+
+
+def test_restart_is_verified_with_pm2_jlist(tmp_path):
+    async def restart(status):
+        task = monitoring_task.MonitoringTask()
+        task.ledger = RestartLedger(str(tmp_path / f"{status}.db"))
+        conn = Connection({"restart": ([], 0, False), "jlist": (jlist(status), 0, False)})
+        with patch.object(remote_exec.asyncssh, "connect", AsyncMock(return_value=conn)) as connect, \
+                patch.object(monitoring_task, "get_settings",
+                             lambda: SimpleNamespace(SSH_USERNAME="miner", PM2_VERIFY_RESTART=True,
+                                                     PM2_VERIFY_DELAY=0)), \
+                patch.object(monitoring_task, "notify_all", AsyncMock()):
+            outcome = await task.restart_service("http://10.0.0.1:8091", "m1")
+        # Restart and verification share one connection
+        assert connect.await_count == 1
+        assert [c.split()[4] for c in conn.commands] == ["restart", "jlist"]
+        return outcome, task.ledger.history(miner="m1")[0]["detail"]
+
+    assert asyncio.run(restart("online")) == ("success", "pm2: online, pid 42, 3 restarts")
+    assert asyncio.run(restart("errored")) == ("failed", "m1 is errored 0s after the restart")
+
+
+def test_pm2_endpoint_queries_hosts_in_parallel(tmp_path):
+    import yaml
+    from fastapi.testclient import TestClient
+
+    from app import main
+    from app.inventory import Inventory
+
+    (tmp_path / "host_vars").mkdir()
+    for host, ip in (("host1", "10.0.0.1"), ("host2", "10.0.0.2")):
+        (tmp_path / "host_vars" / f"{host}.yml").write_text(yaml.safe_dump(
+            {"ansible_host": ip, "provider": "Hetzner", "miners": [{"name": "m1", "branch": "main"}]}))
+
+    async def connect(host, **kwargs):
+        if host == "10.0.0.2":
+            raise OSError("Connection refused")
+        return Connection({"jlist": (jlist("online"), 0, False)})
+
+    headers = {"Authorization": "Bearer secret"}
+    with patch.object(main, "inventory", Inventory(str(tmp_path / "host_vars"))), \
+            patch.object(remote_exec.asyncssh, "connect", connect), \
+            patch.object(main.config, "_settings", main.get_settings().model_copy(update={"API_TOKEN": "secret"})), \
+            TestClient(main.app) as client:
+        assert client.post("/pm2/list", json={"miners": ["m1"]}).status_code == 401
+        assert client.post("/pm2/restart", json={"miners": ["m1"]}, headers=headers).status_code == 404
+        response = client.post("/pm2/list", json={"selector": {"branch": "main"}}, headers=headers).json()
+
+    assert response["status"] == "partial"
+    results = {r["host"]: r for r in response["results"]}
+    assert [p["status"] for p in results["10.0.0.1"]["processes"]] == ["online"]
+    assert (results["10.0.0.2"]["error"], results["10.0.0.2"]["detail"]) == ("connect_error", "Connection refused")
+
+
+def test_reload_reaches_the_monitoring_task(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for name in ("SSH_USERNAME", "SSH_COMMAND_TIMEOUT", "HOST_PROBE_TIMEOUT", "HOST_BREAKER_THRESHOLD"):
+        monkeypatch.delenv(name, raising=False)
+    service = ConfigService()
+    with patch.object(monitoring_task, "config", service):
+        task = monitoring_task.MonitoringTask()
+    task.ledger = RestartLedger(str(tmp_path / "ledger.db"))
+    (tmp_path / "config").write_text("SSH_USERNAME = deploy\nSSH_COMMAND_TIMEOUT = 30\n"
+                                      "HOST_PROBE_TIMEOUT = 3\nHOST_BREAKER_THRESHOLD = 2\n")
+    assert service.reload()
+    assert (task.remote.username, task.remote.exec_timeout) == ("deploy", 30)
+    assert task.hosts.probe.timeout == 3
+
+    task.ledger.record("m1", "10.0.0.1", "error")
+    task.ledger.record("m2", "10.0.0.1", "failed")
+    decision = task.ledger.claim("m3", "10.0.0.1")
+    with patch.object(monitoring_task, "notify_all", AsyncMock()) as notify:
+        asyncio.run(task.refuse_restart("m3", "10.0.0.1", decision))
+    # The alert reports the threshold the ledger decided with
+    assert "2 restarts failed on host 10.0.0.1" in notify.call_args.args[0]
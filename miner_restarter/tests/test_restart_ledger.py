@@ -0,0 +1,91 @@
+from app.restart_ledger import RestartLedger
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_ledger(tmp_path, **kwargs):
+    clock = FakeClock()
+    ledger = RestartLedger(str(tmp_path / "ledger.db"), backoff_base=60, backoff_max=600,
+                           window_seconds=3600, clock=clock, **kwargs)
+    return ledger, clock
+
+
+def test_backoff_doubles_between_restarts(tmp_path):
+    ledger, clock = make_ledger(tmp_path, miner_threshold=10)
+    assert ledger.check("m1", "10.0.0.1").allowed
+
+    ledger.record("m1", "10.0.0.1", "success")
+    decision = ledger.check("m1", "10.0.0.1")
+    assert not decision.allowed and decision.reason == "backoff"
+    assert decision.retry_after == 60
+
+    clock.now += 60
+    assert ledger.check("m1", "10.0.0.1").allowed
+    ledger.record("m1", "10.0.0.1", "success")
+    clock.now += 60
+    assert ledger.check("m1", "10.0.0.1").reason == "backoff"
+    clock.now += 60
+    assert ledger.check("m1", "10.0.0.1").allowed
+    # Other miners are not affected
+    assert ledger.check("m2", "10.0.0.1").allowed
+
+
+def test_miner_breaker_opens_once(tmp_path):
+    ledger, clock = make_ledger(tmp_path, miner_threshold=3)
+    for _ in range(3):
+        ledger.record("m1", "10.0.0.1", "success")
+        clock.now += 700
+
+    decision = ledger.check("m1", "10.0.0.1")
+    assert decision.reason == "miner_breaker"
+    assert decision.newly_opened
+    ledger.record("m1", "10.0.0.1", decision.reason)
+    assert not ledger.check("m1", "10.0.0.1").newly_opened
+
+    # Closed again once the restarts have aged out of the window
+    clock.now += 3600
+    assert ledger.check("m1", "10.0.0.1").allowed
+
+
+def test_host_breaker_counts_failures_of_all_miners(tmp_path):
+    ledger, _ = make_ledger(tmp_path, host_threshold=2)
+    ledger.record("m1", "10.0.0.1", "error", detail="Connection refused")
+    ledger.record("m2", "10.0.0.1", "failed")
+    assert ledger.check("m3", "10.0.0.1").reason == "host_breaker"
+    assert ledger.check("m3", "10.0.0.2").allowed
+
+    history = ledger.history(host="10.0.0.1")
+    assert [row["miner"] for row in history] == ["m2", "m1"]
+    assert history[1]["detail"] == "Connection refused"
+
+
+def test_claim_records_the_restart_atomically(tmp_path):
+    ledger, clock = make_ledger(tmp_path)
+    # Two workers with their own ledger objects on the same database
+    other = RestartLedger(ledger.path, backoff_base=60, backoff_max=600, window_seconds=3600, clock=clock)
+
+    claimed = ledger.claim("m1", "10.0.0.1")
+    assert claimed.allowed and claimed.restart_id is not None
+    # The "started" row holds off the other worker while the restart runs
+    refused = other.claim("m1", "10.0.0.1")
+    assert (refused.allowed, refused.reason, refused.restart_id) == (False, "backoff", None)
+
+    ledger.record("m1", "10.0.0.1", "failed", duration_seconds=1.5, detail="errored",
+                  restart_id=claimed.restart_id)
+    history = ledger.history(miner="m1")
+    assert [row["outcome"] for row in history] == ["backoff", "failed"]
+    assert (history[1]["duration_seconds"], history[1]["detail"]) == (1.5, "errored")
+
+
+def test_ledger_creates_its_directory(tmp_path):
+    ledger, _ = make_ledger(tmp_path / "data" / "nested")
+    assert ledger.claim("m1", "10.0.0.1").restart_id is not None
+    # Recorded, so the backoff holds
+    assert ledger.claim("m1", "10.0.0.1").reason == "backoff"
+    assert [row["outcome"] for row in ledger.history(miner="m1")] == ["backoff", "started"]
@@ -0,0 +1,72 @@
+import asyncio
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import requests
+
+from app import webhook_handler
+
+
+class FakeSession:
+    def __init__(self, responses=None, delay=0.0):
+        self.responses = responses or {}
+        self.delay = delay
+        self.posts = []
+
+    def post(self, url, json, timeout):
+        self.posts.append(url)
+        time.sleep(self.delay)
+        queue = self.responses.get(url)
+        status, headers = queue.pop(0) if queue else (204 if "discord" in url else 200, {})
+        if status == "timeout":
+            raise requests.Timeout()
+        return SimpleNamespace(status_code=status, headers=headers, text="", json=lambda: {})
+
+
+def test_rate_limited_post_is_retried():
+    session = FakeSession({"https://discord/1": [(429, {"Retry-After": "0.01"})]})
+    with patch.object(webhook_handler, "_session", return_value=session):
+        result = webhook_handler.deliver("discord", "https://discord/1", "hello")
+    assert result.success
+    assert result.attempts == 2
+    assert result.status_code == 204
+
+
+def test_destinations_are_sent_concurrently():
+    webhooks = [("slack", f"https://slack/{i}") for i in range(4)]
+    session = FakeSession({"https://slack/2": [("timeout", {})]}, delay=0.2)
+    start = time.perf_counter()
+    with patch.object(webhook_handler, "_session", return_value=session):
+        results = webhook_handler.deliver_to_all("hello", webhooks)
+    assert time.perf_counter() - start < 0.6
+    assert [r.success for r in results] == [True, True, False, True]
+    assert results[2].error.startswith("timed out")
+    assert all(r.latency_seconds >= 0.2 for r in results)
+    with patch.object(webhook_handler, "_session", return_value=FakeSession()):
+        assert webhook_handler.send_notification_to_all("hello", webhooks) == 4
+
+
+def test_destination_deadline_covers_slow_answers():
+    webhooks = [("slack", "https://slack/fast"), ("slack", "https://slack/slow")]
+
+    class TricklingSession(FakeSession):
+        def post(self, url, json, timeout):
+            # Every read answers within the socket timeout, the whole post does not
+            self.delay = 0.5 if url.endswith("slow") else 0.0
+            return super().post(url, json, timeout)
+
+    settings = SimpleNamespace(NOTIFICATION_TIMEOUT=0.2, NOTIFICATION_MAX_RETRIES=2)
+    with patch.object(webhook_handler, "_session", return_value=TricklingSession()), \
+            patch.object(webhook_handler, "get_settings", lambda: settings):
+        start = time.perf_counter()
+        results = webhook_handler.deliver_to_all("hello", webhooks)
+        assert time.perf_counter() - start < 0.45
+        start = time.perf_counter()
+        async_results = asyncio.run(webhook_handler.notify_all("hello", webhooks))
+        assert time.perf_counter() - start < 0.45
+        # The abandoned posts finish in the background
+        time.sleep(0.5)
+    for outcome in (results, async_results):
+        assert [r.success for r in outcome] == [True, False]
+        assert outcome[1].error.startswith("timed out")